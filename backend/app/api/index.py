@@ -1,30 +1,97 @@
 import asyncio
+import time
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+from urllib.parse import urlparse
 
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
+from app.core.deadline import Deadline, optional_stage_budget, required_stage_budget, run_stage
+from app.core.jobs import JobQueue, QueueFullError
 from app.core.logger import setup_logger
+from app.core.prefetch import Prefetcher
+from app.core.readiness import readiness
+from app.core.sessions import Session, sessions
+from app.core.singleflight import SingleFlight
+from app.core.tracing import Trace, set_flag, span
+from app.rag.checkpoint import CrawlCheckpoint, checkpoint_digests, claim_resume, pending_checkpoints
 from app.rag.chunker import chunk_pages_smart
 from app.rag.crawler import crawl_site_async
-from app.rag.generator import analyze_content, contextualize_question, generate_answer
+from app.rag.embeddings import get_embedding_function
+from app.rag.generator import analyze_content, contextualize_question, generate_answer, get_client
+from app.rag.llm_cache import llm_cache, normalize_text
+from app.rag.page_store import page_store
+from app.rag.planner import is_summary_request, plan_query
 from app.rag.retriever import AdaptiveRetriever
-from app.rag.store import VectorStore
+from app.rag.store import VectorStore, metadata_filter
+from app.rag.summarizer import group_contexts, map_summaries
 
 logger = setup_logger(__name__)
 router = APIRouter()
 
 # Global instances (Thread-safe enough for this scale)
+# Both are cheap to construct; the model and DB load lazily or in warm_up().
 store = VectorStore()
 retriever = AdaptiveRetriever(store)
 
+# In-flight /query work, keyed so duplicate questions share one run
+query_flights = SingleFlight()
+
+# Answers to suggested follow-ups, computed while the server is idle
+prefetcher = Prefetcher(
+    max_entries=settings.PREFETCH_MAX_ENTRIES,
+    ttl=settings.PREFETCH_TTL_SECONDS,
+    concurrency=settings.PREFETCH_CONCURRENCY,
+    max_pending=settings.PREFETCH_MAX_PENDING,
+    idle_wait=settings.PREFETCH_IDLE_WAIT_SECONDS,
+)
+
+# Indexing runs on a bounded worker pool (started in the app lifespan)
+index_jobs = JobQueue(
+    workers=settings.INDEX_WORKERS,
+    max_queued=settings.INDEX_QUEUE_DEPTH,
+    supersede_running=settings.INDEX_SUPERSEDE_RUNNING,
+)
+
+def warm_up() -> None:
+    """
+    Load heavy components in the background after startup.
+    Runs in a worker thread; each step reports to the readiness registry.
+    """
+    try:
+        ef = get_embedding_function()
+        ef(["warm-up query"])  # First forward pass initializes torch kernels
+        readiness.mark_ready("embedding_model")
+    except Exception as e:
+        logger.error(f"❌ Embedding model warm-up failed: {e}")
+        readiness.mark_failed("embedding_model", e)
+
+    try:
+        store.open()
+        readiness.mark_ready("vector_store")
+    except Exception as e:
+        logger.error(f"❌ Vector store failed to open: {e}")
+        readiness.mark_failed("vector_store", e)
+
+    try:
+        get_client()
+        readiness.mark_ready("llm_client")
+    except Exception as e:
+        readiness.mark_failed("llm_client", e)
+
+# Sharded stores are meant for large sites, so they get a higher page cap
+MAX_PAGES = settings.LARGE_SITE_MAX_PAGES if settings.VECTOR_STORE_SHARDS > 1 else settings.MAX_PAGES_PER_INDEX
+
 class IndexRequest(BaseModel):
     url: str
-    max_pages: int = Field(default=10, ge=1, le=settings.MAX_PAGES_PER_INDEX)
+    max_pages: int = Field(default=10, ge=1, le=MAX_PAGES)
     max_depth: int = Field(default=2, ge=1, le=settings.MAX_CRAWL_DEPTH)
 
+class RebuildRequest(BaseModel):
+    url: Optional[str] = None  # Site to rebuild; defaults to the last crawl
+
 class Message(BaseModel):
     role: str = Field(..., pattern="^(user|assistant)$")
     content: str = Field(..., min_length=1)
@@ -35,6 +102,16 @@ class QueryRequest(BaseModel):
     include_sources: bool = True
     debug: bool = False
     url: str | None = None
+    # End-to-end latency budget in seconds (default: QUERY_DEADLINE_SECONDS)
+    timeout: float | None = Field(default=None, gt=0, le=120)
+    # Server-side conversation: "new" (or an unknown/expired id) starts one;
+    # the response carries the id to send with follow-ups instead of history
+    session_id: str | None = Field(default=None, max_length=64)
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=settings.BATCH_MAX_QUESTIONS)
+    include_sources: bool = True
+    concurrency: int | None = Field(default=None, ge=1, le=32)
 
 class AnalysisResponse(BaseModel):
     topics: List[str]
@@ -44,28 +121,100 @@ class AnalysisResponse(BaseModel):
 class AnalyzeRequest(BaseModel):
     url: str
 
-async def process_indexing(url: str, max_pages: int, max_depth: int) -> None:
+async def process_indexing(url: str, max_pages: int, max_depth: int, resume: bool = False) -> None:
     """
     Runs the full indexing pipeline.
     CRITICAL FIX: CPU-bound tasks are offloaded to threads to prevent blocking the API.
+
+    The new content is built into a fresh index version and published
+    atomically at the end, so queries keep hitting the previous index for
+    the whole crawl and never see a partially built one. A `resume` job
+    (re-queued from a checkpoint) is dropped if the checkpoint is gone.
     """
+    # Workers share the checkpoint dir: a job already running elsewhere isn't started twice
+    checkpoint = CrawlCheckpoint(_normalize_url(url), max_pages, max_depth)
+    if not await asyncio.to_thread(checkpoint.claim):
+        logger.info(f"⏭️ {url} is already being indexed by another worker")
+        return
+    if resume and not checkpoint.exists():
+        # Finished by another worker after this one queued the resume
+        checkpoint.release()
+        return
     try:
-        logger.info(f"🚀 Starting background crawl: {url}")
-        
-        # 1. Clear DB (Blocking I/O -> Thread)
-        await asyncio.to_thread(store.clear)
-        
-        # 2. Crawl (Async I/O -> Native Await)
-        pages = await crawl_site_async(url, max_pages, max_depth)
+        await _crawl_and_index(url, max_pages, max_depth, checkpoint)
+    finally:
+        checkpoint.release()
+
+async def _crawl_and_index(url: str, max_pages: int, max_depth: int, checkpoint: CrawlCheckpoint) -> None:
+    logger.info(f"🚀 Starting background crawl: {url}")
+    
+    # 1. Crawl (Async I/O -> Native Await), resuming an interrupted crawl
+    # of the same job if one was checkpointed
+    try:
+        pages = await crawl_site_async(url, max_pages, max_depth, checkpoint=checkpoint)
+    except asyncio.CancelledError:
+        # Keep the checkpoint across shutdowns; drop it if the job was cancelled or superseded
+        if not index_jobs.stopping:
+            await asyncio.to_thread(checkpoint.discard)
+        raise
+
+    # Keep the raw pages so the index can be rebuilt without re-crawling
+    if pages and settings.PAGE_STORE_ENABLED:
+        try:
+            await asyncio.to_thread(page_store.save_crawl, _normalize_url(url), pages)
+            # The replaced manifest may have been the last reference to old page versions
+            await asyncio.to_thread(lambda: page_store.collect_garbage(keep=checkpoint_digests()))
+        except Exception as e:
+            logger.warning(f"⚠️ Page store write failed: {e}")
+
+    await build_index(pages, url)
+    await asyncio.to_thread(checkpoint.discard)
+
+def resume_interrupted_crawls() -> int:
+    """
+    Re-queue crawls that a crash or restart interrupted (call after
+    index_jobs.start()). Only the first worker to start does this, and
+    checkpoints another worker is still running are left alone.
+    """
+    if not claim_resume():
+        logger.debug("Another worker resumes interrupted crawls")
+        return 0
+    resumed = 0
+    for checkpoint in pending_checkpoints():
+        if checkpoint.busy():
+            continue
+        try:
+            _submit_index(checkpoint.url, checkpoint.max_pages, checkpoint.max_depth, resume=True)
+            resumed += 1
+        except QueueFullError:
+            break
+    if resumed:
+        logger.info(f"⏯️ Re-queued {resumed} interrupted crawl(s)")
+    return resumed
+
+async def process_rebuild(site: str) -> None:
+    """Re-chunk and re-embed the stored pages of `site` (no crawling)."""
+    logger.info(f"♻️ Rebuilding index from stored pages: {site}")
+    pages = await asyncio.to_thread(page_store.load_pages, site)
+    if not pages:
+        raise RuntimeError(f"No stored pages for {site}")
+    await build_index(pages, site)
+
+async def build_index(pages: List[dict], url: str) -> None:
+    """Chunk `pages` into a staging index version and publish it."""
+    build = None
+    try:
+        # 2. Staging index version (Blocking I/O -> Thread)
+        build = await asyncio.to_thread(store.begin_build)
         
         if not pages:
             logger.error(f"❌ Indexing ABORTED: No content found at {url}.")
-            await asyncio.to_thread(store.clear)
-            await asyncio.to_thread(store.add, [{
+            await asyncio.to_thread(build.add, [{
                 "id": "error_msg", 
                 "text": f"System Alert: The website {url} could not be indexed.", 
                 "source": "system"
             }])
+            await asyncio.to_thread(build.publish)
             return
 
         # 3. Chunking (CPU Bound -> Thread)
@@ -73,38 +222,117 @@ async def process_indexing(url: str, max_pages: int, max_depth: int) -> None:
         
         if not chunks:
             logger.error("❌ Indexing Failed: Content found but chunking produced 0 results.")
+            await asyncio.to_thread(build.abort)
             return
 
-        # 4. Store (Blocking I/O -> Thread)
-        # Note: We clear again just to be safe before the final add
-        await asyncio.to_thread(store.clear)
-        await asyncio.to_thread(store.add, chunks)
+        # 4. Store (Blocking I/O -> Thread), then swap the new version in
+        await asyncio.to_thread(build.add, chunks)
+        await asyncio.to_thread(build.publish)
         
         logger.info(f"✅ Indexing complete. Added {len(chunks)} chunks.")
         
+    except asyncio.CancelledError:
+        # Never leave a half-built version behind
+        if build is not None:
+            await asyncio.to_thread(build.abort)
+        raise
     except Exception as e:
         logger.error(f"❌ Indexing failed exception: {e}")
+        if build is not None:
+            await asyncio.to_thread(build.abort)
+        raise
+
+def _normalize_url(url: str) -> str:
+    parsed = urlparse(url.strip())
+    path = parsed.path.rstrip("/")
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}" + (f"?{parsed.query}" if parsed.query else "")
+
+def _submit_index(url: str, max_pages: int, max_depth: int, resume: bool = False):
+    key = (_normalize_url(url), max_pages, max_depth)
+    return index_jobs.submit(
+        key,
+        group=urlparse(key[0]).netloc,
+        fn=lambda: process_indexing(url, max_pages, max_depth, resume=resume),
+        description=f"index {url}",
+    )
 
 @router.post("/index")
-async def index_endpoint(req: IndexRequest, tasks: BackgroundTasks) -> dict:
-    # Pass arguments to the background task wrapper
-    tasks.add_task(process_indexing, req.url, req.max_pages, req.max_depth)
-    return {"status": "accepted", "message": "Indexing started."}
+async def index_endpoint(req: IndexRequest) -> dict:
+    """
+    Queue a crawl + index job. Identical requests share the active job; a
+    new request for the same site supersedes older ones. Returns 429 when
+    the queue is full.
+    """
+    try:
+        job = _submit_index(req.url, req.max_pages, req.max_depth)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+    return {
+        "status": "accepted",
+        "message": "Indexing started." if job.status == "running" else "Indexing queued.",
+        "job_id": job.id,
+        "job_status": job.status,
+        "queue_position": index_jobs.position(job),
+    }
+
+@router.post("/index/rebuild")
+async def rebuild_endpoint(req: RebuildRequest) -> dict:
+    """
+    Queue a rebuild of the index from stored pages, e.g. after changing
+    the chunking settings. Defaults to the most recently crawled site.
+    """
+    site = _normalize_url(req.url) if req.url else await asyncio.to_thread(page_store.latest_site)
+    if not site or page_store.manifest(site) is None:
+        raise HTTPException(status_code=404, detail="No stored pages for this site; index it first")
+
+    try:
+        job = index_jobs.submit(
+            ("rebuild", site),
+            group=urlparse(site).netloc,
+            fn=lambda: process_rebuild(site),
+            description=f"rebuild {site}",
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+    return {
+        "status": "accepted",
+        "site": site,
+        "job_id": job.id,
+        "job_status": job.status,
+        "queue_position": index_jobs.position(job),
+    }
+
+@router.get("/index/{job_id}")
+async def index_status_endpoint(job_id: str) -> dict:
+    job = index_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {**job.to_dict(), "queue_position": index_jobs.position(job)}
+
+@router.delete("/index/{job_id}")
+async def index_cancel_endpoint(job_id: str) -> dict:
+    if not index_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Unknown or finished job")
+    return {"status": "cancelling", "job_id": job_id}
+
+@router.get("/cache/stats")
+async def cache_stats_endpoint() -> dict:
+    """Hit rate and size of the LLM helper-call cache."""
+    return await asyncio.to_thread(llm_cache.stats)
 
 @router.post("/analyze", response_model=AnalysisResponse)
 async def analyze_endpoint(req: AnalyzeRequest) -> AnalysisResponse:
-    # Query is blocking, wrap it
-    results = await asyncio.to_thread(store.query, "summary overview introduction", n_results=20)
+    # Query is blocking, wrap it. The source filter runs inside the engine,
+    # so all hits come from this page.
+    n_results = settings.SUMMARY_MAP_MAX_CHUNKS if settings.SUMMARY_MAP_REDUCE_ENABLED else 20
+    results = await asyncio.to_thread(
+        store.query, "summary overview introduction", n_results=n_results, where=metadata_filter(source=req.url)
+    )
 
     documents = results.get("documents") or []
-    metadatas = results.get("metadatas") or []
-
-    filtered_contexts: List[str] = []
-    if documents and metadatas and documents[0] and metadatas[0]:
-        for doc, meta in zip(documents[0], metadatas[0]):
-            source = (meta or {}).get("source")
-            if source == req.url:
-                filtered_contexts.append(doc)
+    filtered_contexts: List[str] = list(documents[0]) if documents else []
 
     if not filtered_contexts:
         return AnalysisResponse(
@@ -113,6 +341,12 @@ async def analyze_endpoint(req: AnalyzeRequest) -> AnalysisResponse:
             summary="Indexing in progress or no content for this URL yet.",
         )
 
+    # Long pages are condensed group by group first, so the analysis sees
+    # the whole page rather than its first and last chunks
+    groups = group_contexts(filtered_contexts, [req.url] * len(filtered_contexts))
+    if settings.SUMMARY_MAP_REDUCE_ENABLED and len(groups) > 1:
+        filtered_contexts = await asyncio.to_thread(map_summaries, groups)
+
     # LLM analysis is blocking (network), wrap it
     analysis = await asyncio.to_thread(analyze_content, filtered_contexts)
     
@@ -122,56 +356,253 @@ async def analyze_endpoint(req: AnalyzeRequest) -> AnalysisResponse:
         summary=analysis.get("summary", "Content indexed successfully."),
     )
 
+def _query_key(req: QueryRequest, session: Optional[Session] = None) -> tuple:
+    """Requests with the same key would produce the same answer."""
+    question = " ".join(req.question.lower().split())
+    history = tuple((m.role, m.content.strip()) for m in req.history)
+    version = store.version if store.is_open else None
+    # A session's state changes with every turn
+    conversation = (session.id, session.turns) if session else None
+    return (question, history, req.url, version, conversation)
+
 @router.post("/query")
 async def query_endpoint(req: QueryRequest) -> dict:
+    # SQLite may wait on another worker's write: keep it off the event loop
+    session = await asyncio.to_thread(sessions.get_or_create, req.session_id) if req.session_id else None
+
+    # Identical concurrent queries (e.g. sidepanel + CLI) share one pipeline run
+    with prefetcher.foreground():
+        (response, trace), shared = await query_flights.do(
+            _query_key(req, session), lambda: _traced_answer(req, session)
+        )
+    if shared:
+        logger.info("🔗 Coalesced duplicate query: '%s'", req.question)
+
+    response = dict(response)
+    if session:
+        response["session_id"] = session.id
+    if req.debug:
+        response["debug"] = {**trace.to_dict(), "coalesced": shared}
+    return response
+
+@router.get("/session/{session_id}")
+async def get_session(session_id: str) -> dict:
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.to_dict()
+
+@router.delete("/session/{session_id}")
+async def delete_session(session_id: str) -> dict:
+    if not await asyncio.to_thread(sessions.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"session_id": session_id, "deleted": True}
+
+@router.get("/prefetch/stats")
+async def prefetch_stats() -> dict:
+    return prefetcher.stats()
+
+@router.delete("/prefetch")
+async def cancel_prefetch() -> dict:
+    """Cancel all queued and running prefetches."""
+    return {"cancelled": prefetcher.cancel_all()}
+
+async def _traced_answer(req: QueryRequest, session: Optional[Session] = None) -> tuple:
+    trace = Trace("query")
+    deadline = Deadline(req.timeout or settings.QUERY_DEADLINE_SECONDS)
+    with trace.activate(), deadline.activate():
+        response = await _answer_query(req, session)
+        search_query = response.pop("_search_query", req.question)
+        # Refusals, errors and deadline fallbacks are not answers: keep them out of the conversation
+        answered = not response.get("refusal") and not response.get("timed_out")
+        if session and answered:
+            await asyncio.to_thread(sessions.record, session.id, req.question, response["answer"], search_query)
+        set_flag("deadline", {"seconds": deadline.seconds, "remaining": round(deadline.remaining(), 3)})
+    if answered:
+        _schedule_prefetch(response.get("suggested_questions") or [])
+    return response, trace
+
+# ==================== Prefetch ====================
+
+def _prefetch_key(question: str) -> tuple:
+    return (normalize_text(question), store.version if store.is_open else None)
+
+def _schedule_prefetch(suggestions: List[str]) -> None:
+    """Queue the likely next questions; summaries are too expensive to guess."""
+    if not settings.PREFETCH_ENABLED or not store.is_open:
+        return
+    for question in suggestions[:settings.PREFETCH_MAX_QUESTIONS]:
+        if not is_summary_request(question):
+            prefetcher.schedule(_prefetch_key(question), lambda q=question: _prefetch_answer(q))
+
+async def _prefetch_answer(question: str) -> dict:
+    """Retrieval (and, with PREFETCH_GENERATE, the answer) for a standalone question."""
+    trace = Trace("prefetch")
+    with trace.activate():
+        # One deadline per stage: time spent paused for foreground traffic doesn't count
+        with Deadline(settings.QUERY_DEADLINE_SECONDS).activate():
+            retrieval = await retriever.retrieve(question)
+        response = None
+        if settings.PREFETCH_GENERATE and retrieval["relevant"]:
+            await prefetcher.yield_to_foreground()
+            with Deadline(settings.QUERY_DEADLINE_SECONDS).activate():
+                response = await _answer_query(QueryRequest(question=question), retrieval=retrieval)
+            response.pop("_search_query", None)
+    logger.debug("Prefetched '%s' (answer: %s)", question, response is not None)
+    return {"retrieval": retrieval, "response": response}
+
+async def _answer_query(req: QueryRequest, session: Optional[Session] = None,
+                        retrieval: Optional[dict] = None) -> dict:
+    """
+    Full pipeline for one question. `retrieval` skips the search stage
+    (used by the prefetcher, which has already searched).
+    """
     start_time = datetime.now()
     
-    is_summary = "summarize" in req.question.lower() or "summary" in req.question.lower()
+    # Explicit history wins; otherwise the session supplies recent turns
+    # verbatim plus a compressed summary of everything older
+    q_dict = [m.dict() for m in req.history]
+    summary = ""
+    if session and not q_dict:
+        q_dict = session.history()
+        summary = session.summary
+    plan = plan_query(req.question, q_dict)
+    set_flag("plan", plan.to_dict())
+    is_summary = plan.summary
+    
+    # A suggested follow-up may already have been prefetched; that work
+    # assumed no conversation, so it only applies to standalone questions
+    if retrieval is None and settings.PREFETCH_ENABLED and not plan.contextualize and not is_summary:
+        prefetched = await prefetcher.take(_prefetch_key(req.question))
+        if prefetched and prefetched["response"]:
+            set_flag("prefetch", "answer")
+            duration = (datetime.now() - start_time).total_seconds()
+            return {**prefetched["response"], "response_time": round(duration, 2), "_search_query": req.question}
+        if prefetched:
+            set_flag("prefetch", "retrieval")
+            retrieval = prefetched["retrieval"]
     
-    # Contextualization (LLM Call -> Blocking)
-    if is_summary:
-        search_query = req.question
-    else:
-        q_dict = [m.dict() for m in req.history]
-        search_query = await asyncio.to_thread(contextualize_question, req.question, q_dict)
+    # Contextualization (LLM Call -> Blocking), only when the planner says
+    # the question depends on the conversation
+    search_query = req.question
+    cached_rewrite = session.cached_rewrite(req.question) if session and plan.contextualize else None
+    if cached_rewrite:
+        # Same follow-up asked again: reuse the session's last rewrite
+        search_query = cached_rewrite
+        set_flag("contextualize_skipped", "session")
+    elif plan.contextualize:
+        # Optional stage: skipped or cut short when the deadline is tight
+        budget = optional_stage_budget(share=0.3)
+        if budget is None:
+            logger.info("⏱️ Skipping contextualization: not enough latency budget left")
+            set_flag("contextualize_skipped", "budget")
+        else:
+            with span("contextualize", budget=round(budget, 2)):
+                try:
+                    search_query = await run_stage(
+                        contextualize_question, req.question, q_dict, timeout=budget, summary=summary
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("⏱️ Contextualization timed out after %.1fs", budget)
+                    set_flag("contextualize_skipped", "timeout")
     
     # Retrieval (DB Call -> Async Wrapper inside retriever)
-    retrieval = await retriever.retrieve(search_query, summary_mode=is_summary)
+    # A summary of the current page searches only that page's chunks; if the
+    # page isn't in the index, fall back to the whole site.
+    # Map-reduce summaries cover many more chunks than fit in one prompt.
+    max_contexts = settings.SUMMARY_MAP_MAX_CHUNKS if is_summary and settings.SUMMARY_MAP_REDUCE_ENABLED else None
+    if retrieval is None and is_summary and req.url:
+        retrieval = await retriever.retrieve(
+            search_query, summary_mode=True, where=metadata_filter(source=req.url), max_contexts=max_contexts
+        )
+        set_flag("page_filter", retrieval["relevant"])
+    if retrieval is None or not retrieval["relevant"]:
+        retrieval = await retriever.retrieve(search_query, summary_mode=is_summary, max_contexts=max_contexts)
     
     if not retrieval["relevant"]:
-        return {
-            "answer": "I cannot find relevant information in the indexed content.",
-            "refusal": True,
-            "sources": [],
-            "confidence": "low",
-            "confidence_score": 0.0,
-            "suggested_questions": []
-        }
+        return {**_no_answer(), "_search_query": search_query}
     
     contexts = retrieval["contexts"]
-    context_sources = retrieval.get("context_sources") or []
+    if max_contexts:
+        contexts = await _map_summary_contexts(retrieval)
     source_objects = retrieval.get("sources") or []
 
-    if is_summary and req.url:
-        filtered = [
-            (text, src_obj)
-            for text, src in zip(contexts, context_sources)
-            for src_obj in source_objects
-            if src == req.url
-        ]
-        if filtered:
-            contexts, _ = zip(*filtered)
-            contexts = list(contexts)
-
-    # Generation (LLM Call -> Blocking)
-    gen_result = await asyncio.to_thread(generate_answer, req.question, contexts, summary_mode=is_summary)
+    # Generation (LLM Call -> Blocking), gets whatever budget is left
+    budget = required_stage_budget()
+    with span("generate", contexts=len(contexts), budget=round(budget, 2)):
+        try:
+            gen_result = await run_stage(
+                generate_answer, req.question, contexts, summary_mode=is_summary, timeout=max(budget, 0.1)
+            )
+        except asyncio.TimeoutError:
+            gen_result = {"timed_out": True}
+        if gen_result.get("timed_out"):
+            logger.warning("⏱️ Generation hit the deadline, returning best passage instead")
+            gen_result = _deadline_fallback(contexts)
     
     duration = (datetime.now() - start_time).total_seconds()
-    
+
+    return {
+        "answer": gen_result["answer"],
+        "refusal": gen_result["refusal"],
+        "confidence": "high" if retrieval["confidence"] > 0.7 else "medium",
+        "confidence_score": retrieval["confidence"],
+        "sources": source_objects,
+        "suggested_questions": _suggestions_with_fallback(req.question, gen_result),
+        "timed_out": bool(gen_result.get("timed_out")),
+        "response_time": round(duration, 2),
+        "_search_query": search_query,
+    }
+
+async def _map_summary_contexts(retrieval: dict) -> List[str]:
+    """
+    Map step of a summary: per-group summaries of the retrieved chunks,
+    which generate_answer then reduces. Small results go straight to
+    generation; without enough latency budget, the top chunks do.
+    """
+    contexts = retrieval["contexts"]
+    groups = group_contexts(contexts, retrieval["context_sources"])
+    if len(groups) <= 1:
+        return contexts
+
+    budget = optional_stage_budget(share=0.6)
+    if budget is None:
+        logger.info("⏱️ Skipping map-reduce summary: not enough latency budget left")
+        set_flag("summary_map_skipped", "budget")
+        return contexts[:settings.MMR_MAX_CONTEXTS_SUMMARY]
+
+    with span("summary_map", groups=len(groups), chunks=len(contexts), budget=round(budget, 2)):
+        try:
+            return await run_stage(map_summaries, groups, timeout=budget)
+        except asyncio.TimeoutError:
+            set_flag("summary_map_skipped", "timeout")
+            return contexts[:settings.MMR_MAX_CONTEXTS_SUMMARY]
+
+def _deadline_fallback(contexts: List[str]) -> dict:
+    """Answer with the top retrieved passage when generation runs out of time."""
+    excerpt = contexts[0][:600] if contexts else ""
+    return {
+        "answer": "I couldn't finish generating an answer in time. The most relevant passage I found:\n\n" + excerpt,
+        "refusal": False,
+        "suggestions": [],
+        "timed_out": True,
+    }
+
+def _no_answer() -> dict:
+    return {
+        "answer": "I cannot find relevant information in the indexed content.",
+        "refusal": True,
+        "sources": [],
+        "confidence": "low",
+        "confidence_score": 0.0,
+        "suggested_questions": []
+    }
+
+def _suggestions_with_fallback(question: str, gen_result: dict) -> List[str]:
     # Suggestion fallback logic
     suggestions = gen_result.get("suggestions", []) or []
     if len(suggestions) < 2:
-        base = req.question.rstrip(" ?.")
+        base = question.rstrip(" ?.")
         fallback = [
             f"What else should I know about {base}?",
             f"Can you highlight any limitations about {base}?",
@@ -180,13 +611,93 @@ async def query_endpoint(req: QueryRequest) -> dict:
         for s in fallback:
             if len(suggestions) >= 3: break
             if s not in suggestions: suggestions.append(s)
+    return suggestions
+
+@router.post("/query/batch")
+async def batch_query_endpoint(req: BatchQueryRequest) -> dict:
+    """
+    Answer many standalone questions in one call (evaluation / bulk FAQ).
+
+    All questions are embedded in one forward pass and searched together;
+    HyDE fallbacks and generation then fan out under a concurrency limit.
+    History is not supported: each question is answered on its own.
+    """
+    with prefetcher.foreground():
+        return await _answer_batch(req)
+
+async def _answer_batch(req: BatchQueryRequest) -> dict:
+    start = time.perf_counter()
+    questions = req.questions
+    summary_flags = [is_summary_request(q) for q in questions]
+
+    # One embedding pass + one engine call for every question. Fetch enough
+    # hits for summary mode; the retriever trims per question.
+    n_results = settings.TOP_K_RESULTS + 5
+    initial = await asyncio.to_thread(
+        store.query_batch, questions, n_results, include_embeddings=settings.MMR_ENABLED
+    )
+    search_s = time.perf_counter() - start
+
+    semaphore = asyncio.Semaphore(req.concurrency or settings.BATCH_CONCURRENCY)
+
+    async def answer_one(question: str, is_summary: bool, results: dict) -> dict:
+        # Each question gets the single-query deadline from submission, so
+        # time spent waiting for a slot counts against it
+        deadline = Deadline(settings.QUERY_DEADLINE_SECONDS)
+        async with semaphore:
+            with deadline.activate():
+                item_start = time.perf_counter()
+                retrieval = await retriever.retrieve(question, summary_mode=is_summary, initial_results=results)
+                retrieval_s = time.perf_counter() - item_start
+
+                if not retrieval["relevant"]:
+                    item = _no_answer()
+                    generation_s = 0.0
+                else:
+                    try:
+                        # Budget read now, when the call starts, not at submission
+                        budget = required_stage_budget()
+                        if budget <= 0:
+                            raise asyncio.TimeoutError()
+                        gen_result = await run_stage(
+                            generate_answer, question, retrieval["contexts"], summary_mode=is_summary,
+                            timeout=budget,
+                        )
+                    except asyncio.TimeoutError:
+                        gen_result = {"timed_out": True}
+                    if gen_result.get("timed_out"):
+                        gen_result = _deadline_fallback(retrieval["contexts"])
+                    generation_s = time.perf_counter() - item_start - retrieval_s
+                    item = {
+                        "answer": gen_result["answer"],
+                        "refusal": gen_result["refusal"],
+                        "confidence": "high" if retrieval["confidence"] > 0.7 else "medium",
+                        "confidence_score": retrieval["confidence"],
+                        "sources": retrieval.get("sources") or [],
+                        "suggested_questions": _suggestions_with_fallback(question, gen_result),
+                        "timed_out": bool(gen_result.get("timed_out")),
+                    }
+
+            if not req.include_sources:
+                item["sources"] = []
+            item["question"] = question
+            item["timings"] = {
+                "retrieval": round(retrieval_s, 3),
+                "generation": round(generation_s, 3),
+                "total": round(time.perf_counter() - item_start, 3),
+            }
+            return item
+
+    results = await asyncio.gather(*[
+        answer_one(q, is_summary, res)
+        for q, is_summary, res in zip(questions, summary_flags, initial)
+    ])
 
     return {
-        "answer": gen_result["answer"],
-        "refusal": gen_result["refusal"],
-        "confidence": "high" if retrieval["confidence"] > 0.7 else "medium",
-        "confidence_score": retrieval["confidence"],
-        "sources": source_objects,
-        "suggested_questions": suggestions,
-        "response_time": round(duration, 2)
-    }
\ No newline at end of file
+        "count": len(results),
+        "results": results,
+        "timings": {
+            "embedding_and_search": round(search_s, 3),
+            "total": round(time.perf_counter() - start, 3),
+        },
+    }
@@ -11,31 +11,135 @@ class Settings(BaseSettings):
     # Model Configuration
     # Model can be changed via environment: LLM_MODEL
     LLM_MODEL: str = Field(default="llama-3.1-8b-instant", env="LLM_MODEL")
+    # Any OpenAI-compatible endpoint (e.g. the stub LLM in scripts/loadtest.py)
+    LLM_BASE_URL: str = "https://api.groq.com/openai/v1"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    # Embedding runtime: "torch" (float32, default), "torch_int8" (dynamic
+    # quantization), "onnx" or "onnx_int8" (ONNX Runtime, CPU), or "remote"
+    # (shared embedding service process)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_THREADS: int = 0  # Intra-op threads; 0 = runtime default
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_CACHE_DIR: str = "./data/models"  # Model weights + ONNX exports
+    # Shared embedding service (EMBEDDING_BACKEND="remote")
+    EMBEDDING_SOCKET: str = "./data/embedding.sock"
+    EMBEDDING_SERVER_BACKEND: str = "torch"  # Local backend the service runs
+    EMBEDDING_SERVER_MAX_BATCH: int = 128  # Texts per forward pass across all workers
+    EMBEDDING_SERVER_MAX_WAIT_MS: float = 5.0  # Wait for more requests before running a batch
+    EMBEDDING_SERVER_CONNECT_TIMEOUT: float = 30.0  # Worker waits this long for the service
+    EMBEDDING_SERVER_REQUEST_TIMEOUT: float = 10.0  # Per request (capped by the query deadline)
     
     # RAG Parameters
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    # Chunk length unit: "chars" (CHUNK_SIZE/CHUNK_OVERLAP) or "tokens"
+    # (embedding-tokenizer tokens, never above the model's max_seq_length)
+    CHUNK_UNIT: str = "chars"
+    CHUNK_SIZE_TOKENS: int = 0  # 0 = the model's full input length
+    CHUNK_OVERLAP_TOKENS: int = 40
+    CHUNK_TRUNCATION_CHECK: bool = False  # Count over-long chunks in "chars" mode too (loads the tokenizer)
+    EMBEDDING_MAX_SEQ_LENGTH: int = 0  # 0 = read from the model config
     DISTANCE_THRESHOLD: float = 0.75
     TOP_K_RESULTS: int = 10
+    QUERY_PLANNER_ENABLED: bool = True  # Skip rewrite/HyDE when not needed
+    HYDE_MIN_CONFIDENCE: float = 0.35  # Best-hit similarity below which HyDE is considered
+    # Maximal marginal relevance: keep a diverse subset of the hits
+    MMR_ENABLED: bool = True
+    MMR_LAMBDA: float = 0.7  # 1.0 = relevance only, 0.0 = diversity only
+    MMR_MAX_CONTEXTS: int = 6  # Contexts passed to generation
+    MMR_MAX_CONTEXTS_SUMMARY: int = 8  # Same, for summary mode
+    # Map-reduce summaries: many chunks are summarized in parallel groups,
+    # then combined in one final call
+    SUMMARY_MAP_REDUCE_ENABLED: bool = True
+    SUMMARY_MAP_MAX_CHUNKS: int = 60  # Chunks covered by a summary
+    SUMMARY_MAP_GROUP_CHARS: int = 6000  # Text per map call
+    SUMMARY_MAP_CONCURRENCY: int = 4  # Concurrent map calls (all requests)
+    ANALYZE_MAX_CHARS: int = 12000  # Text sent to the /analyze LLM call
     
     # Crawler Settings
     MAX_CRAWL_DEPTH: int = 3  # Increased to go deeper
     REQUEST_TIMEOUT: int = 30 
+    # Request blocking, applied inside the browser (see rag/request_filter.py)
+    CRAWL_BLOCKED_RESOURCE_TYPES: List[str] = ["image", "stylesheet", "font", "media"]
+    CRAWL_BLOCKED_DOMAINS: List[str] = [  # Third-party trackers, ads, font CDNs
+        "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+        "googlesyndication.com", "googleadservices.com", "adservice.google.com",
+        "fonts.googleapis.com", "fonts.gstatic.com", "use.typekit.net",
+        "connect.facebook.net", "facebook.net", "hotjar.com", "clarity.ms",
+        "segment.com", "segment.io", "mixpanel.com", "amplitude.com",
+        "scorecardresearch.com", "quantserve.com", "amazon-adsystem.com",
+        "taboola.com", "outbrain.com", "criteo.com", "adnxs.com",
+        "nr-data.net", "js-agent.newrelic.com", "optimizely.com",
+    ]
+    CRAWL_BLOCKED_URL_PATTERNS: List[str] = []  # Extra wildcard URL patterns
+    CRAWL_CHECKPOINT_DIR: str = "./data/crawl_checkpoints"
+    CRAWL_CHECKPOINT_EVERY: int = 5  # Save crawl state every N pages
+    CRAWL_CHECKPOINT_MAX_AGE_HOURS: int = 72  # Older checkpoints are discarded
+    CRAWL_RESUME_ON_STARTUP: bool = True  # Re-queue interrupted crawls at startup
+    
+    # Latency budget for /query (seconds)
+    QUERY_DEADLINE_SECONDS: float = 25.0  # Default end-to-end deadline
+    LLM_TIMEOUT_SECONDS: float = 20.0  # Hard cap for any single LLM call
+    GENERATION_RESERVE_SECONDS: float = 6.0  # Kept back for answer generation
+    OPTIONAL_STAGE_MIN_SECONDS: float = 1.5  # Below this, skip rewrite/HyDE
     USER_AGENT: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     
     # Performance
     MAX_WORKERS: int = 5
     MAX_PAGES_PER_INDEX: int = 50
+    INDEX_WORKERS: int = 1  # Concurrent crawl/index jobs (one browser each)
+    INDEX_QUEUE_DEPTH: int = 8  # Waiting jobs before /index returns 429
+    INDEX_SUPERSEDE_RUNNING: bool = False  # A new /index for a site also cancels its running crawl
+    BATCH_MAX_QUESTIONS: int = 500  # Per /query/batch call
+    BATCH_CONCURRENCY: int = 4  # Concurrent LLM generations per batch
+    
+    # LLM helper cache (question rewrites, HyDE documents)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "./data/llm_cache.sqlite3"
+    LLM_CACHE_MAX_ENTRIES: int = 5000
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    
+    # Server-side conversation sessions (/query with session_id)
+    SESSION_DB_PATH: str = "./data/sessions.sqlite3"  # Shared by all workers
+    SESSION_TTL_SECONDS: int = 1800  # Idle time before a session expires
+    SESSION_MAX: int = 1000  # Least recently used sessions evicted beyond this
+    SESSION_RECENT_MESSAGES: int = 4  # Messages kept verbatim for rewrites
+    SESSION_SUMMARY_MAX_CHARS: int = 1200  # Rolling summary of older turns
+    
+    # Speculative prefetch of suggested follow-up questions (idle time only)
+    PREFETCH_ENABLED: bool = False
+    PREFETCH_GENERATE: bool = True  # Prefetch full answers, not just retrieval
+    PREFETCH_MAX_QUESTIONS: int = 3  # Suggestions prefetched per answer
+    PREFETCH_CONCURRENCY: int = 1
+    PREFETCH_MAX_PENDING: int = 6  # Further prefetches are dropped
+    PREFETCH_TTL_SECONDS: int = 300
+    PREFETCH_MAX_ENTRIES: int = 200
+    PREFETCH_IDLE_WAIT_SECONDS: float = 10.0  # Give up if never idle this long
     
     # Security & CORS
     CORS_ORIGINS: List[str] = ["*"]  
     
     # Database
+    # Engine: "chroma" (HNSW + SQLite) or "flat" (memory-mapped exact search)
+    VECTOR_STORE_ENGINE: str = "chroma"
     CHROMA_PERSIST_DIR: str = "./data/chroma_db"
+    FLAT_INDEX_DIR: str = "./data/flat_index"
+    FLAT_INDEX_DTYPE: str = "float16"  # "float16" or "int8"
+    # Large-site mode: split each index version into N shards searched in
+    # parallel (changing it requires a reindex)
+    VECTOR_STORE_SHARDS: int = 1
+    LARGE_SITE_MAX_PAGES: int = 20000  # Page cap per /index when sharded
+    # Raw crawled pages (zlib, content-addressed) for rebuilds without re-crawling
+    PAGE_STORE_ENABLED: bool = True
+    PAGE_STORE_DIR: str = "./data/pages"
+    PAGE_STORE_COMPRESSION_LEVEL: int = 6
     
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "console"  # "console" (colored) or "json"
+    LOG_QUEUE: bool = True  # Write logs from a background thread
+    LOG_QUEUE_SIZE: int = 10000  # Records buffered before new ones are dropped
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0  # Fraction of DEBUG records kept
     ENVIRONMENT: str = "production"
     
     class Config:
@@ -0,0 +1,98 @@
+"""
+Request Deadlines and Latency Budgets
+=====================================
+A Deadline is an absolute point in time (monotonic clock) by which a
+request must answer. It is made current via a ContextVar, so each stage
+can ask how much time is left and size its own timeout from it, without
+the deadline being threaded through every call.
+
+Stages are either required (generation) or optional (contextualization,
+HyDE). Optional stages only run when, after reserving time for the
+required ones, enough budget is left.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional
+
+from app.core.config import settings
+
+
+class Deadline:
+    """Absolute deadline with helpers to carve out per-stage budgets."""
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, share: float = 1.0, reserve: float = 0.0, cap: Optional[float] = None) -> float:
+        """
+        Seconds a stage may use: `share` of what is left after `reserve`
+        seconds are set aside for later stages, optionally capped.
+        """
+        available = max(0.0, self.remaining() - reserve) * share
+        return min(available, cap) if cap is not None else available
+
+    @contextmanager
+    def activate(self) -> Iterator["Deadline"]:
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def optional_stage_budget(share: float) -> Optional[float]:
+    """
+    Timeout for an optional LLM stage, or None if it should be skipped.
+
+    Without an active deadline the stage still gets the hard per-call cap.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return settings.LLM_TIMEOUT_SECONDS
+    budget = deadline.budget(
+        share=share,
+        reserve=settings.GENERATION_RESERVE_SECONDS,
+        cap=settings.LLM_TIMEOUT_SECONDS,
+    )
+    return budget if budget >= settings.OPTIONAL_STAGE_MIN_SECONDS else None
+
+
+def required_stage_budget() -> float:
+    """Timeout for the final required stage: everything that is left."""
+    deadline = current_deadline()
+    if deadline is None:
+        return settings.LLM_TIMEOUT_SECONDS
+    return min(deadline.remaining(), settings.LLM_TIMEOUT_SECONDS)
+
+
+# Extra time the event loop waits beyond a stage's own client timeout
+# before abandoning the worker thread.
+STAGE_GRACE_SECONDS = 0.5
+
+
+async def run_stage(fn: Callable[..., Any], *args: Any, timeout: float, **kwargs: Any) -> Any:
+    """
+    Run a blocking stage in a thread with `timeout` passed through to it,
+    and stop waiting shortly after. Raises asyncio.TimeoutError on overrun.
+    """
+    return await asyncio.wait_for(
+        asyncio.to_thread(fn, *args, timeout=timeout, **kwargs),
+        timeout=timeout + STAGE_GRACE_SECONDS,
+    )
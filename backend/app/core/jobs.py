@@ -0,0 +1,209 @@
+"""
+Bounded Background Job Queue
+============================
+Runs long background work (site indexing) on a fixed number of workers
+with a bounded queue, instead of one unbounded FastAPI background task per
+request.
+
+- Backpressure: submit() raises QueueFullError once `max_queued` jobs wait
+- Coalescing: submitting a key that is already queued/running returns
+  the existing job
+- Supersession: a new job for the same `group` (e.g. the same site)
+  cancels older queued jobs for that group (and, with supersede_running,
+  the running one too)
+- Cancellation: cancel() drops a queued job or cancels a running task, so
+  the job's own cleanup (browser teardown, build abort) runs
+"""
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Finished jobs kept around so clients can poll their final status
+FINISHED_JOB_HISTORY = 100
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no free slots."""
+
+
+class Job:
+    """One unit of background work and its lifecycle state."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, key: Hashable, group: Hashable, fn: Callable[[], Awaitable[None]],
+                 description: str = "") -> None:
+        self.id = f"job-{next(self._ids)}"
+        self.key = key
+        self.group = group
+        self.fn = fn
+        self.description = description
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "description": self.description,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """Fixed worker pool consuming a bounded FIFO of jobs."""
+
+    def __init__(self, workers: int, max_queued: int, supersede_running: bool = False) -> None:
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self.supersede_running = supersede_running
+        self._pending: Deque[Job] = deque()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # Set during stop(): jobs cancelled now are interrupted, not abandoned
+        self.stopping = False
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        """Start worker tasks (call from the running event loop)."""
+        self._wakeup = asyncio.Condition()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"⚙️ Job queue started: {self.workers} worker(s), queue depth {self.max_queued}")
+
+    async def stop(self) -> None:
+        """Cancel queued and running jobs, wait for their cleanup, and stop the workers."""
+        self.stopping = True
+        running = [j.task for j in self._jobs.values() if j.status == "running" and j.task is not None]
+        for job in list(self._jobs.values()):
+            self.cancel(job.id, reason="shutdown")
+        # Let cancelled jobs finish their teardown (browser close, checkpoint save)
+        await asyncio.gather(*running, return_exceptions=True)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    # ==================== PUBLIC API ====================
+
+    def submit(self, key: Hashable, group: Hashable, fn: Callable[[], Awaitable[None]],
+               description: str = "") -> Job:
+        """
+        Enqueue work. Returns the existing job if one with the same key is
+        still active. Raises QueueFullError if no slot is free.
+        """
+        for job in self._jobs.values():
+            if job.key == key and job.active:
+                return job
+
+        # Superseded jobs free their queue slot / worker, so don't count them
+        superseded = [
+            j for j in self._jobs.values()
+            if j.group == group and (j.status == "queued" or (self.supersede_running and j.status == "running"))
+        ]
+        queued = sum(1 for j in self._pending if j not in superseded)
+        running = sum(1 for j in self._jobs.values() if j.status == "running" and j not in superseded)
+        if queued >= self.max_queued + max(0, self.workers - running):
+            raise QueueFullError(f"Job queue full ({self.max_queued} waiting)")
+
+        for old in superseded:
+            logger.info(f"⏭️ {old.id} superseded by newer request for {group}")
+            self.cancel(old.id, reason="superseded")
+
+        job = Job(key, group, fn, description)
+        self._jobs[job.id] = job
+        self._pending.append(job)
+        self._trim_history()
+        asyncio.create_task(self._notify())
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """1-based place in the queue; 0 once the job has started."""
+        try:
+            return self._pending.index(job) + 1
+        except ValueError:
+            return 0
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return False
+        if job.status == "queued":
+            self._pending.remove(job)
+            self._finish(job, "cancelled", reason)
+        elif job.task is not None:
+            job.error = reason
+            job.task.cancel()  # Worker records the final status
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        running = sum(1 for j in self._jobs.values() if j.status == "running")
+        return {"workers": self.workers, "running": running,
+                "queued": len(self._pending), "max_queued": self.max_queued}
+
+    # ==================== INTERNALS ====================
+
+    async def _notify(self) -> None:
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._pending))
+                job = self._pending.popleft()
+
+            job.status = "running"
+            job.started = time.time()
+            logger.info(f"▶️ Worker {worker_id} running {job.id}: {job.description}")
+            job.task = asyncio.create_task(job.fn())
+            try:
+                # wait() (unlike await) doesn't raise when only the job is cancelled
+                await asyncio.wait({job.task})
+            except asyncio.CancelledError:
+                # The worker itself is being stopped
+                job.task.cancel()
+                self._finish(job, "cancelled", job.error or "shutdown")
+                raise
+
+            if job.task.cancelled():
+                self._finish(job, "cancelled", job.error or "cancelled")
+            elif job.task.exception() is not None:
+                self._finish(job, "failed", str(job.task.exception()))
+            else:
+                self._finish(job, "done")
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        logger.info(f"⏹️ {job.id} {status}" + (f" ({error})" if error else ""))
+
+    def _trim_history(self) -> None:
+        finished = [j for j in self._jobs.values() if not j.active]
+        for job in finished[:max(0, len(finished) - FINISHED_JOB_HISTORY)]:
+            del self._jobs[job.id]
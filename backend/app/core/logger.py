@@ -3,9 +3,27 @@ Structured Logging Configuration
 =================================
 Production-ready logging with colored console output for development.
 Provides clear, scannable logs for debugging and monitoring.
+
+Output goes through one shared handler:
+- LOG_FORMAT: "console" (colored text) or "json" (one object per line)
+- LOG_QUEUE: callers only enqueue records; a background QueueListener
+  thread formats and writes them, so console I/O never blocks the event
+  loop. When the queue is full, records are dropped (and counted) rather
+  than stalling the caller.
+- LOG_DEBUG_SAMPLE_RATE: keep only a fraction of DEBUG records
+
+Use lazy %-style arguments on hot paths (logger.debug("x=%s", x)): with a
+queue, the message is only rendered on the listener thread, and not at all
+if the level is disabled or the record is sampled out.
 """
+import atexit
+import json
 import logging
+import queue
 import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 from app.core.config import settings
 
@@ -50,12 +68,145 @@ class ColoredFormatter(logging.Formatter):
         # Get color for this log level
         color = self.COLORS.get(record.levelname, self.RESET)
         
-        # Add color codes around level name
+        # Add color codes around level name on a copy: the record itself is
+        # shared with every other handler/formatter and must stay unmodified
         # Example: INFO becomes \033[32mINFO\033[0m
-        record.levelname = f"{color}{record.levelname}{self.RESET}"
+        colored = logging.makeLogRecord(record.__dict__)
+        colored.levelname = f"{color}{record.levelname}{self.RESET}"
         
         # Let parent formatter handle the rest (timestamp, message, etc.)
-        return super().format(record)
+        return super().format(colored)
+
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line for log aggregation tools.
+
+    Fields: ts, level, logger, msg, plus exc (traceback) and any values
+    passed with `extra=`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps 1 in N records at or below `level` (N = 1 / rate); higher levels
+    always pass. Counting is per logger, so one chatty module can't starve
+    the others of samples.
+    """
+
+    def __init__(self, rate: float, level: int = logging.DEBUG) -> None:
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.level = level
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        if not self.every:
+            return False
+        with self._lock:
+            count = self._counts.get(record.name, 0)
+            self._counts[record.name] = count + 1
+        return count % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks and defers formatting to the listener.
+
+    The stock handler renders the message in the calling thread (prepare)
+    and reports queue.Full as a handler error; this one enqueues the record
+    as-is and drops it if the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process, so args and exc_info can travel unformatted
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ==================== SHARED HANDLER ====================
+# Built once and attached to every logger from setup_logger()
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+_handler_lock = threading.Lock()
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    # Format: HH:MM:SS | LEVEL | module.name | message
+    return ColoredFormatter(
+        fmt='%(asctime)s | %(levelname)s | %(name)s | %(message)s',
+        datefmt='%H:%M:%S'  # Short time format (hour:minute:second)
+    )
+
+
+def _shared_handler() -> logging.Handler:
+    """The process-wide handler: a queue front-end, or the stream itself."""
+    global _handler, _listener
+    with _handler_lock:
+        if _handler is not None:
+            return _handler
+
+        # Logs to stdout (visible in terminal/console)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.DEBUG)  # Handler shows all levels
+        console_handler.setFormatter(_build_formatter())
+
+        if settings.LOG_QUEUE:
+            handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+            _listener = QueueListener(handler.queue, console_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(shutdown_logging)
+        else:
+            handler = console_handler
+
+        if settings.LOG_DEBUG_SAMPLE_RATE < 1.0:
+            # Filter before enqueueing so sampled-out records cost nothing more
+            handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+        _handler = handler
+        return _handler
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread (idempotent)."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        if isinstance(_handler, DroppingQueueHandler) and _handler.dropped:
+            sys.stderr.write(f"logging: dropped {_handler.dropped} records (queue full)\n")
 
 
 def setup_logger(name: str) -> logging.Logger:
@@ -63,7 +214,7 @@ def setup_logger(name: str) -> logging.Logger:
     Configure and return a logger instance.
     
     Creates a logger with:
-    - Colored console output for development
+    - Colored console (or JSON) output via the shared, queued handler
     - Configurable log level from settings
     - Prevents duplicate handlers if called multiple times
     - Standardized format: timestamp | level | module | message
@@ -95,23 +246,9 @@ def setup_logger(name: str) -> logging.Logger:
     if logger.handlers:
         return logger
     
-    # ==================== CONSOLE HANDLER ====================
-    # Logs to stdout (visible in terminal/console)
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)  # Handler shows all levels
-    
-    # ==================== FORMATTER ====================
-    # Create colored formatter with timestamp and module info
-    # Format: HH:MM:SS | LEVEL | module.name | message
-    formatter = ColoredFormatter(
-        fmt='%(asctime)s | %(levelname)s | %(name)s | %(message)s',
-        datefmt='%H:%M:%S'  # Short time format (hour:minute:second)
-    )
-    
-    console_handler.setFormatter(formatter)
-    
     # ==================== ATTACH HANDLER ====================
-    logger.addHandler(console_handler)
+    # One shared handler (colored or JSON, queued or direct; see module docs)
+    logger.addHandler(_shared_handler())
     
     # ==================== PREVENT PROPAGATION ====================
     # Don't pass logs to parent loggers (prevents duplicates)
@@ -129,9 +266,8 @@ def setup_logger(name: str) -> logging.Logger:
 #    - Example: RotatingFileHandler or TimedRotatingFileHandler
 #
 # 2. Structured Logging:
-#    - JSON format for log aggregation tools
-#    - Include request IDs, user IDs, etc.
-#    - Example: python-json-logger
+#    - JSON format is built in: LOG_FORMAT=json
+#    - Include request IDs, user IDs, etc. via extra={...}
 #
 # 3. Remote Logging:
 #    - Send to centralized logging service
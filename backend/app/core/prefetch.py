@@ -0,0 +1,217 @@
+"""
+Speculative Prefetch
+====================
+Runs likely-next work (e.g. the answers to an answer's suggested
+follow-up questions) in the background, so the request that asks for it
+can be served from memory.
+
+Prefetching is strictly low priority:
+- at most `concurrency` prefetches run at once and at most `max_pending`
+  are queued; anything beyond is dropped, never delayed
+- a prefetch only starts while no foreground request is in flight
+  (callers mark foreground work with `foreground()`), and gives up if the
+  server doesn't go idle within `idle_wait` seconds
+- multi-stage prefetch work calls `yield_to_foreground()` between stages,
+  so a prefetch that is already running pauses (and eventually gives up)
+  as soon as foreground requests arrive
+- everything can be cancelled (cancel_all / stop)
+
+Results are kept for `ttl` seconds in a small LRU. take() hands a stored
+result out once (removing it), awaits one that is already computing, and
+cancels one that has not started yet or is paused (the caller then does
+the work itself).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Key of the prefetch the current task is running (None outside prefetches)
+_current_key: ContextVar[Optional[Hashable]] = ContextVar("prefetch_key", default=None)
+
+
+class PrefetchDropped(Exception):
+    """A running prefetch gave up waiting for the server to go idle."""
+
+
+class Prefetcher:
+    """Bounded, idle-time background computation with a short-TTL result cache."""
+
+    def __init__(self, max_entries: int, ttl: float, concurrency: int = 1,
+                 max_pending: int = 6, idle_wait: float = 10.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.idle_wait = idle_wait
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._running: set = set()  # Keys whose work has started
+        self._paused: set = set()  # Running keys waiting in yield_to_foreground()
+        self._awaited: set = set()  # Running keys a foreground take() is waiting on
+        self._foreground = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stats = {"scheduled": 0, "completed": 0, "dropped": 0, "cancelled": 0, "failed": 0, "pauses": 0, "hits": 0, "misses": 0}
+
+    def _idle_event(self) -> asyncio.Event:
+        # Created lazily so they bind to the server's running loop
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if self._foreground == 0:
+                self._idle.set()
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._idle
+
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Mark a user-facing request as in flight for the duration of the block."""
+        idle = self._idle_event()
+        self._foreground += 1
+        idle.clear()
+        try:
+            yield
+        finally:
+            self._foreground -= 1
+            if self._foreground == 0:
+                idle.set()
+
+    # ==================== Scheduling ====================
+
+    def schedule(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> bool:
+        """Queue fn() for `key` unless it is cached, queued, or over the cap."""
+        self._idle_event()
+        if key in self._tasks or self._fresh(key) is not None:
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self._stats["dropped"] += 1
+            return False
+
+        task = asyncio.create_task(self._run(key, fn))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._forget(key, task))
+        self._stats["scheduled"] += 1
+        return True
+
+    async def _wait_idle(self) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.idle_wait)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with self._slots:
+            if not await self._wait_idle():
+                self._stats["dropped"] += 1
+                return None
+            self._running.add(key)
+            _current_key.set(key)
+            try:
+                value = await fn()
+            except asyncio.CancelledError:
+                raise
+            except PrefetchDropped:
+                self._stats["dropped"] += 1
+                return None
+            except Exception as e:
+                logger.warning("⚠️ Prefetch failed: %s", e)
+                self._stats["failed"] += 1
+                return None
+            self._store(key, value)
+            self._stats["completed"] += 1
+            return value
+
+    async def yield_to_foreground(self) -> None:
+        """
+        Pause point for prefetch work, between stages: waits while foreground
+        requests are in flight, raising PrefetchDropped after `idle_wait`.
+        No-op outside a prefetch, or when a request is waiting on this one.
+        """
+        key = _current_key.get()
+        if key is None or key in self._awaited or self._idle.is_set():
+            return
+        self._paused.add(key)
+        self._stats["pauses"] += 1
+        try:
+            if not await self._wait_idle():
+                raise PrefetchDropped()
+        finally:
+            self._paused.discard(key)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        self._running.discard(key)
+
+    # ==================== Results ====================
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._results[key] = (time.monotonic(), value)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _fresh(self, key: Hashable) -> Optional[Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._results[key]
+            return None
+        return entry[1]
+
+    async def take(self, key: Hashable) -> Optional[Any]:
+        """The prefetched value for `key` (consumed), awaiting it if it is being computed."""
+        value = self._fresh(key)
+        task = self._tasks.get(key)
+        if value is None and task is not None:
+            if key in self._running and key not in self._paused:
+                # Already halfway done: cheaper to wait than to start over
+                self._awaited.add(key)
+                try:
+                    value = await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise  # The caller itself was cancelled
+                finally:
+                    self._awaited.discard(key)
+            else:
+                task.cancel()
+                self._stats["cancelled"] += 1
+        if value is not None:
+            # Served once: the entry doesn't pin the value or an LRU slot
+            self._results.pop(key, None)
+        self._stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    # ==================== Lifecycle ====================
+
+    def cancel_all(self) -> int:
+        """Cancel queued and running prefetches; returns how many."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        self._stats["cancelled"] += len(tasks)
+        return len(tasks)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        self.cancel_all()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._results),
+            "pending": len(self._tasks),
+            "running": len(self._running),
+            "paused": len(self._paused),
+            **self._stats,
+        }
@@ -0,0 +1,56 @@
+"""
+Startup Readiness Tracking
+==========================
+Heavy components (embedding model, vector DB, LLM client) load in the
+background after the server binds. This module records which of them are
+ready so /health/ready can report it, while /health/live answers as soon
+as the process is up.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+
+class Readiness:
+    """Thread-safe registry of component load states."""
+
+    def __init__(self, *components: str) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._state: Dict[str, Dict[str, Optional[object]]] = {
+            name: {"status": "pending", "seconds": None, "error": None}
+            for name in components
+        }
+
+    def mark_ready(self, name: str) -> None:
+        with self._lock:
+            self._state[name] = {
+                "status": "ready",
+                "seconds": round(time.monotonic() - self._started, 2),
+                "error": None,
+            }
+
+    def mark_failed(self, name: str, error: Exception) -> None:
+        with self._lock:
+            self._state[name] = {
+                "status": "failed",
+                "seconds": round(time.monotonic() - self._started, 2),
+                "error": str(error),
+            }
+
+    @property
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(s["status"] == "ready" for s in self._state.values())
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            components = {name: dict(s) for name, s in self._state.items()}
+        return {
+            "ready": all(s["status"] == "ready" for s in components.values()),
+            "uptime": round(time.monotonic() - self._started, 2),
+            "components": components,
+        }
+
+
+readiness = Readiness("embedding_model", "vector_store", "llm_client")
@@ -0,0 +1,281 @@
+"""
+Server-Side Conversation Sessions
+=================================
+Keeps conversation state on the server so clients send a session_id
+instead of their whole history on every /query.
+
+Each session holds:
+- the last few messages verbatim (SESSION_RECENT_MESSAGES), with long
+  assistant answers clipped, for the rewrite prompt
+- a rolling, bounded summary of everything older: earlier questions kept
+  verbatim and the lead sentence of each answer (built locally, no LLM call)
+- the last question and its contextualized search query, so a repeated
+  follow-up reuses the rewrite instead of calling the LLM again
+
+Sessions are stored in SQLite (SESSION_DB_PATH), so every API worker
+sharing the data dir sees the same conversations. They expire after
+SESSION_TTL_SECONDS of inactivity and the least recently used ones are
+evicted beyond SESSION_MAX. A turn is appended with one read-fold-write
+transaction (SessionStore.record), so concurrent turns on one session,
+from any worker, are all kept.
+"""
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Assistant text kept per message in the recent window / per summary line
+RECENT_ANSWER_CHARS = 400
+SUMMARY_ANSWER_CHARS = 160
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.DOTALL)
+
+
+def _lead(text: str, limit: int) -> str:
+    """First sentence of `text`, clipped to `limit` characters."""
+    text = " ".join(text.split())
+    match = _FIRST_SENTENCE.match(text)
+    lead = match.group(1) if match else text
+    return lead if len(lead) <= limit else lead[:limit].rsplit(" ", 1)[0] + "…"
+
+
+class Session:
+    """Conversation state for one client."""
+
+    def __init__(self, session_id: str, created: float = None) -> None:
+        self.id = session_id
+        self.created = created or time.time()
+        self.last_access = self.created
+        self.turns = 0
+        self.recent: Deque[dict] = deque(maxlen=settings.SESSION_RECENT_MESSAGES)
+        self.summary_lines: Deque[str] = deque()
+        self.last_question: Optional[str] = None
+        self.last_search_query: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+
+    def history(self) -> List[dict]:
+        """Recent messages in the QueryRequest.history shape."""
+        with self._lock:
+            return [dict(m) for m in self.recent]
+
+    def cached_rewrite(self, question: str) -> Optional[str]:
+        """The previous search query if `question` repeats the last one."""
+        with self._lock:
+            if self.last_question is not None and _same(question, self.last_question):
+                return self.last_search_query
+        return None
+
+    def record(self, question: str, answer: str, search_query: str) -> None:
+        """Append one question/answer turn, folding overflow into the summary."""
+        if len(answer) > RECENT_ANSWER_CHARS:
+            answer = _lead(answer, RECENT_ANSWER_CHARS)
+        with self._lock:
+            for message in ({"role": "user", "content": question}, {"role": "assistant", "content": answer}):
+                if len(self.recent) == self.recent.maxlen:
+                    self._fold(self.recent[0])
+                self.recent.append(message)
+            self.turns += 1
+            self.last_question = question
+            self.last_search_query = search_query
+
+    def _fold(self, message: dict) -> None:
+        """Compress a message leaving the recent window into the summary."""
+        if message["role"] == "user":
+            self.summary_lines.append(f"Q: {message['content']}")
+        else:
+            self.summary_lines.append(f"A: {_lead(message['content'], SUMMARY_ANSWER_CHARS)}")
+        # Bounded: oldest lines go first
+        while sum(len(line) + 1 for line in self.summary_lines) > settings.SESSION_SUMMARY_MAX_CHARS:
+            self.summary_lines.popleft()
+
+    def state(self) -> Dict[str, Any]:
+        """Persisted fields (see from_state)."""
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "recent": list(self.recent),
+                "summary_lines": list(self.summary_lines),
+                "last_question": self.last_question,
+                "last_search_query": self.last_search_query,
+            }
+
+    @classmethod
+    def from_state(cls, session_id: str, created: float, last_access: float, state: Dict[str, Any]) -> "Session":
+        session = cls(session_id, created)
+        session.last_access = last_access
+        session.turns = state.get("turns", 0)
+        session.recent.extend(state.get("recent", []))
+        session.summary_lines.extend(state.get("summary_lines", []))
+        session.last_question = state.get("last_question")
+        session.last_search_query = state.get("last_search_query")
+        return session
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "session_id": self.id,
+            "turns": self.turns,
+            "created": self.created,
+            "last_access": self.last_access,
+            "summary": self.summary,
+            "recent": self.history(),
+        }
+
+
+def _same(a: str, b: str) -> bool:
+    return " ".join(a.lower().split()).rstrip("?!. ") == " ".join(b.lower().split()).rstrip("?!. ")
+
+
+class SessionStore:
+    """SQLite-backed sessions with idle TTL and LRU eviction."""
+
+    def __init__(self, path: str, max_sessions: int, ttl_seconds: float) -> None:
+        self.path = Path(path)
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "expired": 0, "evicted": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily, like the LLM cache
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, state TEXT, created REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, session_id: str) -> Optional[Session]:
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT state, created, last_access FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                state, created, last_access = row
+                if now - last_access > self.ttl_seconds:
+                    conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                    conn.commit()
+                    self._stats["expired"] += 1
+                    return None
+                conn.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Session read failed: %s", e)
+                return None
+        return Session.from_state(session_id, created, now, json.loads(state))
+
+    def create(self) -> Session:
+        session = Session(secrets.token_urlsafe(12))
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO sessions (id, state, created, last_access) VALUES (?, ?, ?, ?)",
+                    (session.id, json.dumps(session.state()), session.created, session.last_access),
+                )
+                self._stats["created"] += 1
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                # The conversation still works for this request, just isn't kept
+                logger.warning("Session write failed: %s", e)
+        return session
+
+    def record(self, session_id: str, question: str, answer: str, search_query: str) -> Optional[Session]:
+        """
+        Append one turn to the stored session and return its new state.
+
+        The row is read and rewritten under SQLite's write lock, so a turn
+        recorded meanwhile by another request or worker is never
+        overwritten. None if the session is gone (deleted or evicted).
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT state, created FROM sessions WHERE id = ?", (session_id,)
+                    ).fetchone()
+                    if row is None:
+                        conn.rollback()
+                        return None
+                    session = Session.from_state(session_id, row[1], now, json.loads(row[0]))
+                    session.record(question, answer, search_query)
+                    conn.execute(
+                        "UPDATE sessions SET state = ?, last_access = ? WHERE id = ?",
+                        (json.dumps(session.state()), now, session_id),
+                    )
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            except sqlite3.Error as e:
+                logger.warning("Session write failed: %s", e)
+                return None
+        return session
+
+    def get_or_create(self, session_id: Optional[str]) -> Session:
+        """The live session for `session_id`, or a new one if it is unknown/expired."""
+        return (self.get(session_id) if session_id else None) or self.create()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            try:
+                conn = self._connect()
+                deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+                conn.commit()
+                return deleted > 0
+            except sqlite3.Error as e:
+                logger.warning("Session delete failed: %s", e)
+                return False
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        expired = conn.execute(
+            "DELETE FROM sessions WHERE last_access < ?", (time.time() - self.ttl_seconds,)
+        ).rowcount
+        self._stats["expired"] += expired
+        count = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        excess = count - self.max_sessions
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                " SELECT id FROM sessions ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+            self._stats["evicted"] += excess
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            try:
+                active = self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            except sqlite3.Error:
+                active = None
+            return {"active": active, "max_sessions": self.max_sessions, **self._stats}
+
+
+sessions = SessionStore(settings.SESSION_DB_PATH, settings.SESSION_MAX, settings.SESSION_TTL_SECONDS)
@@ -0,0 +1,45 @@
+"""
+Single-Flight Request Coalescing
+================================
+Concurrent callers asking for the same work (same key) share one
+in-flight task instead of each running the full pipeline.
+
+The first caller starts the task; later callers await the same task
+until it finishes. The task is shielded, so a caller that disconnects
+(and is cancelled) does not cancel the work for everyone else.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Deduplicates concurrent async calls by key."""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per key at a time.
+
+        Returns:
+            (result, shared): shared is True if this caller joined a task
+            started by someone else.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
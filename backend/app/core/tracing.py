@@ -0,0 +1,145 @@
+"""
+Request-Scoped Span Tracing
+===========================
+Lightweight timing spans for breaking a single request down by stage.
+
+A Trace is created per request and made current via a ContextVar, so
+any code running for that request (including work offloaded with
+asyncio.to_thread, which copies the context) can open spans and record
+LLM token usage without the trace being passed around explicitly.
+
+All timings use time.perf_counter() (monotonic).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Span:
+    """A named, timed stage of a request. Spans nest into a tree."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.attrs: Dict[str, Any] = {}
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [c.to_dict(origin) for c in self.children]
+        return data
+
+
+class Trace:
+    """
+    Collects the span tree, token counts and flags for one request.
+
+    Usage:
+        trace = Trace("query")
+        with trace.activate():
+            with span("generate"):
+                ...
+        trace.to_dict()
+    """
+
+    def __init__(self, name: str) -> None:
+        self.root = Span(name)
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self.flags: Dict[str, Any] = {}
+
+    @contextmanager
+    def activate(self) -> Iterator["Trace"]:
+        trace_token = _current_trace.set(self)
+        span_token = _current_span.set(self.root)
+        try:
+            yield self
+        finally:
+            self.root.finish()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    def record_usage(self, stage: str, usage: Any) -> None:
+        """Accumulate prompt/completion token counts for an LLM stage."""
+        if usage is None:
+            return
+        counts = self.tokens.setdefault(
+            stage, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        )
+        for key in counts:
+            counts[key] += getattr(usage, key, 0) or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        for counts in self.tokens.values():
+            for key in totals:
+                totals[key] += counts[key]
+        return {
+            "spans": self.root.to_dict(self.root.start),
+            "tokens": {"by_stage": self.tokens, "total": totals},
+            **self.flags,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the trace of the request being served, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a stage as a child of the current span.
+
+    No-op (yields None) when called outside an active trace, so library
+    code can be instrumented unconditionally.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name)
+    child.attrs.update(attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def record_usage(stage: str, usage: Any) -> None:
+    """Record LLM token usage on the current trace (no-op without one)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record_usage(stage, usage)
+
+
+def set_flag(key: str, value: Any) -> None:
+    """Set a request-level flag (e.g. hyde_used) on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.flags[key] = value
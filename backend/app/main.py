@@ -4,8 +4,8 @@ RAG Backend - Main Application Entry Point
 """
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
-from pathlib import Path
 
 # 1. Load Env
 load_dotenv()
@@ -16,9 +16,10 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from app.api.index import router
+from app.api.index import index_jobs, prefetcher, resume_interrupted_crawls, router, warm_up
 from app.core.config import settings
 from app.core.logger import setup_logger
+from app.core.readiness import readiness
 
 logger = setup_logger(__name__)
 
@@ -34,8 +35,19 @@ async def lifespan(app: FastAPI):
     else:
         logger.error("❌ GROQ_API_KEY not found in environment!")
     
-    logger.info("✅ RAG Backend ready to serve requests")
+    # Load model/DB in the background so the server binds immediately.
+    # /health/ready flips to 200 once warm-up finishes.
+    warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    index_jobs.start()
+    if settings.CRAWL_RESUME_ON_STARTUP:
+        resume_interrupted_crawls()
+    logger.info("✅ RAG Backend accepting connections (warm-up in background)")
     yield
+    # Cancel crawls so their browsers are torn down before exit
+    await index_jobs.stop()
+    await prefetcher.stop()
+    if not warmup_task.done():
+        warmup_task.cancel()
     # Shutdown
     logger.info("🛑 RAG Backend shutting down gracefully...")
 
@@ -72,6 +84,17 @@ app.include_router(router, prefix="/api/v1", tags=["RAG"])
 def health_check():
     return {"status": "healthy", "service": "RAG Backend", "version": "2.0.0"}
 
+@app.get("/health/live", tags=["Health"])
+def liveness():
+    """Process is up and serving HTTP. Does not wait for model loading."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"])
+def readiness_check():
+    """Embedding model, vector store and LLM client are loaded."""
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 if __name__ == "__main__":
     import uvicorn
     # Production: Disable reload, use 0.0.0.0
@@ -0,0 +1,208 @@
+"""
+Crawl Checkpoints
+=================
+Periodically persists a running crawl so it can resume after a crash,
+restart or deploy instead of starting over.
+
+A checkpoint (CRAWL_CHECKPOINT_DIR/<key>.json) holds the job parameters,
+the frontier, the visited set and the finished pages. Page bodies are not
+duplicated into it: they go to the page store and are referenced by
+content digest, so each save only rewrites a small JSON file. With
+PAGE_STORE_ENABLED=false the pages are kept inline in the checkpoint
+instead (larger saves, nothing written outside CRAWL_CHECKPOINT_DIR).
+
+Lifecycle: the crawler saves every CRAWL_CHECKPOINT_EVERY pages, when
+interrupted and (marked complete) when the crawl finishes; indexing
+discards the checkpoint once the new index is published (or the job is
+deliberately cancelled). A complete checkpoint resumes straight into
+indexing, without a browser.
+
+Several API workers share CRAWL_CHECKPOINT_DIR. A job holds an exclusive
+flock on <key>.lock while it runs (claim()), so one crawl is never run by
+two workers at once, and only the first worker to start (resume.lock,
+held for its lifetime) re-queues interrupted crawls.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+from app.rag.page_store import page_entry, page_from, page_store
+
+logger = setup_logger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, no cross-process claims needed
+    fcntl = None
+
+# Held for the process lifetime by the worker that resumes crawls
+_resume_lock: Optional[IO] = None
+
+
+def _try_lock(path: Path) -> Optional[IO]:
+    """Open `path` locked exclusively, or None if another process holds it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a+")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+class CrawlCheckpoint:
+    """On-disk state of one crawl job (url, max_pages, max_depth)."""
+
+    def __init__(self, url: str, max_pages: int, max_depth: int) -> None:
+        self.url = url
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        key = hashlib.sha1(f"{url}|{max_pages}|{max_depth}".encode("utf-8")).hexdigest()[:16]
+        self.path = Path(settings.CRAWL_CHECKPOINT_DIR) / f"{key}.json"
+        self.lock_path = self.path.with_suffix(".lock")
+        self.complete = False  # Set by load(): the crawl itself had finished
+        self._digests: Dict[str, str] = {}  # page url -> digest already in the page store
+        self._claim: Optional[IO] = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    # ==================== Claims ====================
+
+    def claim(self) -> bool:
+        """Take the job for this process; False if another worker runs it."""
+        if self._claim is None:
+            self._claim = _try_lock(self.lock_path)
+        return self._claim is not None
+
+    def release(self) -> None:
+        if self._claim is not None:
+            self._claim.close()
+            self._claim = None
+
+    def busy(self) -> bool:
+        """Whether another process currently runs this job."""
+        if self._claim is not None:
+            return False
+        f = _try_lock(self.lock_path)
+        if f is None:
+            return True
+        f.close()
+        return False
+
+    # ==================== State ====================
+
+    def save(self, frontier: List[Tuple[str, int]], visited: Set[str], pages: List[Dict],
+             complete: bool = False) -> None:
+        """Write the current state atomically (blocking; call from a thread)."""
+        entries = []
+        for page in pages:
+            if not settings.PAGE_STORE_ENABLED:
+                entries.append({"url": page["url"], "depth": page.get("depth"), "page": page})
+                continue
+            digest = self._digests.get(page["url"])
+            if digest is None:
+                digest = self._digests[page["url"]] = page_store.put(page)
+            entries.append(page_entry(page, digest))
+
+        state = {
+            "url": self.url,
+            "max_pages": self.max_pages,
+            "max_depth": self.max_depth,
+            "frontier": [list(item) for item in frontier],
+            "visited": sorted(visited),
+            "pages": entries,
+            "complete": complete,
+            "updated": time.time(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+        logger.debug("Checkpoint %s: %d pages, %d queued", self.path.name, len(entries), len(frontier))
+
+    def load(self) -> Optional[Tuple[List[Tuple[str, int]], Set[str], List[Dict]]]:
+        """(frontier, visited, pages) from the last save, or None if unusable."""
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable crawl checkpoint {self.path.name}: {e}")
+            return None
+
+        frontier = [(url, depth) for url, depth in state["frontier"]]
+        visited = set(state["visited"])
+        self.complete = bool(state.get("complete"))
+        pages = []
+        for entry in state["pages"]:
+            if "page" in entry:
+                pages.append(entry["page"])
+                continue
+            record = page_store.get(entry["digest"])
+            if record is None:
+                # Page body lost: fetch it again
+                self.complete = False
+                visited.discard(entry["url"])
+                frontier.insert(0, (entry["url"], entry["depth"]))
+                continue
+            self._digests[entry["url"]] = entry["digest"]
+            pages.append(page_from(record, entry))
+        return frontier, visited, pages
+
+    def discard(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def claim_resume() -> bool:
+    """
+    Whether this process should re-queue interrupted crawls. The first
+    worker to ask keeps the lock until it exits, so the others skip.
+    """
+    global _resume_lock
+    if _resume_lock is None:
+        _resume_lock = _try_lock(Path(settings.CRAWL_CHECKPOINT_DIR) / "resume.lock")
+    return _resume_lock is not None
+
+
+def checkpoint_digests() -> Set[str]:
+    """Page store digests referenced by checkpoints on disk (kept by page store GC)."""
+    digests = set()
+    for path in Path(settings.CRAWL_CHECKPOINT_DIR).glob("*.json"):
+        try:
+            digests.update(entry["digest"] for entry in json.loads(path.read_text())["pages"] if "digest" in entry)
+        except (OSError, ValueError, KeyError):
+            continue
+    return digests
+
+
+def pending_checkpoints() -> List[CrawlCheckpoint]:
+    """
+    Checkpoints of crawls that were interrupted and not finished since.
+    Ones older than CRAWL_CHECKPOINT_MAX_AGE_HOURS are deleted instead.
+    """
+    root = Path(settings.CRAWL_CHECKPOINT_DIR)
+    if not root.exists():
+        return []
+
+    max_age = settings.CRAWL_CHECKPOINT_MAX_AGE_HOURS * 3600
+    pending = []
+    for path in sorted(root.glob("*.json")):
+        try:
+            state = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if time.time() - state.get("updated", 0) > max_age:
+            logger.info(f"🗑️ Dropping stale crawl checkpoint for {state.get('url')}")
+            path.unlink(missing_ok=True)
+            continue
+        pending.append(CrawlCheckpoint(state["url"], state["max_pages"], state["max_depth"]))
+    return pending
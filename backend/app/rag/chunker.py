@@ -3,9 +3,14 @@ Smart Text Chunking with Semantic Boundaries
 =============================================
 Creates overlapping chunks from crawled pages while preserving context.
 Implements multi-level quality filtering and deduplication.
+
+Chunk size is measured in characters by default, or in embedding-model
+tokens with CHUNK_UNIT="tokens" (see app/rag/tokens.py), so no chunk is
+longer than what the model reads.
 """
 import re
-from typing import List, Dict, Set
+from urllib.parse import urlparse
+from typing import Callable, List, Dict, Optional, Set, Tuple
 from app.core.config import settings
 from app.core.logger import setup_logger
 
@@ -35,6 +40,7 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
         List[Dict]: Filtered, deduplicated chunks with id, text, and source
     """
     chunks = []
+    chunk_size, chunk_overlap, measure = _size_policy()
     seen_hashes: Set[int] = set()  # For deduplication
     
     # ==================== NOISE FILTERING BLACKLIST ====================
@@ -60,10 +66,11 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
             text = page.get("text", "")
             url = page.get("url", "unknown")
             depth = page.get("depth", 0)
+            site = urlparse(url).netloc  # For site-scoped metadata filters
             
             # Skip empty pages
             if not text:
-                logger.debug(f"   Page {page_idx}: Skipping (no text)")
+                logger.debug("   Page %d: Skipping (no text)", page_idx)
                 continue
             
             # ==================== NORMALIZE WHITESPACE ====================
@@ -73,7 +80,7 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
             
             # Skip if normalized text is too short
             if len(text) < 50:
-                logger.debug(f"   Page {page_idx}: Skipping (too short after normalization)")
+                logger.debug("   Page %d: Skipping (too short after normalization)", page_idx)
                 continue
             
             # ==================== SPLIT INTO SENTENCES ====================
@@ -85,20 +92,23 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
             sentences = [s.strip() for s in sentences if s.strip()]
             
             if not sentences:
-                logger.debug(f"   Page {page_idx}: Skipping (no valid sentences)")
+                logger.debug("   Page %d: Skipping (no valid sentences)", page_idx)
                 continue
             
+            # ==================== MEASURE SENTENCES ====================
+            # Characters, or tokens (one batched, cached tokenizer call per page)
+            units = _measure_sentences(sentences, chunk_size, measure)
+            
             # ==================== CREATE CHUNKS WITH OVERLAP ====================
             current_chunk_sentences: List[str] = []
+            current_chunk_lengths: List[int] = []
             current_chunk_length = 0
             chunk_id = 0
             page_chunk_count = 0
             
-            for sentence in sentences:
-                sentence_length = len(sentence)
-                
+            for sentence, sentence_length in units:
                 # Check if adding this sentence would exceed chunk size
-                would_exceed = (current_chunk_length + sentence_length) > settings.CHUNK_SIZE
+                would_exceed = (current_chunk_length + sentence_length) > chunk_size
                 has_content = len(current_chunk_sentences) > 0
                 
                 if would_exceed and has_content:
@@ -111,30 +121,38 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
                             "id": f"{url}::chunk_{chunk_id}",
                             "text": chunk_text,
                             "source": url,
+                            "site": site,
                             "depth": depth,
                         })
                         chunk_id += 1
                         page_chunk_count += 1
                     
                     # ==================== CREATE OVERLAP ====================
-                    # Keep last N characters worth of sentences
+                    # Keep last N characters (or tokens) worth of sentences
                     # This preserves context when chunks are split mid-topic
                     overlap_sentences = []
+                    overlap_lengths = []
                     overlap_length = 0
                     
-                    # Work backwards to build overlap
-                    for sent in reversed(current_chunk_sentences):
-                        if overlap_length >= settings.CHUNK_OVERLAP:
+                    # Work backwards to build overlap; the overlap plus the
+                    # next sentence must still fit in one chunk
+                    for sent, length in zip(reversed(current_chunk_sentences), reversed(current_chunk_lengths)):
+                        if overlap_length >= chunk_overlap:
+                            break
+                        if overlap_length + length + sentence_length > chunk_size:
                             break
                         overlap_sentences.insert(0, sent)
-                        overlap_length += len(sent)
+                        overlap_lengths.insert(0, length)
+                        overlap_length += length
                     
                     # Start new chunk with overlap
                     current_chunk_sentences = overlap_sentences
+                    current_chunk_lengths = overlap_lengths
                     current_chunk_length = overlap_length
                 
                 # Add current sentence to chunk
                 current_chunk_sentences.append(sentence)
+                current_chunk_lengths.append(sentence_length)
                 current_chunk_length += sentence_length
             
             # ==================== SAVE FINAL CHUNK ====================
@@ -147,15 +165,16 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
                         "id": f"{url}::chunk_{chunk_id}",
                         "text": chunk_text,
                         "source": url,
+                        "site": site,
                         "depth": depth,
                     })
                     page_chunk_count += 1
             
-            logger.debug(f"   Page {page_idx}: Created {page_chunk_count} chunks")
+            logger.debug("   Page %d: Created %d chunks", page_idx, page_chunk_count)
             
         except Exception as e:
             # Log error but continue with other pages
-            logger.warning(f"   Page {page_idx} chunking error: {e}")
+            logger.warning("   Page %d chunking error: %s", page_idx, e)
             continue
     
     # ==================== SUMMARY ====================
@@ -163,10 +182,86 @@ def chunk_pages_smart(pages: List[Dict]) -> List[Dict]:
     logger.info(f"   Total chunks created: {len(chunks)}")
     logger.info(f"   Average chunk size: {sum(len(c['text']) for c in chunks) // max(len(chunks), 1)} chars")
     logger.info(f"   Unique sources: {len(set(c['source'] for c in chunks))}")
+    # Token-mode chunks are already measured; in "chars" mode the check
+    # has to load the tokenizer, so it is opt-in
+    if settings.CHUNK_UNIT == "tokens" or settings.CHUNK_TRUNCATION_CHECK:
+        report_truncation(chunks)
     
     return chunks
 
 
+# ==================== SIZE POLICY ====================
+
+def _size_policy() -> Tuple[int, int, Optional[Callable[[List[str]], List[int]]]]:
+    """
+    (chunk size, overlap, measure) for settings.CHUNK_UNIT. `measure` is
+    None for characters, otherwise a batched token counter.
+    """
+    if settings.CHUNK_UNIT == "tokens":
+        try:
+            from app.rag.tokens import max_input_tokens, token_counter
+
+            limit = max_input_tokens()
+            size = min(settings.CHUNK_SIZE_TOKENS or limit, limit)
+            logger.info(f"📏 Chunking by tokens: {size} per chunk (model reads {limit}), overlap {settings.CHUNK_OVERLAP_TOKENS}")
+            return size, settings.CHUNK_OVERLAP_TOKENS, token_counter.count
+        except Exception as e:
+            logger.warning(f"⚠️ Tokenizer unavailable ({e}); chunking by characters")
+    return settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, None
+
+
+def _measure_sentences(sentences: List[str], chunk_size: int,
+                       measure: Optional[Callable[[List[str]], List[int]]]) -> List[Tuple[str, int]]:
+    """Pair each sentence with its length; split sentences longer than a chunk (token mode)."""
+    if measure is None:
+        return [(s, len(s)) for s in sentences]
+
+    from app.rag.tokens import split_by_tokens
+
+    units = []
+    for sentence, length in zip(sentences, measure(sentences)):
+        if length <= chunk_size:
+            units.append((sentence, length))
+            continue
+        pieces = split_by_tokens(sentence, chunk_size)
+        units.extend(zip(pieces, measure(pieces)))
+    return units
+
+
+def report_truncation(chunks: List[Dict]) -> Dict[str, int]:
+    """
+    Count chunks longer than the embedding model's input limit (their tail
+    is silently dropped at embedding time) and log a warning if any.
+    """
+    try:
+        from app.rag.tokens import max_input_tokens, token_counter
+
+        limit = max_input_tokens()
+        counts = token_counter.count([c["text"] for c in chunks])
+    except Exception as e:
+        logger.debug(f"Truncation check skipped: {e}")
+        return {}
+
+    over = [(c, n) for c, n in zip(chunks, counts) if n > limit]
+    report = {
+        "chunks": len(chunks),
+        "truncated_chunks": len(over),
+        "tokens_dropped": sum(n - limit for _, n in over),
+        "max_tokens": max(counts, default=0),
+        "limit": limit,
+    }
+    if over:
+        logger.warning(
+            f"✂️ {len(over)}/{len(chunks)} chunks exceed the model's {limit}-token input; "
+            f"{report['tokens_dropped']} tokens will be ignored "
+            f"(longest {report['max_tokens']}, e.g. {over[0][0]['source']}). "
+            f"Set CHUNK_UNIT=tokens to size chunks to the model."
+        )
+    else:
+        logger.info(f"   Longest chunk: {report['max_tokens']} tokens (limit {limit})")
+    return report
+
+
 def _is_valid_chunk(text: str, blacklist: List[str], seen_hashes: Set[int]) -> bool:
     """
     Validate chunk quality through multiple filters.
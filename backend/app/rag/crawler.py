@@ -1,16 +1,20 @@
 import asyncio
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set, Tuple
 from urllib.parse import urlparse
 from playwright.async_api import async_playwright, BrowserContext, Page
 from bs4 import BeautifulSoup
 from app.core.config import settings
 from app.core.logger import setup_logger
+from app.rag.checkpoint import CrawlCheckpoint
+from app.rag.request_filter import RequestFilter
 
 logger = setup_logger(__name__)
 
 class WebCrawler:
     def __init__(self):
         self.visited: Set[str] = set()
+        self.request_filter = RequestFilter.from_settings()
+        self.request_totals = {"allowed": 0, "blocked": 0}
         
     async def get_links(self, page: Page, base_url: str) -> List[str]:
         """Extracts valid links from the rendered page."""
@@ -42,10 +46,12 @@ class WebCrawler:
     async def _process_page(self, context: BrowserContext, url: str, current_depth: int) -> Dict:
         """Internal helper to process a single page."""
         page = await context.new_page()
+        counts = await self.request_filter.attach(context, page)
         try:
             # FIX: Robust Navigation
+            response = None
             try:
-                await page.goto(url, wait_until="domcontentloaded", timeout=settings.REQUEST_TIMEOUT * 1000)
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=settings.REQUEST_TIMEOUT * 1000)
             except Exception as e:
                 logger.warning(f"Timeout/Nav error on {url}: {e}")
                 # Don't return empty yet, try to scrape what loaded
@@ -67,56 +73,111 @@ class WebCrawler:
                 
             return {
                 "url": url,
+                "title": title,
                 "text": f"Title: {title}\nURL: {url}\n\n{body}",
                 "depth": current_depth,
-                "links": links
+                "links": links,
+                # Kept with the raw page in the page store
+                "status": response.status if response else None,
+                "headers": response.headers if response else {},
+                "requests": counts.to_dict(),
             }
         except Exception as e:
             logger.error(f"Error processing {url}: {e}")
             return None
         finally:
+            stats = counts.to_dict()
+            for key in self.request_totals:
+                self.request_totals[key] += stats[key]
+            logger.debug("Requests for %s: %d allowed, %d blocked", url, stats["allowed"], stats["blocked"])
             await page.close()
 
-    async def crawl(self, url: str, max_pages: int = 10, max_depth: int = 2) -> List[Dict]:
-        logger.info(f"🕷️ Starting crawl: {url}")
+    async def crawl(self, url: str, max_pages: int = 10, max_depth: int = 2,
+                    checkpoint: Optional[CrawlCheckpoint] = None) -> List[Dict]:
+        """
+        Breadth-first crawl. With a checkpoint, progress is saved every
+        CRAWL_CHECKPOINT_EVERY pages and on interruption, and a crawl with
+        an existing checkpoint resumes from it instead of starting over.
+        """
         pages = []
         queue = [(url, 1)]  # Tuple: (url, depth)
-        
+
+        state = await asyncio.to_thread(checkpoint.load) if checkpoint and checkpoint.exists() else None
+        if state is not None:
+            queue, self.visited, pages = state
+            if checkpoint.complete:
+                # Only indexing was interrupted: no browser needed
+                logger.info(f"⏩ Crawl of {url} already finished ({len(pages)} pages), indexing")
+                return pages
+            logger.info(f"⏯️ Resuming crawl: {url} ({len(pages)} pages done, {len(queue)} queued)")
+        else:
+            logger.info(f"🕷️ Starting crawl: {url}")
+
+        try:
+            await self._crawl_loop(queue, pages, max_pages, max_depth, checkpoint)
+        except BaseException:
+            # Crash, timeout, cancellation or shutdown: keep what we have
+            if checkpoint is not None:
+                await asyncio.to_thread(checkpoint.save, queue, self.visited, pages)
+                logger.info(f"💾 Crawl checkpointed at {len(pages)} pages")
+            raise
+        if checkpoint is not None:
+            # Final state: if indexing fails after the crawl, a retry skips the crawl
+            await asyncio.to_thread(checkpoint.save, queue, self.visited, pages, True)
+        logger.info(
+            f"🚫 Requests: {self.request_totals['blocked']} blocked, "
+            f"{self.request_totals['allowed']} allowed over {len(pages)} pages"
+        )
+        return pages
+
+    async def _crawl_loop(self, queue: List[Tuple[str, int]], pages: List[Dict], max_pages: int,
+                          max_depth: int, checkpoint: Optional[CrawlCheckpoint]) -> None:
+        since_save = 0
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent=settings.USER_AGENT,
-                ignore_https_errors=True
-            )
-            # Block heavy resources
-            await context.route("**/*", lambda route: route.abort() 
-                if route.request.resource_type in ["image", "stylesheet", "font", "media"] 
-                else route.continue_())
+            browser = await p.chromium.launch(headless=True, args=self.request_filter.launch_args())
+            try:
+                # Heavy resources and trackers are blocked per page, in the
+                # browser (RequestFilter.attach in _process_page)
+                context = await browser.new_context(
+                    user_agent=settings.USER_AGENT,
+                    ignore_https_errors=True
+                )
 
-            while queue and len(self.visited) < max_pages:
-                current_url, depth = queue.pop(0)
-                
-                if current_url in self.visited or depth > max_depth:
-                    continue
-                
-                self.visited.add(current_url)
-                logger.info(f"   Processing: {current_url} (Depth: {depth})")
-                
-                data = await self._process_page(context, current_url, depth)
-                
-                if data and len(data["text"]) > 100:
-                    pages.append(data)
+                while queue and len(self.visited) < max_pages:
+                    current_url, depth = queue.pop(0)
                     
-                    # Add new links to queue
-                    if depth < max_depth:
-                        for link in data["links"]:
-                            if link not in self.visited:
-                                queue.append((link, depth + 1))
-            
-            await browser.close()
-            
-        return pages
+                    if current_url in self.visited or depth > max_depth:
+                        continue
+                    
+                    self.visited.add(current_url)
+                    logger.info(f"   Processing: {current_url} (Depth: {depth})")
+                    
+                    try:
+                        data = await self._process_page(context, current_url, depth)
+                    except BaseException:
+                        # Interrupted mid-page: fetch it again on resume
+                        self.visited.discard(current_url)
+                        queue.insert(0, (current_url, depth))
+                        raise
+                    
+                    if data and len(data["text"]) > 100:
+                        pages.append(data)
+                        
+                        # Add new links to queue
+                        if depth < max_depth:
+                            for link in data["links"]:
+                                if link not in self.visited:
+                                    queue.append((link, depth + 1))
+
+                    since_save += 1
+                    if checkpoint is not None and since_save >= settings.CRAWL_CHECKPOINT_EVERY:
+                        await asyncio.to_thread(checkpoint.save, queue, self.visited, pages)
+                        since_save = 0
+            finally:
+                # Also runs on cancellation (job cancelled/superseded)
+                await browser.close()
 
-async def crawl_site_async(url: str, max_pages: int = 10, max_depth: int = 2):
+async def crawl_site_async(url: str, max_pages: int = 10, max_depth: int = 2,
+                           checkpoint: Optional[CrawlCheckpoint] = None):
     crawler = WebCrawler()
-    return await crawler.crawl(url, max_pages, max_depth)
\ No newline at end of file
+    return await crawler.crawl(url, max_pages, max_depth, checkpoint=checkpoint)
\ No newline at end of file
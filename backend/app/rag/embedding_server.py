@@ -0,0 +1,275 @@
+"""
+Shared Embedding Service
+========================
+One process owns the embedding model; every uvicorn worker reaches it over
+a Unix socket (EMBEDDING_BACKEND="remote"), so N API workers cost one copy
+of the model instead of N and don't fight over cores.
+
+Requests from all workers go into one queue. The batcher takes whatever
+is waiting - up to EMBEDDING_SERVER_MAX_BATCH texts, waiting at most
+EMBEDDING_SERVER_MAX_WAIT_MS for more to arrive - and runs a single
+forward pass, then splits the vectors back per request.
+
+Wire format (both directions): struct "!II" (header length, payload
+length), a JSON header, then the payload.
+    request   header {"texts": [...]}, empty payload
+    response  header {"n": rows, "dim": d} or {"error": msg},
+              payload = float32 row-major matrix
+
+Run (from backend/):
+    python -m app.rag.embedding_server
+    EMBEDDING_BACKEND=remote uvicorn app.main:app --workers 4
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.deadline import current_deadline
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FRAME = struct.Struct("!II")
+
+
+def _encode(header: dict, payload: bytes = b"") -> bytes:
+    body = json.dumps(header).encode("utf-8")
+    return FRAME.pack(len(body), len(payload)) + body + payload
+
+
+# ==================== SERVER ====================
+
+class _Request:
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class EmbeddingServer:
+    """Unix-socket front-end with dynamic cross-client batching."""
+
+    def __init__(self, socket_path: str, backend: str, max_batch: int, max_wait_ms: float) -> None:
+        self.socket_path = socket_path
+        self.backend = backend
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._ef = None
+        self._stats = {"requests": 0, "batches": 0, "texts": 0}
+
+    async def serve(self) -> None:
+        from app.rag.embeddings import build_embedding_function
+
+        logger.info(f"⏳ Loading embedding model: {settings.EMBEDDING_MODEL} (backend: {self.backend})")
+        self._ef = await asyncio.to_thread(build_embedding_function, self.backend)
+        self._queue = asyncio.Queue()
+
+        path = Path(self.socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.unlink()  # Stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=str(path))
+        batcher = asyncio.create_task(self._batcher())
+        logger.info(
+            f"🧮 Embedding service listening on {path} "
+            f"(max batch {self.max_batch}, max wait {self.max_wait * 1000:.0f}ms)"
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if path.exists():
+                path.unlink()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """One client connection; requests on it are answered in order."""
+        try:
+            while True:
+                try:
+                    header_len, payload_len = FRAME.unpack(await reader.readexactly(FRAME.size))
+                    header = json.loads(await reader.readexactly(header_len))
+                    if payload_len:
+                        await reader.readexactly(payload_len)
+                except asyncio.IncompleteReadError:
+                    return  # Client closed the connection
+
+                request = _Request([str(t) for t in header.get("texts", [])])
+                await self._queue.put(request)
+                try:
+                    vectors = await request.future
+                    writer.write(_encode({"n": vectors.shape[0], "dim": vectors.shape[1]}, vectors.tobytes()))
+                except Exception as e:
+                    writer.write(_encode({"error": str(e)}))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _batcher(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+
+            # Gather more requests until the batch is full or the wait is over
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            texts = [t for r in batch for t in r.texts]
+            try:
+                vectors = await asyncio.to_thread(self._embed, texts)
+            except Exception as e:
+                logger.error(f"❌ Embedding batch failed: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                rows = vectors[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(rows)
+
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(texts)
+            logger.debug(
+                "Batch of %d texts from %d requests (avg %.1f texts/batch)",
+                len(texts), len(batch), self._stats["texts"] / self._stats["batches"],
+            )
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self._ef(texts), dtype=np.float32)
+
+
+# ==================== CLIENT ====================
+
+class RemoteEmbeddingFunction:
+    """
+    Embedding function backed by the shared service. Callable like the
+    local backends; each calling thread keeps its own connection.
+
+    Each request gives up after `request_timeout` seconds, or sooner if the
+    calling request's deadline is closer; the connection is then discarded
+    (a late reply would desynchronize it) and TimeoutError is raised.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 30.0,
+                 request_timeout: float = 10.0) -> None:
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        # The service may still be loading its model when workers start
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(
+                        f"Embedding service not reachable at {self.socket_path}: {e}. "
+                        f"Start it with: python -m app.rag.embedding_server"
+                    ) from e
+                time.sleep(0.5)
+
+    def _recv(self, sock: socket.socket, size: int) -> bytes:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = sock.recv(remaining)
+            if not chunk:
+                raise ConnectionError("Embedding service closed the connection")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _timeout(self) -> float:
+        deadline = current_deadline()
+        if deadline is None:
+            return self.request_timeout
+        return max(0.1, min(self.request_timeout, deadline.remaining()))
+
+    def _roundtrip(self, texts: List[str]) -> Tuple[dict, bytes]:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+        sock.settimeout(self._timeout())
+        sock.sendall(_encode({"texts": texts}))
+        header_len, payload_len = FRAME.unpack(self._recv(sock, FRAME.size))
+        header = json.loads(self._recv(sock, header_len))
+        return header, self._recv(sock, payload_len) if payload_len else b""
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        texts = list(input)
+        try:
+            header, payload = self._roundtrip(texts)
+        except TimeoutError:
+            # Service hung or overloaded: retrying would only wait again
+            self._drop_connection()
+            raise TimeoutError(f"Embedding service did not answer within {self._timeout():.1f}s")
+        except OSError:
+            # Service restarted: reconnect once and retry
+            self._drop_connection()
+            try:
+                header, payload = self._roundtrip(texts)
+            except OSError:
+                self._drop_connection()
+                raise
+
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        vectors = np.frombuffer(payload, dtype=np.float32).reshape(header["n"], header["dim"])
+        return vectors.tolist()
+
+    def _drop_connection(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+def main() -> None:
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    backend = settings.EMBEDDING_SERVER_BACKEND
+    if backend == "remote":
+        raise SystemExit("EMBEDDING_SERVER_BACKEND must be a local backend, not 'remote'")
+    server = EmbeddingServer(
+        settings.EMBEDDING_SOCKET,
+        backend=backend,
+        max_batch=settings.EMBEDDING_SERVER_MAX_BATCH,
+        max_wait_ms=settings.EMBEDDING_SERVER_MAX_WAIT_MS,
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+CPU Embedding Backends
+======================
+Selectable runtimes for settings.EMBEDDING_MODEL, chosen by
+settings.EMBEDDING_BACKEND:
+
+- torch       Chroma's SentenceTransformerEmbeddingFunction (float32 baseline)
+- torch_int8  Same model with Linear layers dynamically quantized to int8
+- onnx        Transformer exported once to ONNX and run with ONNX Runtime
+- onnx_int8   ONNX export with dynamic int8 weight quantization
+- remote      Shared embedding service over a Unix socket (one model for
+              all uvicorn workers; see app/rag/embedding_server.py)
+
+All backends load weights from settings.EMBEDDING_CACHE_DIR (downloaded on
+first use, then reused; for "torch" via SENTENCE_TRANSFORMERS_HOME unless
+that is already set) and are callable like a Chroma embedding function:
+ef(list_of_texts) -> list of vectors.
+
+Use scripts/bench_embeddings.py to compare a backend's speed and accuracy
+against the float baseline before switching.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8", "remote")
+
+try:
+    import fcntl
+except ImportError:  # Windows: the thread lock alone guards the export
+    fcntl = None
+
+_export_lock = threading.Lock()
+
+
+class QuantizedTorchEmbeddingFunction:
+    """SentenceTransformer with int8 dynamic quantization of Linear layers."""
+
+    def __init__(self, model_name: str, threads: int = 0) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        model = SentenceTransformer(
+            model_name, device="cpu", cache_folder=settings.EMBEDDING_CACHE_DIR
+        )
+        self.model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(
+            list(input),
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return embeddings.tolist()
+
+
+class OnnxEmbeddingFunction:
+    """
+    Mean-pooled transformer embeddings computed with ONNX Runtime.
+
+    The model is exported from the SentenceTransformer checkpoint on first
+    use and cached as <EMBEDDING_CACHE_DIR>/onnx/<model>[-int8].onnx.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = 0) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = _export_onnx(model_name, quantize)
+        tokenizer_dir = model_path.parent / _safe_name(model_name)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_dir))
+        self.max_length = int((tokenizer_dir / "max_seq_length").read_text())
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        texts = list(input)
+        results = []
+        for i in range(0, len(texts), settings.EMBEDDING_BATCH_SIZE):
+            batch = texts[i:i + settings.EMBEDDING_BATCH_SIZE]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling over non-padding tokens, then L2 normalize
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            results.extend(pooled.tolist())
+        return results
+
+
+def _safe_name(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+
+@contextmanager
+def _exporting(onnx_dir: Path):
+    """Serialize exports across threads and processes (workers, bench script)."""
+    onnx_dir.mkdir(parents=True, exist_ok=True)
+    with _export_lock, open(onnx_dir / "export.lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _staging_path(path: Path) -> Path:
+    # Written beside the target, then os.replace()d into place
+    return path.with_name(f"{path.stem}.tmp{os.getpid()}{path.suffix}")
+
+
+def _export_onnx(model_name: str, quantize: bool) -> Path:
+    """Export the transformer to ONNX once and return the cached file path."""
+    onnx_dir = Path(settings.EMBEDDING_CACHE_DIR) / "onnx"
+    float_path = onnx_dir / f"{_safe_name(model_name)}.onnx"
+    int8_path = onnx_dir / f"{_safe_name(model_name)}-int8.onnx"
+    target = int8_path if quantize else float_path
+    if target.exists():
+        return target
+
+    with _exporting(onnx_dir):
+        # Another process may have finished it while we waited
+        if not float_path.exists():
+            _export_float(model_name, float_path, onnx_dir / _safe_name(model_name))
+        if quantize and not int8_path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info("📦 Quantizing ONNX export to int8 (one-time)...")
+            staging = _staging_path(int8_path)
+            quantize_dynamic(str(float_path), str(staging), weight_type=QuantType.QInt8)
+            os.replace(staging, int8_path)
+    return target
+
+
+def _export_float(model_name: str, float_path: Path, tokenizer_dir: Path) -> None:
+    """Write the float32 export; the .onnx file appears last, once complete."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"📦 Exporting {model_name} to ONNX (one-time)...")
+    model = SentenceTransformer(
+        model_name, device="cpu", cache_folder=settings.EMBEDDING_CACHE_DIR
+    )
+    transformer = model[0].auto_model.eval()
+    tokenizer = model[0].tokenizer
+    tokenizer.save_pretrained(str(tokenizer_dir))
+    (tokenizer_dir / "max_seq_length").write_text(str(model.max_seq_length))
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    staging = _staging_path(float_path)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(staging),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    os.replace(staging, float_path)
+
+
+def build_embedding_function(backend: str = None):
+    """Construct a fresh embedding function for the given backend."""
+    backend = backend or settings.EMBEDDING_BACKEND
+    model_name = settings.EMBEDDING_MODEL
+    threads = settings.EMBEDDING_THREADS
+
+    if backend == "torch":
+        from chromadb.utils import embedding_functions
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        # Chroma's wrapper doesn't take cache_folder in every release;
+        # SentenceTransformer falls back to this variable for its cache dir
+        os.environ.setdefault("SENTENCE_TRANSFORMERS_HOME", settings.EMBEDDING_CACHE_DIR)
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+    if backend == "torch_int8":
+        return QuantizedTorchEmbeddingFunction(model_name, threads=threads)
+    if backend in ("onnx", "onnx_int8"):
+        return OnnxEmbeddingFunction(model_name, quantize=backend == "onnx_int8", threads=threads)
+    if backend == "remote":
+        from app.rag.embedding_server import RemoteEmbeddingFunction
+        return RemoteEmbeddingFunction(
+            settings.EMBEDDING_SOCKET,
+            connect_timeout=settings.EMBEDDING_SERVER_CONNECT_TIMEOUT,
+            request_timeout=settings.EMBEDDING_SERVER_REQUEST_TIMEOUT,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+
+
+# The embedding model (torch + weights) is loaded on first use, not at
+# import time, so the API can bind and answer health checks immediately.
+_ef = None
+_ef_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Return the shared embedding function, loading the model on first call."""
+    global _ef
+    if _ef is None:
+        with _ef_lock:
+            if _ef is None:
+                logger.info(
+                    f"⏳ Loading embedding model: {settings.EMBEDDING_MODEL} "
+                    f"(backend: {settings.EMBEDDING_BACKEND})"
+                )
+                _ef = build_embedding_function()
+    return _ef
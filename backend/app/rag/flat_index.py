@@ -0,0 +1,341 @@
+"""
+Memory-Mapped Flat Vector Index
+===============================
+Exact nearest-neighbour search over a NumPy matrix on disk.
+
+For our index sizes (a few thousand chunks) a brute-force scan is faster
+than HNSW and has no graph or SQLite overhead:
+- Vectors are L2-normalized and stored as float16 or int8 in vectors.npy
+- The matrix is opened with mmap_mode="r" (zero-copy, near-instant open)
+- Document texts are concatenated in documents.bin with an offsets array
+  (doc_offsets.npy); both are memory-mapped and a text is only decoded
+  when it is returned as a hit
+- Ids and metadata live in a small columnar side table (meta.json)
+- add() stages rows in memory; flush() writes the files once (builds
+  flush on publish), so building N chunks costs O(N) I/O, not O(N^2)
+- Top-k = one matrix-vector product + np.argpartition
+- Metadata filters (Chroma `where` subset) narrow the rows before scoring;
+  a source -> rows index makes per-page searches touch only that page
+
+Distances are cosine distances (1 - similarity), matching the Chroma
+collection's "hnsw:space": "cosine" so thresholds stay comparable.
+"""
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# int8 vectors store round(x * 127); scores are rescaled on read
+INT8_SCALE = 127.0
+
+# Rows upcast to float32 per block during search (bounds temporary memory)
+SEARCH_BLOCK_ROWS = 8192
+
+
+class FlatIndex:
+    """Exact cosine search over a memory-mapped, quantized embedding matrix."""
+
+    def __init__(self, path: str, dtype: str = "float16") -> None:
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported flat index dtype '{dtype}' (use float16 or int8)")
+        self.path = Path(path)
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._meta: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": []}
+        self._by_source: Dict[str, np.ndarray] = {}
+        self._known: set = set()  # Ids on disk or staged
+        self._staged: Dict[str, list] = {"vectors": [], "ids": [], "documents": [], "metadatas": []}
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ==================== PERSISTENCE ====================
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "meta.json"
+
+    @property
+    def _documents_file(self) -> Path:
+        return self.path / "documents.bin"
+
+    @property
+    def _offsets_file(self) -> Path:
+        return self.path / "doc_offsets.npy"
+
+    def _load(self) -> None:
+        if not self._vectors_file.exists() or not self._meta_file.exists():
+            return
+        meta = json.loads(self._meta_file.read_text())
+        if meta.get("dtype", self.dtype) != self.dtype:
+            logger.warning(
+                f"Flat index at {self.path} was built as {meta.get('dtype')}, "
+                f"configured {self.dtype}; using stored dtype"
+            )
+            self.dtype = meta["dtype"]
+        self._vectors = np.load(self._vectors_file, mmap_mode="r")
+        if "documents" in meta:
+            documents = meta["documents"]  # Older layout: texts inline in meta.json
+        else:
+            documents = DocumentColumn.open(self._documents_file, self._offsets_file)
+        self._meta = {"ids": meta["ids"], "documents": documents, "metadatas": meta["metadatas"]}
+        self._by_source = _source_index(self._meta["metadatas"])
+        self._known = set(meta["ids"])
+
+    def flush(self) -> None:
+        """
+        Write staged rows: existing vectors and texts are streamed into new
+        files followed by the staged ones, then all files are swapped in
+        with os.replace (meta.json last).
+        """
+        with self._lock:
+            if not self._staged["ids"]:
+                return
+            staged, self._staged = self._staged, {"vectors": [], "ids": [], "documents": [], "metadatas": []}
+            old_vectors, old_meta = self._vectors, self._meta
+            new_vectors = np.concatenate(staged["vectors"])
+            old_rows = len(old_vectors) if old_vectors is not None else 0
+
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_vectors = self.path / "vectors.tmp.npy"
+            tmp_documents = self.path / "documents.tmp.bin"
+            tmp_offsets = self.path / "doc_offsets.tmp.npy"
+            tmp_meta = self.path / "meta.tmp.json"
+
+            out = np.lib.format.open_memmap(
+                tmp_vectors, mode="w+", dtype=new_vectors.dtype,
+                shape=(old_rows + len(new_vectors), new_vectors.shape[1]),
+            )
+            for start in range(0, old_rows, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, old_rows)
+                out[start:end] = old_vectors[start:end]
+            out[old_rows:] = new_vectors
+            out.flush()
+            del out
+
+            old_documents = old_meta["documents"]
+            if isinstance(old_documents, DocumentColumn):
+                shutil.copyfile(self._documents_file, tmp_documents)
+                offsets = [np.asarray(old_documents.offsets)]
+            else:
+                tmp_documents.write_bytes(b"")
+                offsets = [np.zeros(1, dtype=np.int64)]
+                staged["documents"] = list(old_documents) + staged["documents"]
+            with open(tmp_documents, "ab") as f:
+                lengths = []
+                for text in staged["documents"]:
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    lengths.append(len(data))
+            offsets.append(offsets[0][-1] + np.cumsum(lengths, dtype=np.int64))
+            np.save(tmp_offsets, np.concatenate(offsets))
+
+            meta = {
+                "dtype": self.dtype,
+                "ids": old_meta["ids"] + staged["ids"],
+                "metadatas": old_meta["metadatas"] + staged["metadatas"],
+            }
+            tmp_meta.write_text(json.dumps(meta))
+
+            self._vectors = None  # Release our mappings (Windows can't replace a mapped file)
+            os.replace(tmp_vectors, self._vectors_file)
+            os.replace(tmp_documents, self._documents_file)
+            os.replace(tmp_offsets, self._offsets_file)
+            os.replace(tmp_meta, self._meta_file)
+            self._load()
+
+    def _quantize(self, embeddings: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return np.clip(np.rint(embeddings * INT8_SCALE), -127, 127).astype(np.int8)
+        return embeddings.astype(np.float16)
+
+    # ==================== PUBLIC API ====================
+
+    def count(self) -> int:
+        return len(self._meta["ids"]) + len(self._staged["ids"])
+
+    def add(self, ids: List[str], embeddings: list, documents: List[str], metadatas: List[dict]) -> None:
+        """
+        Stage rows for the next flush(). Ids already in the index are
+        skipped (like Chroma). Staged rows are not searchable yet.
+        """
+        with self._lock:
+            keep = [i for i, id_ in enumerate(ids) if id_ not in self._known]
+            if not keep:
+                return
+
+            new = _normalize(np.asarray([embeddings[i] for i in keep], dtype=np.float32))
+            self._staged["vectors"].append(self._quantize(new))
+            for i in keep:
+                self._known.add(ids[i])
+                self._staged["ids"].append(ids[i])
+                self._staged["documents"].append(documents[i])
+                self._staged["metadatas"].append(metadatas[i])
+
+    def query(self, query_embeddings: list, n_results: int, where: Optional[dict] = None,
+              include_embeddings: bool = False) -> dict:
+        """
+        Exact top-k for each query vector, optionally only over rows whose
+        metadata matches `where`. Returns Chroma-shaped results (plus the
+        hits' unit-length float32 vectors under "embeddings" if requested).
+        """
+        # Snapshot so a concurrent add() swapping files can't tear this read
+        vectors, meta, by_source = self._vectors, self._meta, self._by_source
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            results["embeddings"] = []
+        rows = None if vectors is None else _filter_rows(where, meta["metadatas"], by_source)
+        if vectors is None or not len(vectors) or (rows is not None and not len(rows)):
+            for key in results:
+                results[key] = [[] for _ in query_embeddings]
+            return results
+
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        if rows is not None:
+            # Gather only the candidate rows, then map positions back to row ids
+            scores = _scores(vectors[rows], queries)
+        else:
+            scores = _scores(vectors, queries)
+            rows = np.arange(len(vectors))
+        if self.dtype == "int8":
+            scores /= INT8_SCALE
+
+        k = min(n_results, scores.shape[1])
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+            top = top[np.argsort(-row[top])]
+            results["ids"].append([meta["ids"][rows[i]] for i in top])
+            results["documents"].append([meta["documents"][rows[i]] for i in top])
+            results["metadatas"].append([meta["metadatas"][rows[i]] for i in top])
+            results["distances"].append([float(1.0 - row[i]) for i in top])
+            if include_embeddings:
+                hits = np.asarray(vectors[rows[top]], dtype=np.float32)
+                results["embeddings"].append(_normalize(hits) if len(hits) else hits)
+        return results
+
+    def drop(self) -> None:
+        """Remove all rows and the on-disk files."""
+        with self._lock:
+            self._vectors = None
+            self._meta = {"ids": [], "documents": [], "metadatas": []}
+            self._by_source = {}
+            self._known = set()
+            self._staged = {"vectors": [], "ids": [], "documents": [], "metadatas": []}
+            if self.path.exists():
+                shutil.rmtree(self.path)
+
+
+class DocumentColumn:
+    """Read-only list of texts over a memory-mapped UTF-8 blob and offsets."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray) -> None:
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, data_file: Path, offsets_file: Path) -> "DocumentColumn":
+        offsets = np.load(offsets_file, mmap_mode="r")
+        # np.memmap can't map an empty file
+        if data_file.stat().st_size:
+            data = np.memmap(data_file, dtype=np.uint8, mode="r")
+        else:
+            data = np.empty(0, dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+
+def _source_index(metadatas: List[dict]) -> Dict[str, np.ndarray]:
+    """source URL -> sorted row numbers of that page's chunks."""
+    index: Dict[str, List[int]] = {}
+    for row, meta in enumerate(metadatas):
+        source = (meta or {}).get("source")
+        if source is not None:
+            index.setdefault(source, []).append(row)
+    return {source: np.asarray(rows, dtype=np.int64) for source, rows in index.items()}
+
+
+_OPERATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def _matches(meta: dict, where: Dict[str, Any]) -> bool:
+    """Evaluate the subset of Chroma's `where` syntax we use on one row."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(meta, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(meta, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = meta.get(key)
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif meta.get(key) != condition:
+            return False
+    return True
+
+
+def pinned_source(where: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The exact source a `where` clause requires, if it pins one."""
+    if not where:
+        return None
+    source = where.get("source")
+    if isinstance(source, dict):
+        source = source.get("$eq")
+    if source is None:
+        for condition in where.get("$and", []):
+            source = pinned_source(condition)
+            if source is not None:
+                break
+    return source if isinstance(source, str) else None
+
+
+def _filter_rows(where: Optional[dict], metadatas: List[dict],
+                 by_source: Dict[str, np.ndarray]) -> Optional[np.ndarray]:
+    """Row numbers matching `where`, or None for no filter (all rows)."""
+    if not where:
+        return None
+    source = pinned_source(where)
+    candidates = by_source.get(source, np.empty(0, dtype=np.int64)) if source is not None \
+        else range(len(metadatas))
+    return np.asarray([i for i in candidates if _matches(metadatas[i] or {}, where)], dtype=np.int64)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
+
+
+def _scores(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """queries @ vectors.T, upcasting the stored matrix one block at a time."""
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    return scores
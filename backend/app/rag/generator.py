@@ -1,49 +1,116 @@
 from __future__ import annotations
 import json
+import threading
 from typing import Dict, List
 
-from openai import OpenAI
 from app.core.config import settings
 from app.core.logger import setup_logger
+from app.core.tracing import record_usage, set_flag
+from app.rag.llm_cache import llm_cache
 
 logger = setup_logger(__name__)
 
-# Initialize Groq Client safely
-client = None
-if settings.GROQ_API_KEY:
-    try:
-        client = OpenAI(
-            api_key=settings.GROQ_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
-        )
-        logger.info(f"✅ Groq Client Configured (Model: {settings.LLM_MODEL})")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Groq client: {e}")
-else:
-    logger.warning("⚠️ GROQ_API_KEY missing. LLM features will be disabled.")
+# Groq client is built on first use (see get_client) so importing this
+# module never blocks server startup.
+_client = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared Groq client, or None if no API key is configured."""
+    global _client, _client_initialized
+    if _client_initialized:
+        return _client
+    with _client_lock:
+        if _client_initialized:
+            return _client
+        if settings.GROQ_API_KEY:
+            try:
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=settings.GROQ_API_KEY,
+                    base_url=settings.LLM_BASE_URL
+                )
+                logger.info("✅ Groq Client Configured (Model: %s, %s)", settings.LLM_MODEL, settings.LLM_BASE_URL)
+            except Exception as e:
+                logger.error("❌ Failed to initialize Groq client: %s", e)
+        else:
+            logger.warning("⚠️ GROQ_API_KEY missing. LLM features will be disabled.")
+        _client_initialized = True
+    return _client
+
+# Bump when a helper prompt changes so cached outputs from the old prompt
+# are no longer served.
+CONTEXTUALIZE_PROMPT_VERSION = "v1"
+HYDE_PROMPT_VERSION = "v1"
+
+def _bounded(client, timeout: float = None):
+    """Client whose calls give up after `timeout` seconds (no retries past it)."""
+    return client.with_options(
+        timeout=timeout or settings.LLM_TIMEOUT_SECONDS,
+        max_retries=0 if timeout else 2,
+    )
 
-def contextualize_question(question: str, history: List[dict]) -> str:
+def _is_timeout(error: Exception) -> bool:
+    from openai import APITimeoutError
+    return isinstance(error, APITimeoutError)
+
+def _cache_lookup(namespace: str, version: str, cache_input: str) -> tuple:
+    """Return (cache_key, cached_value) for a helper call; key is None if disabled."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None, None
+    key = llm_cache.make_key(namespace, settings.LLM_MODEL, version, cache_input)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        set_flag(f"{namespace}_cache_hit", True)
+    return key, cached
+
+def contextualize_question(question: str, history: List[dict], timeout: float = None, summary: str = "") -> str:
+    client = get_client()
     if "summarize" in question.lower() or not history or not client:
         return question
     
-    messages = [{"role": "system", "content": "Rewrite the user's question to be a specific search query based on the history."}]
-    for msg in history[-3:]:
+    recent = history[-3:]
+    cache_input = "\n".join(f"{m.get('role')}: {m.get('content', '')}" for m in recent) + f"\n>> {question}"
+    if summary:
+        cache_input = f"{summary}\n--\n{cache_input}"
+    cache_key, cached = _cache_lookup("contextualize", CONTEXTUALIZE_PROMPT_VERSION, cache_input)
+    if cached is not None:
+        return cached
+
+    system = "Rewrite the user's question to be a specific search query based on the history."
+    if summary:
+        system += f"\n\nEarlier in the conversation:\n{summary}"
+    messages = [{"role": "system", "content": system}]
+    for msg in recent:
         role = "user" if msg.get("role") == "user" else "assistant"
         messages.append({"role": role, "content": msg.get("content", "")})
     messages.append({"role": "user", "content": f"Rewrite: {question}"})
     
     try:
-        resp = client.chat.completions.create(
+        resp = _bounded(client, timeout).chat.completions.create(
             model=settings.LLM_MODEL, messages=messages, temperature=0.3
         )
-        return resp.choices[0].message.content.strip()
-    except Exception:
+        record_usage("contextualize", resp.usage)
+        rewritten = resp.choices[0].message.content.strip()
+        if cache_key and rewritten:
+            llm_cache.set(cache_key, "contextualize", rewritten)
+        return rewritten
+    except Exception as e:
+        if _is_timeout(e):
+            logger.warning("⏱️ Contextualization timed out after %ss, using original question", timeout)
         return question
 
-def generate_hyde_doc(question: str) -> str:
+def generate_hyde_doc(question: str, timeout: float = None) -> str:
+    client = get_client()
     if not client: return question
+
+    cache_key, cached = _cache_lookup("hyde", HYDE_PROMPT_VERSION, question)
+    if cached is not None:
+        return cached
+
     try:
-        resp = client.chat.completions.create(
+        resp = _bounded(client, timeout).chat.completions.create(
             model=settings.LLM_MODEL,
             messages=[
                 {"role": "system", "content": "Write a hypothetical answer to the user's question. Be direct."},
@@ -51,33 +118,46 @@ def generate_hyde_doc(question: str) -> str:
             ],
             temperature=0.5,
         )
-        return resp.choices[0].message.content.strip()
+        record_usage("hyde_generation", resp.usage)
+        hyde_doc = resp.choices[0].message.content.strip()
+        if cache_key and hyde_doc:
+            llm_cache.set(cache_key, "hyde", hyde_doc)
+        return hyde_doc
     except Exception as e:
-        logger.warning(f"HyDE generation failed: {e}")
+        logger.warning("HyDE generation failed: %s", e)
         return question
 
 def analyze_content(contexts: List[str]) -> Dict[str, object]:
+    client = get_client()
     if not client or not contexts:
         return {"topics": [], "type": "Unknown", "summary": "Analysis unavailable."}
 
-    sample_text = "\n".join(contexts[:2] + contexts[-2:] if len(contexts) > 4 else contexts)
+    # Long pages arrive condensed (map-reduce group summaries); the cap only
+    # bounds raw chunks (map-reduce off) so the call fits the model's window
+    text = "\n\n".join(contexts)
+    if len(text) > settings.ANALYZE_MAX_CHARS:
+        logger.info("Analysis input clipped: %d -> %d chars", len(text), settings.ANALYZE_MAX_CHARS)
+        text = text[:settings.ANALYZE_MAX_CHARS]
     prompt = (
-        "Analyze this text sample. Return JSON with keys: 'topics' (list[str]), "
-        "'type' (str), 'summary' (str).\n\n" + sample_text[:3000]
+        "Analyze this text. Return JSON with keys: 'topics' (list[str]), "
+        "'type' (str), 'summary' (str).\n\n" + text
     )
 
     try:
-        resp = client.chat.completions.create(
+        resp = _bounded(client).chat.completions.create(
             model=settings.LLM_MODEL,
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"},
             temperature=0.3,
         )
+        record_usage("analyze", resp.usage)
         return json.loads(resp.choices[0].message.content)
-    except Exception:
+    except Exception as e:
+        logger.warning("Content analysis failed: %s", e)
         return {"topics": ["General"], "type": "Web Content", "summary": "Content indexed successfully."}
 
-def generate_answer(question: str, contexts: list, summary_mode: bool = False) -> dict:
+def generate_answer(question: str, contexts: list, summary_mode: bool = False, timeout: float = None) -> dict:
+    client = get_client()
     if not client: 
         return {"answer": "LLM Service Unavailable. Check API Key.", "refusal": True, "suggestions": []}
 
@@ -89,7 +169,7 @@ def generate_answer(question: str, contexts: list, summary_mode: bool = False) -
         sys_msg = "Answer using ONLY the context. Then output '<<<FOLLOWUP>>>' and 3 questions."
 
     try:
-        resp = client.chat.completions.create(
+        resp = _bounded(client, timeout).chat.completions.create(
             model=settings.LLM_MODEL,
             messages=[
                 {"role": "system", "content": sys_msg},
@@ -97,6 +177,7 @@ def generate_answer(question: str, contexts: list, summary_mode: bool = False) -
             ],
             temperature=0.3
         )
+        record_usage("generate", resp.usage)
         
         full_text = resp.choices[0].message.content.strip()
         parts = full_text.split("<<<FOLLOWUP>>>")
@@ -110,5 +191,8 @@ def generate_answer(question: str, contexts: list, summary_mode: bool = False) -
         return {"answer": answer, "refusal": False, "suggestions": suggestions}
         
     except Exception as e:
-        logger.error(f"Generation Error: {e}")
+        if _is_timeout(e):
+            logger.warning("⏱️ Generation timed out after %ss", timeout)
+            return {"answer": "Error generating answer.", "refusal": True, "suggestions": [], "timed_out": True}
+        logger.error("Generation Error: %s", e)
         return {"answer": "Error generating answer.", "refusal": True, "suggestions": []}
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Persistent LLM Response Cache
+=============================
+SQLite-backed memoization for cheap, repeatable LLM helper calls
+(question rewrites, HyDE documents).
+
+Entries are keyed by (namespace, model, prompt template version,
+normalized input), so changing the model or editing a prompt and bumping
+its version never serves stale output. The cache is bounded in size
+(least-recently-used rows are evicted) and entries expire after a TTL.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case/whitespace/trailing-punctuation-insensitive form of an input."""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+class LLMCache:
+    """Size-bounded, TTL'd key/value store for LLM outputs."""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing the generator stays cheap
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, namespace TEXT, value TEXT,"
+                " created REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON llm_cache(last_access)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(namespace: str, model: str, template_version: str, text: str) -> str:
+        raw = "\x1f".join([namespace, model, template_version, normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+                value, created = row
+                if now - created > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self._stats["hits"] += 1
+                return value
+            except sqlite3.Error as e:
+                logger.warning("LLM cache read failed: %s", e)
+                self._stats["misses"] += 1
+                return None
+
+    def set(self, key: str, namespace: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, namespace, value, created, last_access)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, value, now, now),
+                )
+                count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+                excess = count - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        " SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                        (excess,),
+                    )
+                    self._stats["evictions"] += excess
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("LLM cache write failed: %s", e)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+            try:
+                stats["entries"] = self._connect().execute(
+                    "SELECT COUNT(*) FROM llm_cache"
+                ).fetchone()[0]
+            except sqlite3.Error:
+                stats["entries"] = None
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+llm_cache = LLMCache(
+    settings.LLM_CACHE_PATH,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+)
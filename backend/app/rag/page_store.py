@@ -0,0 +1,205 @@
+"""
+Compressed Raw Page Store
+=========================
+Keeps every crawled page on disk so the index can be rebuilt (re-chunked,
+re-embedded) without crawling the site again through Playwright.
+
+Layout under PAGE_STORE_DIR:
+
+    objects/ab/<sha256>.json.z   zlib-compressed page content (text, title,
+                                 links), named by its digest
+    sites/<site hash>.json       manifest of one crawl: start URL and an
+                                 ordered list of per-URL entries
+                                 {url, digest, depth, headers, status}
+
+Objects are content-addressed over the content fields only, so a page
+whose body is unchanged is stored once even if its fetch headers (Date,
+ETag, ...) differ between crawls; those live in the manifest entry.
+
+Objects no manifest (or live crawl checkpoint) references anymore are
+removed by collect_garbage(), after a crawl replaced its manifest.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Page fields persisted in a content object (and hashed into its digest)
+CONTENT_FIELDS = ("title", "text", "links")
+# Per-fetch fields, kept in the URL's manifest/checkpoint entry
+ENTRY_FIELDS = ("url", "headers", "status")
+
+# Unreferenced objects younger than this are kept: a crawl in another
+# worker may have written them before saving the checkpoint that refers to them
+GC_GRACE_SECONDS = 3600
+
+
+def page_entry(page: Dict, digest: str) -> Dict:
+    """Per-URL entry pointing at the content object `digest`."""
+    return {**{field: page.get(field) for field in ENTRY_FIELDS}, "digest": digest, "depth": page.get("depth")}
+
+
+def page_from(record: Dict, entry: Dict) -> Dict:
+    """Crawler-shaped page from a content object and its entry."""
+    # Objects written before the content/entry split also carry url/headers/status
+    return {**record, **{field: entry[field] for field in ENTRY_FIELDS if field in entry}, "depth": entry.get("depth")}
+
+
+class PageStore:
+    """Content-addressed, compressed store of crawled pages."""
+
+    def __init__(self, root: str, level: int = 6) -> None:
+        self.root = Path(root)
+        self.level = level
+        self._lock = threading.Lock()
+
+    # ==================== OBJECTS ====================
+
+    @staticmethod
+    def _digest(record: Dict) -> str:
+        # Only CONTENT_FIELDS go in: identical content always has the same digest
+        canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.json.z"
+
+    def put(self, page: Dict) -> str:
+        """Store one page's content; returns its digest."""
+        record = {field: page.get(field) for field in CONTENT_FIELDS}
+        digest = self._digest(record)
+        path = self._object_path(digest)
+        if path.exists():
+            path.touch()  # Reused: restart its GC grace period
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_bytes(zlib.compress(payload, self.level))
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[Dict]:
+        try:
+            return json.loads(zlib.decompress(self._object_path(digest).read_bytes()))
+        except (OSError, zlib.error, ValueError) as e:
+            logger.warning(f"⚠️ Stored page {digest[:12]} unreadable: {e}")
+            return None
+
+    # ==================== MANIFESTS ====================
+
+    def _manifest_path(self, site: str) -> Path:
+        return self.root / "sites" / f"{hashlib.sha1(site.encode('utf-8')).hexdigest()}.json"
+
+    def save_crawl(self, site: str, pages: List[Dict]) -> Dict:
+        """
+        Persist a finished crawl of `site` (replacing its previous manifest).
+
+        Returns:
+            The manifest, with page count and raw/compressed sizes
+        """
+        entries = []
+        raw_bytes = stored_bytes = 0
+        for page in pages:
+            digest = self.put(page)
+            entries.append(page_entry(page, digest))
+            raw_bytes += len(page.get("text") or "")
+            stored_bytes += self._object_path(digest).stat().st_size
+
+        manifest = {"site": site, "crawled_at": time.time(), "pages": entries}
+        path = self._manifest_path(site)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(manifest))
+            os.replace(tmp, path)
+
+        logger.info(
+            f"💾 Stored {len(entries)} pages for {site} "
+            f"({raw_bytes / 1024:.0f} KB text → {stored_bytes / 1024:.0f} KB on disk)"
+        )
+        return manifest
+
+    def manifest(self, site: str) -> Optional[Dict]:
+        try:
+            return json.loads(self._manifest_path(site).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def latest_site(self) -> Optional[str]:
+        """Start URL of the most recently stored crawl."""
+        manifests = sorted((self.root / "sites").glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in reversed(manifests):
+            try:
+                return json.loads(path.read_text())["site"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return None
+
+    def load_pages(self, site: str) -> List[Dict]:
+        """
+        Pages of the last stored crawl of `site`, in crawl order, shaped
+        like crawler output so they can go straight into the chunker.
+        """
+        manifest = self.manifest(site)
+        if manifest is None:
+            return []
+
+        pages = []
+        for entry in manifest["pages"]:
+            record = self.get(entry["digest"])
+            if record is not None:
+                pages.append(page_from(record, entry))
+        return pages
+
+    # ==================== GC ====================
+
+    def collect_garbage(self, keep: Iterable[str] = ()) -> int:
+        """
+        Delete objects referenced by no manifest and not in `keep` (e.g.
+        digests of live crawl checkpoints). Returns how many were removed.
+        """
+        objects = self.root / "objects"
+        if not objects.exists():
+            return 0
+
+        with self._lock:
+            referenced = set(keep)
+            for path in (self.root / "sites").glob("*.json"):
+                try:
+                    referenced.update(entry["digest"] for entry in json.loads(path.read_text())["pages"])
+                except (OSError, ValueError, KeyError):
+                    # Can't tell what an unreadable manifest refers to: delete nothing
+                    logger.warning(f"⚠️ Skipping page store GC, unreadable manifest {path.name}")
+                    return 0
+
+            cutoff = time.time() - GC_GRACE_SECONDS
+            removed = freed = 0
+            for path in objects.glob("*/*.json.z"):
+                if path.name[:-len(".json.z")] in referenced:
+                    continue
+                try:
+                    stat = path.stat()
+                    if stat.st_mtime > cutoff:
+                        continue
+                    path.unlink()
+                except OSError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+
+        if removed:
+            logger.info(f"🗑️ Page store GC: removed {removed} objects ({freed / 1024:.0f} KB)")
+        return removed
+
+
+page_store = PageStore(settings.PAGE_STORE_DIR, level=settings.PAGE_STORE_COMPRESSION_LEVEL)
@@ -0,0 +1,150 @@
+"""
+Adaptive Query Planner
+======================
+Cheap, local heuristics that decide which LLM stages a query needs:
+
+- Summary mode: intent phrases ("summarize", "overview", "key points"...)
+- Contextualization: only when there is history AND the question leans on
+  it (pronouns/anaphora, elliptical follow-ups, too few content words)
+- HyDE: only when the first-pass search looks weak (no hits, low best
+  score, flat score distribution, little lexical overlap with top hits)
+
+Every decision is logged with its reason. With QUERY_PLANNER_ENABLED off,
+the planner reproduces the original fixed rules (always contextualize,
+HyDE below a fixed confidence).
+"""
+import re
+from typing import Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SUMMARY_PATTERN = re.compile(
+    r"\b(summari[sz]e|summary|overview|tl;?dr|key (points|takeaways)|"
+    r"what is (this|the) (page|site|website|article) about)\b",
+    re.IGNORECASE,
+)
+
+# Words that only make sense relative to earlier turns
+ANAPHORA = {
+    "it", "its", "it's", "they", "them", "their", "theirs", "this", "that",
+    "these", "those", "he", "she", "him", "her", "his", "hers", "one", "ones",
+    "there", "former", "latter", "same", "above", "previous", "else", "also",
+    "more", "another", "other",
+}
+FOLLOWUP_OPENERS = ("and ", "what about", "how about", "why not", "but ", "so ", "then ")
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does",
+    "did", "of", "to", "in", "on", "for", "with", "by", "at", "from", "as",
+    "and", "or", "but", "if", "what", "which", "who", "whom", "how", "why",
+    "when", "where", "can", "could", "should", "would", "will", "i", "you",
+    "we", "me", "my", "your", "our", "about", "tell", "explain", "please",
+    "there", "any", "some", "have", "has", "had", "not", "no",
+}
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def content_words(text: str) -> Set[str]:
+    return {w for w in _words(text) if w not in STOPWORDS and w not in ANAPHORA and len(w) > 1}
+
+
+class QueryPlan:
+    """Which optional stages to run for one query, and why."""
+
+    def __init__(self, summary: bool, contextualize: bool, reason: str) -> None:
+        self.summary = summary
+        self.contextualize = contextualize
+        self.reason = reason
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"summary": self.summary, "contextualize": self.contextualize, "reason": self.reason}
+
+
+def is_summary_request(question: str) -> bool:
+    if not settings.QUERY_PLANNER_ENABLED:
+        return "summarize" in question.lower() or "summary" in question.lower()
+    return bool(SUMMARY_PATTERN.search(question))
+
+
+def plan_query(question: str, history: List[dict]) -> QueryPlan:
+    """Decide summary mode and whether the question needs an LLM rewrite."""
+    summary = is_summary_request(question)
+
+    if summary:
+        plan = QueryPlan(True, False, "summary intent")
+    elif not history:
+        plan = QueryPlan(False, False, "no history")
+    elif not settings.QUERY_PLANNER_ENABLED:
+        plan = QueryPlan(False, True, "planner disabled")
+    else:
+        words = _words(question)
+        lowered = question.lower().strip()
+        anaphora = sorted(set(words) & ANAPHORA)
+        if anaphora:
+            plan = QueryPlan(False, True, f"anaphora: {', '.join(anaphora)}")
+        elif lowered.startswith(FOLLOWUP_OPENERS):
+            plan = QueryPlan(False, True, "elliptical follow-up")
+        elif len(content_words(question)) < 2:
+            plan = QueryPlan(False, True, "too few content words")
+        else:
+            plan = QueryPlan(False, False, "self-contained")
+
+    logger.info(
+        "🧭 Plan: summary=%s contextualize=%s (%s)", plan.summary, plan.contextualize, plan.reason
+    )
+    return plan
+
+
+def should_use_hyde(query: str, distances: List[float], documents: List[str],
+                    threshold: Optional[float] = None) -> bool:
+    """
+    Decide whether to run the HyDE fallback from the first-pass results.
+
+    Args:
+        query: Search query used for the first pass
+        distances: Cosine distances of the first-pass hits (ascending)
+        documents: Texts of the first-pass hits (same order)
+        threshold: Distance cut-off used to accept hits
+    """
+    threshold = settings.DISTANCE_THRESHOLD if threshold is None else threshold
+    accepted = [d for d in distances if d < threshold]
+    best = 1 - accepted[0] if accepted else 0.0
+    overlap = spread = 0.0
+
+    if not settings.QUERY_PLANNER_ENABLED:
+        use, reason = (not accepted or best < settings.HYDE_MIN_CONFIDENCE), "fixed confidence rule"
+    elif not accepted:
+        use, reason = True, "no hits under threshold"
+    else:
+        # Fraction of the query's content words that appear in the top hits
+        terms = content_words(query)
+        top_text = " ".join(documents[:3]).lower()
+        overlap = (sum(1 for t in terms if t in top_text) / len(terms)) if terms else 0.0
+
+        # Gap between the best hit and the rest: a flat curve means nothing stands out
+        top = [1 - d for d in distances[:5]]
+        spread = top[0] - sum(top) / len(top)
+
+        if best < settings.HYDE_MIN_CONFIDENCE and overlap < 0.5:
+            use, reason = True, "low score, low overlap"
+        elif best < settings.HYDE_MIN_CONFIDENCE:
+            use, reason = False, "low score but lexical overlap"
+        elif best < 0.5 and overlap == 0 and spread < 0.02:
+            use, reason = True, "flat scores, no overlap"
+        else:
+            use, reason = False, "confident hit"
+
+    # Lazy formatting: this runs on every query
+    logger.info(
+        "🧭 HyDE %s (%s; score %.2f, overlap %.2f, spread %.3f)",
+        "on" if use else "off", reason, best, overlap, spread,
+    )
+    return use
@@ -0,0 +1,120 @@
+"""
+Crawler Request Filtering
+=========================
+Keeps pages from loading what the crawler never reads: images, styles,
+fonts, media, and third-party trackers, ads and font CDNs.
+
+Blocking is decided inside the browser. The rules are compiled once into
+URL patterns and handed to Chromium (CDP Network.setBlockedURLs), so a
+request is never held up waiting on Python. Before, a context.route
+callback ran for every request. Images are additionally disabled at
+browser launch (blink setting).
+
+What can't be expressed as a pattern (a resource type served from a URL
+without a telling extension) is allowed through. If the CDP session can't
+be opened, the same rules fall back to a Python route handler.
+
+Per page, blocked and allowed requests are counted from CDP network
+events, which are delivered asynchronously and never delay a request.
+"""
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# File extensions by Playwright resource type, for browser-side matching
+RESOURCE_EXTENSIONS: Dict[str, tuple] = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "stylesheet": ("css",),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "mp3", "ogg", "wav", "m4a", "mov", "avi"),
+}
+
+
+class RequestCounts:
+    """Blocked/allowed request tally for one page."""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.blocked = 0
+
+    def on_request(self, _event: dict) -> None:
+        self.total += 1
+
+    def on_failed(self, event: dict) -> None:
+        # "inspector" = blocked by Network.setBlockedURLs
+        if event.get("blockedReason") == "inspector":
+            self.blocked += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"allowed": self.total - self.blocked, "blocked": self.blocked}
+
+
+class RequestFilter:
+    """Blocking rules for crawler pages, compiled for the browser."""
+
+    def __init__(self, resource_types: Iterable[str], domains: Iterable[str],
+                 url_patterns: Iterable[str] = ()) -> None:
+        self.resource_types = set(resource_types)
+        self.domains = tuple(d.lower().lstrip(".") for d in domains)
+        self.url_patterns = tuple(url_patterns)
+        self.patterns = _compile(self.resource_types, self.domains, self.url_patterns)
+
+    @classmethod
+    def from_settings(cls) -> "RequestFilter":
+        return cls(
+            settings.CRAWL_BLOCKED_RESOURCE_TYPES,
+            settings.CRAWL_BLOCKED_DOMAINS,
+            settings.CRAWL_BLOCKED_URL_PATTERNS,
+        )
+
+    def launch_args(self) -> List[str]:
+        """Chromium flags that block at the source (no request is even made)."""
+        return ["--blink-settings=imagesEnabled=false"] if "image" in self.resource_types else []
+
+    async def attach(self, context, page) -> RequestCounts:
+        """Apply the rules to a new page (before navigation)."""
+        counts = RequestCounts()
+        try:
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+            await cdp.send("Network.setBlockedURLs", {"urls": self.patterns})
+            cdp.on("Network.requestWillBeSent", counts.on_request)
+            cdp.on("Network.loadingFailed", counts.on_failed)
+        except Exception as e:
+            logger.debug("CDP request blocking unavailable (%s), using route handler", e)
+            await page.route("**/*", lambda route: self._route(route, counts))
+        return counts
+
+    async def _route(self, route, counts: RequestCounts) -> None:
+        counts.total += 1
+        if self.blocks(route.request.url, route.request.resource_type):
+            counts.blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def blocks(self, url: str, resource_type: str) -> bool:
+        """Python-side decision (fallback path only)."""
+        if resource_type in self.resource_types:
+            return True
+        host = (urlparse(url).hostname or "").lower()
+        if any(host == d or host.endswith("." + d) for d in self.domains):
+            return True
+        return any(fnmatchcase(url, pattern) for pattern in self.url_patterns)
+
+
+def _compile(resource_types: set, domains: tuple, url_patterns: Iterable[str]) -> List[str]:
+    """Wildcard URL patterns in Network.setBlockedURLs syntax."""
+    patterns = []
+    for resource_type in sorted(resource_types):
+        for ext in RESOURCE_EXTENSIONS.get(resource_type, ()):
+            patterns += [f"*.{ext}", f"*.{ext}?*"]
+    for domain in domains:
+        patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+    patterns += list(url_patterns)
+    return patterns
@@ -1,9 +1,14 @@
 import asyncio
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+import numpy as np
 
 from app.core.config import settings
+from app.core.deadline import optional_stage_budget, run_stage
 from app.core.logger import setup_logger
+from app.core.tracing import set_flag, span
 from app.rag.generator import generate_hyde_doc
+from app.rag.planner import should_use_hyde
 
 logger = setup_logger(__name__)
 
@@ -18,15 +23,44 @@ class AdaptiveRetriever:
         words = text.split()[:max_words]
         return " ".join(words)
 
-    async def retrieve(self, query: str, summary_mode: bool = False) -> Dict[str, Any]:
+    async def retrieve(
+        self,
+        query: str,
+        summary_mode: bool = False,
+        initial_results: Optional[Dict[str, Any]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        max_contexts: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Retrieve contexts for a query.
+
+        initial_results lets callers that already searched (e.g. the batch
+        endpoint, which searches all questions together) skip the first
+        vector search. It may hold more hits than needed; extras are dropped.
+
+        where (see store.metadata_filter) limits both the first pass and the
+        HyDE search to matching chunks, e.g. one page for a per-URL summary.
+
+        max_contexts overrides how many contexts are returned (e.g. the many
+        chunks of a map-reduce summary); twice as many candidates are
+        searched so MMR can pick a diverse set.
+        """
         # 1. Standard Vector Search (Run in Thread)
         threshold = settings.DISTANCE_THRESHOLD
         if len(query.split()) < 4: threshold -= 0.05
         
         k_results = settings.TOP_K_RESULTS + 5 if summary_mode else settings.TOP_K_RESULTS
+        if max_contexts:
+            k_results = max_contexts * 2
         
-        # FIX: ChromaDB client is blocking, so we await it in a thread
-        results = await asyncio.to_thread(self.store.query, query, n_results=k_results)
+        if initial_results is not None:
+            results = {key: [hits[0][:k_results]] if hits else []
+                       for key, hits in initial_results.items()}
+        else:
+            # FIX: ChromaDB client is blocking, so we await it in a thread
+            results = await asyncio.to_thread(
+                self.store.query, query, n_results=k_results, where=where, include_embeddings=settings.MMR_ENABLED
+            )
         
         # Helper to process results
         def process_results(raw_res):
@@ -35,9 +69,10 @@ class AdaptiveRetriever:
             docs = raw_res["documents"][0]
             dists = raw_res["distances"][0]
             metas = raw_res["metadatas"][0]
+            embs = raw_res["embeddings"][0] if raw_res.get("embeddings") else [None] * len(docs)
             
             valid_items = []
-            for doc, dist, meta in zip(docs, dists, metas):
+            for doc, dist, meta, emb in zip(docs, dists, metas, embs):
                 # In summary mode, accept almost anything. In query mode, enforce threshold.
                 if summary_mode or dist < threshold:
                     valid_items.append(
@@ -46,6 +81,7 @@ class AdaptiveRetriever:
                             "source": meta.get("source"),
                             "snippet": self._extract_snippet(doc),
                             "dist": dist,
+                            "embedding": emb,
                         }
                     )
             return valid_items
@@ -53,28 +89,58 @@ class AdaptiveRetriever:
         valid = process_results(results)
         
         # 2. HyDE Boost (Smart Automation)
-        # If we found nothing or confidence is low, generate a hallucination and search with THAT.
-        best_confidence = 1 - valid[0]["dist"] if valid else 0
-        
-        if not summary_mode and (not valid or best_confidence < 0.35):
-            logger.info(f"🧠 Engaging HyDE for difficult query: '{query}'")
+        # If the first pass looks weak, generate a hallucination and search with THAT.
+        use_hyde = not summary_mode and should_use_hyde(
+            query,
+            (results.get("distances") or [[]])[0],
+            (results.get("documents") or [[]])[0],
+            threshold=threshold,
+        )
+
+        # HyDE is optional: skip it if the request's latency budget is too low
+        hyde_budget = optional_stage_budget(share=0.5) if use_hyde else None
+        if use_hyde and hyde_budget is None:
+            logger.info("⏱️ Skipping HyDE: not enough latency budget left")
+            set_flag("hyde_skipped", "budget")
+            use_hyde = False
+        set_flag("hyde_used", use_hyde)
+
+        hypothetical_answer = None
+        if use_hyde:
+            logger.info("🧠 Engaging HyDE for difficult query: '%s'", query)
             
             # FIX: LLM generation is blocking (network I/O), run in thread
-            hypothetical_answer = await asyncio.to_thread(generate_hyde_doc, query)
-            logger.debug(f"   HyDE Document: {hypothetical_answer[:50]}...")
+            with span("hyde_generation", budget=round(hyde_budget, 2)):
+                try:
+                    hypothetical_answer = await run_stage(generate_hyde_doc, query, timeout=hyde_budget)
+                except asyncio.TimeoutError:
+                    logger.warning("⏱️ HyDE timed out after %.1fs, using first-pass results", hyde_budget)
+                    set_flag("hyde_skipped", "timeout")
+            
+            # generate_hyde_doc falls back to the query itself on failure
+            if hypothetical_answer == query:
+                hypothetical_answer = None
+            
+        if hypothetical_answer:
+            logger.debug("   HyDE Document: %.50s...", hypothetical_answer)
             
             # Search again with the hypothetical answer (Blocking DB call)
-            hyde_results = await asyncio.to_thread(self.store.query, hypothetical_answer, n_results=k_results)
+            with span("hyde_search"):
+                hyde_results = await asyncio.to_thread(
+                    self.store.query, hypothetical_answer, n_results=k_results, where=where,
+                    include_embeddings=settings.MMR_ENABLED,
+                )
             hyde_valid = process_results(hyde_results)
             
-            # Merge unique results
-            existing_texts = {v["text"] for v in valid}
-            for item in hyde_valid:
-                if item["text"] not in existing_texts:
-                    valid.append(item)
-            
-            # Re-sort by distance
-            valid.sort(key=lambda x: x["dist"])
+            with span("merge", hyde_hits=len(hyde_valid)):
+                # Merge unique results
+                existing_texts = {v["text"] for v in valid}
+                for item in hyde_valid:
+                    if item["text"] not in existing_texts:
+                        valid.append(item)
+                
+                # Re-sort by distance
+                valid.sort(key=lambda x: x["dist"])
 
         if not valid:
             return {
@@ -85,6 +151,24 @@ class AdaptiveRetriever:
                 "confidence": 0,
             }
 
+        confidence = 1 - valid[0]["dist"]
+
+        # 3. Diversity: drop near-duplicate chunks before they reach the prompt
+        budget = settings.MMR_MAX_CONTEXTS_SUMMARY if summary_mode else settings.MMR_MAX_CONTEXTS
+        budget = max_contexts or budget
+        if settings.MMR_ENABLED and len(valid) > budget and all(v["embedding"] is not None for v in valid):
+            with span("mmr", candidates=len(valid), budget=budget):
+                order = mmr_select(
+                    np.asarray([1 - v["dist"] for v in valid], dtype=np.float32),
+                    np.asarray([v["embedding"] for v in valid], dtype=np.float32),
+                    k=budget,
+                    lambda_=settings.MMR_LAMBDA,
+                )
+            logger.debug("MMR kept %d of %d candidates", len(order), len(valid))
+            valid = [valid[i] for i in order]
+        elif max_contexts:
+            valid = valid[:max_contexts]
+
         # Build source objects with URL and snippet for deep linking
         source_objects = []
         seen_urls = set()
@@ -102,5 +186,40 @@ class AdaptiveRetriever:
             "contexts": [v["text"] for v in valid],
             "context_sources": [v["source"] for v in valid],
             "sources": source_objects,
-            "confidence": 1 - valid[0]["dist"],
-        }
\ No newline at end of file
+            "confidence": confidence,
+        }
+
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily pick the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max similarity to already picked).
+
+    Args:
+        relevance: (n,) similarity of each candidate to the query
+        embeddings: (n, d) candidate vectors
+        k: Number of candidates to keep
+        lambda_: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(relevance)
+    k = min(k, n)
+    unit = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    similarity = unit @ unit.T  # All pairwise cosine similarities in one product
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
\ No newline at end of file
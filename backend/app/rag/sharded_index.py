@@ -0,0 +1,123 @@
+"""
+Sharded Vector Index
+====================
+Spreads one index version over N engine indexes (Chroma collections or
+flat index directories) for sites with tens of thousands of pages.
+
+- Placement: a chunk goes to shard hash(source URL) % N, so all chunks of
+  a page share a shard and a per-page (source-filtered) search touches
+  only that one shard
+- add(): rows are partitioned by shard and written in parallel
+- query(): every shard is searched in parallel; each returns its own
+  top-k sorted by distance, and a heap merge keeps the global top-k
+
+Shards are searched on a shared thread pool; NumPy and hnswlib release the
+GIL during the heavy work, so search throughput scales with cores.
+"""
+import hashlib
+import heapq
+import itertools
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.core.logger import setup_logger
+from app.rag.flat_index import pinned_source
+
+logger = setup_logger(__name__)
+
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor(shards: int) -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Enough threads for one full fan-out, more for concurrent queries
+                _pool = ThreadPoolExecutor(max_workers=max(shards, os.cpu_count() or 1), thread_name_prefix="shard")
+    return _pool
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Stable shard number for a key (same on every process and run)."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class ShardedIndex:
+    """Engine index interface (count/add/flush/query/drop) over N shard indexes."""
+
+    def __init__(self, shards: int, open_shard: Callable[[int], object], root: Optional[str] = None) -> None:
+        self.shards = [open_shard(i) for i in range(shards)]
+        self.root = root  # Directory holding file-based shards, removed on drop()
+        self._pool = _executor(shards)
+
+    def _map(self, fn: Callable, items: List) -> List:
+        return list(self._pool.map(fn, items))
+
+    def _placement(self, id_: str, metadata: Optional[dict]) -> int:
+        return shard_of((metadata or {}).get("source") or id_, len(self.shards))
+
+    def count(self) -> int:
+        return sum(self._map(lambda shard: shard.count(), self.shards))
+
+    def add(self, ids: list, embeddings: list, documents: list, metadatas: list) -> None:
+        parts: Dict[int, List[int]] = {}
+        for row, (id_, meta) in enumerate(zip(ids, metadatas)):
+            parts.setdefault(self._placement(id_, meta), []).append(row)
+
+        def add_part(item):
+            shard_no, rows = item
+            self.shards[shard_no].add(
+                ids=[ids[r] for r in rows],
+                embeddings=[embeddings[r] for r in rows],
+                documents=[documents[r] for r in rows],
+                metadatas=[metadatas[r] for r in rows],
+            )
+
+        self._map(add_part, list(parts.items()))
+
+    def query(self, query_embeddings: list, n_results: int, where: Optional[dict] = None,
+              include_embeddings: bool = False) -> dict:
+        targets = self.shards
+        source = pinned_source(where)
+        if source is not None:
+            # All chunks of a page live on one shard
+            targets = [self.shards[shard_of(source, len(self.shards))]]
+
+        per_shard = self._map(
+            lambda shard: shard.query(query_embeddings=query_embeddings, n_results=n_results, where=where,
+                                      include_embeddings=include_embeddings),
+            targets,
+        )
+        keys = RESULT_KEYS + (("embeddings",) if include_embeddings else ())
+        return _merge(per_shard, len(query_embeddings), n_results, keys)
+
+    def flush(self) -> None:
+        self._map(lambda shard: shard.flush(), self.shards)
+
+    def drop(self) -> None:
+        self._map(lambda shard: shard.drop(), self.shards)
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _merge(per_shard: List[dict], queries: int, n_results: int, keys=RESULT_KEYS) -> dict:
+    """k-way merge of distance-sorted shard results into one global top-k."""
+    distance = keys.index("distances")
+    merged = {key: [] for key in keys}
+    for q in range(queries):
+        streams = []
+        for result in per_shard:
+            if q < len(result.get("ids") or []):
+                streams.append(zip(*(result[key][q] for key in keys)))
+        top = list(itertools.islice(heapq.merge(*streams, key=lambda row: row[distance]), n_results))
+        for i, key in enumerate(keys):
+            merged[key].append([row[i] for row in top])
+    return merged
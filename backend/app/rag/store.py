@@ -1,38 +1,426 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 from app.core.config import settings
 from app.core.logger import setup_logger
+from app.core.tracing import span
+from app.rag.embeddings import get_embedding_function
 
 logger = setup_logger(__name__)
 
-# Initialize embedding function once
-ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name=settings.EMBEDDING_MODEL
-)
+COLLECTION_NAME = "website_rag"
 
-class VectorStore:
-    def __init__(self):
-        # PRODUCTION FIX: Use PersistentClient (ChromaDB 0.4+)
-        self.client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIR)
-        
+_chroma_clients = {}
+_chroma_lock = threading.Lock()
+
+def _chroma_client(path: str):
+    """One PersistentClient per directory, shared by all collection versions."""
+    with _chroma_lock:
+        if path not in _chroma_clients:
+            import chromadb
+
+            # PRODUCTION FIX: Use PersistentClient (ChromaDB 0.4+)
+            _chroma_clients[path] = chromadb.PersistentClient(path=path)
+        return _chroma_clients[path]
+
+class ChromaIndex:
+    """HNSW index in a persistent ChromaDB collection."""
+
+    def __init__(self, path: str, name: str = COLLECTION_NAME):
+        self.client = _chroma_client(path)
+        self.name = name
         self.collection = self.client.get_or_create_collection(
-            name="website_rag",
-            embedding_function=ef,
+            name=self.name,
+            embedding_function=get_embedding_function(),
             metadata={"hnsw:space": "cosine"}
         )
-        
-        logger.info(f"📂 DB Loaded: {self.collection.count()} chunks")
 
-    def clear(self):
-        self.client.delete_collection("website_rag")
-        self.collection = self.client.create_collection(
-            name="website_rag", embedding_function=ef
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids: list, embeddings: list, documents: list, metadatas: list):
+        self.collection.add(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
         )
 
+    def flush(self):
+        """Chroma persists on add()."""
+
+    def query(self, query_embeddings: list, n_results: int, where: dict = None,
+              include_embeddings: bool = False) -> dict:
+        # Chroma resolves `where` against its SQLite metadata index before the vector search
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where or None,
+            include=include
+        )
+
+    def drop(self):
+        self.client.delete_collection(self.name)
+
+# ==================== METADATA FILTERS ====================
+
+def metadata_filter(source: str = None, site: str = None, max_depth: int = None) -> dict:
+    """
+    Build a Chroma-style `where` clause from structured filters. Both
+    engines accept it: Chroma natively, FlatIndex through its own matcher
+    and source -> rows index.
+    """
+    conditions = []
+    if source:
+        conditions.append({"source": source})
+    if site:
+        conditions.append({"site": site})
+    if max_depth is not None:
+        conditions.append({"depth": {"$lte": max_depth}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+# ==================== VERSIONED INDEXES ====================
+# Each (re)index builds a new version next to the live one. A pointer file
+# names the live version; publishing rewrites it atomically. Chroma versions
+# are collections "website_rag_v<N>" (v0 is the legacy "website_rag");
+# flat versions are directories "<FLAT_INDEX_DIR>/v<N>".
+
+def _engine_dir() -> Path:
+    if settings.VECTOR_STORE_ENGINE == "flat":
+        return Path(settings.FLAT_INDEX_DIR)
+    return Path(settings.CHROMA_PERSIST_DIR)
+
+def _pointer_file() -> Path:
+    return _engine_dir() / "live_version"
+
+def _read_pointer() -> int:
+    try:
+        return int(_pointer_file().read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _write_pointer(version: int):
+    path = _pointer_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(str(version))
+    os.replace(tmp, path)
+
+# ==================== CROSS-PROCESS COORDINATION ====================
+# Several API workers (uvicorn --workers) share one data dir. flock-based
+# files under <engine dir>/locks keep them consistent:
+# - allocate.lock serializes version numbering (next_version counter) and
+#   publishing, so two workers never build into the same version and an
+#   older build never replaces a newer live one
+# - v<N>.lock is held shared by every process that may read version N;
+#   a retired version is dropped only by whoever can lock it exclusively,
+#   i.e. the last process to stop using it
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, in-process leases suffice
+    fcntl = None
+
+def _lock_dir() -> Path:
+    path = _engine_dir() / "locks"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+@contextmanager
+def _exclusive(name: str):
+    """Hold an exclusive cross-process lock for the duration of the block."""
+    with open(_lock_dir() / name, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+class _ProcessLease:
+    """Shared lock marking a version as in use by this process."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.path = _lock_dir() / f"v{version}.lock"
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_SH)
+
+    def retire(self, drop) -> bool:
+        """
+        Give up the lease; if no other process holds one, call drop() while
+        holding the version exclusively. Returns whether it was dropped.
+        """
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False  # Another worker still reads it and drops it later
+            drop()
+            self.path.unlink(missing_ok=True)
+            return True
+        finally:
+            self._file.close()
+
+def _allocate_version() -> _ProcessLease:
+    """Next unused version number (unique across processes), already leased."""
+    with _exclusive("allocate.lock"):
+        counter = _lock_dir() / "next_version"
+        try:
+            stored = int(counter.read_text().strip())
+        except (FileNotFoundError, ValueError):
+            stored = 0
+        version = max([stored, _read_pointer() + 1] + [v + 1 for v in list_versions()])
+        counter.write_text(str(version + 1))
+        return _ProcessLease(version)
+
+def _collection_name(version: int) -> str:
+    return COLLECTION_NAME if version == 0 else f"{COLLECTION_NAME}_v{version}"
+
+def create_index(version: int = 0, engine: str = None):
+    """
+    Open one version of the engine selected by settings.VECTOR_STORE_ENGINE.
+    With VECTOR_STORE_SHARDS > 1 the version is a ShardedIndex whose shards
+    are collections "<name>_s<i>" or directories "v<N>/s<i>".
+    """
+    engine = engine or settings.VECTOR_STORE_ENGINE
+    shards = settings.VECTOR_STORE_SHARDS
+    if engine == "chroma":
+        name = _collection_name(version)
+        if shards > 1:
+            from app.rag.sharded_index import ShardedIndex
+            return ShardedIndex(shards, lambda i: ChromaIndex(settings.CHROMA_PERSIST_DIR, name=f"{name}_s{i}"))
+        return ChromaIndex(settings.CHROMA_PERSIST_DIR, name=name)
+    if engine == "flat":
+        from app.rag.flat_index import FlatIndex
+        path = Path(settings.FLAT_INDEX_DIR) / f"v{version}"
+        if shards > 1:
+            from app.rag.sharded_index import ShardedIndex
+            return ShardedIndex(
+                shards,
+                lambda i: FlatIndex(str(path / f"s{i}"), dtype=settings.FLAT_INDEX_DTYPE),
+                root=str(path),
+            )
+        return FlatIndex(str(path), dtype=settings.FLAT_INDEX_DTYPE)
+    raise ValueError(f"Unknown VECTOR_STORE_ENGINE '{engine}'. Choose 'chroma' or 'flat'.")
+
+def list_versions() -> list:
+    """All versions present on disk for the configured engine."""
+    if settings.VECTOR_STORE_ENGINE == "flat":
+        root = Path(settings.FLAT_INDEX_DIR)
+        names = [p.name for p in root.iterdir() if p.is_dir()] if root.exists() else []
+        pattern = re.compile(r"^v(\d+)$")
+    else:
+        client = _chroma_client(settings.CHROMA_PERSIST_DIR)
+        # Chroma <0.6 returns Collection objects, >=0.6 returns names
+        names = [getattr(c, "name", c) for c in client.list_collections()]
+        pattern = re.compile(rf"^{COLLECTION_NAME}(?:_v(\d+))?(?:_s\d+)?$")
+    versions = set()
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            versions.add(int(match.group(1) or 0))
+    return sorted(versions)
+
+class IndexBuild:
+    """
+    A not-yet-live index version. Fill it with add(), then publish() to swap
+    it in atomically, or abort() to discard it. Queries never see it until
+    it is published.
+    """
+
+    def __init__(self, store: "VectorStore", version: int, index):
+        self.store = store
+        self.version = version
+        self.index = index
+        self.published = False
+        self.aborted = False
+
+    def add(self, chunks: list):
+        self.store._add_to(self.index, chunks)
+
+    def publish(self):
+        # Engines may stage rows until flushed (FlatIndex writes its files once here)
+        self.index.flush()
+        self.store._publish(self)
+
+    def abort(self):
+        if self.published or self.aborted:
+            return
+        logger.info(f"🗑️ Discarding index build v{self.version}")
+        self.aborted = True
+        self.store._retire(self.version, self.index)
+
+class VectorStore:
+    """
+    Engine-agnostic, versioned vector store. Embeds text with the shared
+    embedding function and delegates storage/search to a ChromaIndex or
+    FlatIndex.
+
+    Reindexing goes through begin_build() -> IndexBuild.publish(): the new
+    version becomes live atomically, and the old one is dropped once the
+    last in-flight query holding a lease on it finishes, in this process
+    and in every other worker sharing the data dir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = None  # (version, index)
+        self._leases = {}  # version -> in-flight query count
+        self._retired = {}  # version -> index waiting for leases to drain
+        self._process_leases = {}  # version -> _ProcessLease (cross-process)
+
+    def open(self):
+        """Open the live version. Safe to call repeatedly."""
+        if self._live is not None:
+            return
+        with self._lock:
+            if self._live is not None:
+                return
+            version = _read_pointer()
+            self._process_leases[version] = _ProcessLease(version)
+            index = create_index(version)
+            existing = list_versions()
+            self._live = (version, index)
+            logger.info(
+                f"📂 DB Loaded ({settings.VECTOR_STORE_ENGINE} v{version}): {index.count()} chunks"
+            )
+
+        # Old versions left behind by a crash before their leases drained
+        # (skipped while another worker still reads or builds them)
+        for stale in (v for v in existing if v < version):
+            try:
+                if _ProcessLease(stale).retire(lambda: create_index(stale).drop()):
+                    logger.info(f"🗑️ Dropped stale index v{stale}")
+            except Exception as e:
+                logger.warning(f"Could not drop stale index v{stale}: {e}")
+
+    @property
+    def is_open(self) -> bool:
+        return self._live is not None
+
+    @property
+    def version(self) -> int:
+        """Live index version; changes every time a build is published."""
+        self.open()
+        return self._live[0]
+
+    @property
+    def index(self):
+        self.open()
+        return self._live[1]
+
+    @contextmanager
+    def lease(self):
+        """Pin the live index for the duration of a read."""
+        self._sync_pointer()
+        with self._lock:
+            version, index = self._live
+            self._leases[version] = self._leases.get(version, 0) + 1
+        try:
+            yield index
+        finally:
+            self._release(version)
+
+    def _release(self, version: int):
+        to_drop = None
+        with self._lock:
+            self._leases[version] -= 1
+            if self._leases[version] == 0:
+                del self._leases[version]
+                to_drop = self._retired.pop(version, None)
+        if to_drop is not None:
+            self._retire(version, to_drop)
+
+    def _retire(self, version: int, index):
+        """Stop using a version; drop it unless another worker still reads it."""
+        lease = self._process_leases.pop(version, None)
+        if lease is None:
+            self._drop(version, index)
+        elif not lease.retire(lambda: self._drop(version, index)):
+            logger.info(f"⏳ Index v{version} still in use by another worker, leaving it to drop")
+
+    def _drop(self, version: int, index):
+        try:
+            index.drop()
+            logger.info(f"🗑️ Dropped retired index v{version}")
+        except Exception as e:
+            logger.warning(f"Could not drop index v{version}: {e}")
+
+    def _swap_live(self, version: int, index):
+        """Make `version` live (caller holds self._lock). Returns the old one to retire, if unused."""
+        old_version, old_index = self._live
+        self._live = (version, index)
+        if self._leases.get(old_version):
+            self._retired[old_version] = old_index
+            return None
+        return old_version, old_index
+
+    def _sync_pointer(self):
+        """Follow a publish made by another process sharing the same data dir."""
+        self.open()
+        version = _read_pointer()
+        # Versions only grow, so a lower value is a stale read mid-publish
+        if version > self._live[0] and version in list_versions():
+            retire = None
+            with self._lock:
+                if version > self._live[0]:
+                    self._process_leases[version] = _ProcessLease(version)
+                    retire = self._swap_live(version, create_index(version))
+            if retire is not None:
+                self._retire(*retire)
+
+    def begin_build(self) -> IndexBuild:
+        """Create an empty, unpublished version to build a new index into."""
+        self.open()
+        lease = _allocate_version()
+        with self._lock:
+            self._process_leases[lease.version] = lease
+        logger.info(f"🏗️ Building index v{lease.version}")
+        return IndexBuild(self, lease.version, create_index(lease.version))
+
+    def _publish(self, build: IndexBuild):
+        retire = None
+        # Publishes are serialized across workers; a build that finished
+        # after a newer one was published must not roll the index back
+        with _exclusive("allocate.lock"):
+            live_version = _read_pointer()
+            if live_version > build.version:
+                build.abort()
+                raise RuntimeError(f"Index build v{build.version} superseded by live v{live_version}")
+            with self._lock:
+                _write_pointer(build.version)
+                build.published = True
+                retire = self._swap_live(build.version, build.index)
+        logger.info(f"🔀 Index v{build.version} is live ({build.index.count()} chunks)")
+        if retire is not None:
+            self._retire(*retire)
+
+    def count(self) -> int:
+        with self.lease() as index:
+            return index.count()
+
+    def clear(self):
+        """Replace the live index with an empty one."""
+        self.begin_build().publish()
+
     def add(self, chunks: list):
+        """Add chunks to the live index (prefer begin_build() for reindexing)."""
+        index = self.index
+        self._add_to(index, chunks)
+        index.flush()
+
+    def _add_to(self, index, chunks: list):
         if not chunks: return
         batch_size = 100
-        
+        ef = get_embedding_function()
+
         for i in range(0, len(chunks), batch_size):
             batch = chunks[i:i+batch_size]
             docs = [c["text"] for c in batch]
@@ -42,27 +430,49 @@ class VectorStore:
                 {k: v for k, v in c.items() if k not in ("id", "text") and v is not None}
                 for c in batch
             ]
-            
+
             try:
-                self.collection.add(
+                index.add(
                     ids=ids,
+                    embeddings=ef(docs),
                     documents=docs,
                     metadatas=metadatas
                 )
             except Exception as e:
-                logger.error(f"Add error: {e}")
-                
-        logger.info(f"✅ Added {len(chunks)} chunks")
+                logger.error("Add error: %s", e)
+
+        logger.info("✅ Added %d chunks", len(chunks))
 
-    def query(self, text: str, n_results: int = None) -> dict:
+    def embed(self, texts: list) -> list:
+        """Embed texts with the same model used for the collection"""
+        with span("query_embedding", count=len(texts)):
+            return get_embedding_function()(texts)
+
+    def query(self, text: str, n_results: int = None, where: dict = None,
+              include_embeddings: bool = False) -> dict:
         """Standard public API wrapper for retrieval"""
+        return self.query_batch([text], n_results=n_results, where=where,
+                                include_embeddings=include_embeddings)[0]
+
+    def query_batch(self, texts: list, n_results: int = None, where: dict = None,
+                    include_embeddings: bool = False) -> list:
+        """
+        Search for several texts at once: one embedding forward pass and one
+        engine call. Returns one Chroma-shaped result dict per text.
+
+        `where` (see metadata_filter()) restricts the search to matching
+        chunks inside the engine, so no hits are fetched just to be discarded.
+        include_embeddings adds each hit's stored vector (for MMR).
+        """
         n = n_results or settings.TOP_K_RESULTS
         try:
-            return self.collection.query(
-                query_texts=[text],
-                n_results=n,
-                include=["documents", "metadatas", "distances"]
-            )
+            # Embed explicitly so embedding and search are timed separately
+            embeddings = self.embed(texts)
+            with self.lease() as index, span("vector_search", n_results=n, queries=len(texts), filtered=bool(where)):
+                raw = index.query(query_embeddings=embeddings, n_results=n, where=where,
+                                  include_embeddings=include_embeddings)
+            keys = ("documents", "metadatas", "distances") + (("embeddings",) if include_embeddings else ())
+            return [{key: [raw[key][i]] for key in keys} for i in range(len(texts))]
         except Exception as e:
-            logger.error(f"Query error: {e}")
-            return {"documents": [], "metadatas": [], "distances": []}
\ No newline at end of file
+            logger.error("Query error: %s", e)
+            return [{"documents": [], "metadatas": [], "distances": []} for _ in texts]
@@ -0,0 +1,151 @@
+"""
+Map-Reduce Summarization
+========================
+Summary-mode answers over many chunks, without one huge prompt.
+
+- group_contexts(): chunks are grouped by page (in retrieval order) and
+  packed into groups of at most SUMMARY_MAP_GROUP_CHARS; a long page is
+  split over several groups
+- map_summaries(): each group is summarized by its own LLM call, at most
+  SUMMARY_MAP_CONCURRENCY at a time across all requests; results are cached
+  per group (LLM cache, namespace "summary_map"), so summarizing the same
+  site or page again only pays for groups whose text changed
+- the reduce step is the regular summary-mode generate_answer() over the
+  partial summaries (see api/index.py)
+
+Groups that fail or miss the deadline are represented by a short excerpt
+instead, so the reduce step still sees every page.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+from app.core.tracing import record_usage, set_flag
+from app.rag.generator import _bounded, _cache_lookup, _is_timeout, get_client
+from app.rag.llm_cache import llm_cache
+
+logger = setup_logger(__name__)
+
+SUMMARY_MAP_PROMPT_VERSION = "v1"
+
+# Excerpt used for a group whose summary could not be produced in time
+FALLBACK_EXCERPT_CHARS = 500
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # One pool for all requests: the limit is global, not per summary
+                _pool = ThreadPoolExecutor(max_workers=settings.SUMMARY_MAP_CONCURRENCY, thread_name_prefix="summary-map")
+    return _pool
+
+
+def group_contexts(contexts: List[str], sources: List[Optional[str]], max_chars: int = None) -> List[str]:
+    """Pack chunks into page-ordered groups of at most `max_chars` characters."""
+    max_chars = max_chars or settings.SUMMARY_MAP_GROUP_CHARS
+
+    by_page = {}  # source -> chunks, in order of first appearance
+    for text, source in zip(contexts, sources):
+        by_page.setdefault(source, []).append(text)
+
+    groups, current, size = [], [], 0
+    for chunks in by_page.values():
+        for text in chunks:
+            if current and size + len(text) > max_chars:
+                groups.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(text)
+            size += len(text) + 2
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+def _summarize(text: str, cache_key: Optional[str], timeout: float) -> Optional[str]:
+    """LLM summary of one group (stored under `cache_key`). None on failure."""
+    client = get_client()
+    if not client:
+        return None
+
+    try:
+        resp = _bounded(client, timeout).chat.completions.create(
+            model=settings.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "Summarize the key points of this text in a few sentences. Output only the summary."},
+                {"role": "user", "content": text},
+            ],
+            temperature=0.2,
+        )
+        record_usage("summary_map", resp.usage)
+        summary = resp.choices[0].message.content.strip()
+        if cache_key and summary:
+            llm_cache.set(cache_key, "summary_map", summary)
+        return summary or None
+    except Exception as e:
+        if _is_timeout(e):
+            logger.warning("⏱️ Group summary timed out after %.1fs", timeout)
+        else:
+            logger.warning("Group summary failed: %s", e)
+        return None
+
+
+def _summarize_by(text: str, cache_key: Optional[str], expires_at: float) -> Optional[str]:
+    """_summarize() with what is left of the shared budget when the call starts."""
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        return None  # Waited in the pool past the deadline
+    return _summarize(text, cache_key, remaining)
+
+
+def map_summaries(groups: List[str], timeout: float = None) -> List[str]:
+    """
+    Summarize all groups concurrently within `timeout` seconds. A call
+    that waited for a pool thread only gets the time that is left.
+
+    Returns one partial summary per group, in group order.
+    """
+    timeout = timeout or settings.LLM_TIMEOUT_SECONDS
+    expires_at = time.monotonic() + timeout
+
+    # Cached groups are served inline; only misses go to the pool
+    partials: List[Optional[str]] = [None] * len(groups)
+    futures = {}
+    for i, text in enumerate(groups):
+        cache_key, cached = _cache_lookup("summary_map", SUMMARY_MAP_PROMPT_VERSION, text)
+        if cached is not None:
+            partials[i] = cached
+            continue
+        # copy_context: token usage is recorded on the request's trace
+        future = _executor().submit(contextvars.copy_context().run, _summarize_by, text, cache_key, expires_at)
+        futures[future] = i
+
+    pending = set(futures)
+    while pending:
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            partials[futures[future]] = future.result()
+    for future in pending:
+        future.cancel()  # Queued calls never start; running ones end at their own timeout
+
+    missing = sum(1 for p in partials if p is None)
+    set_flag("summary_map", {
+        "groups": len(groups),
+        "cached": len(groups) - len(futures),
+        "missing": missing,
+    })
+    if missing:
+        logger.info("📝 %d/%d group summaries unavailable, using excerpts", missing, len(groups))
+
+    return [p if p is not None else groups[i][:FALLBACK_EXCERPT_CHARS] for i, p in enumerate(partials)]
@@ -0,0 +1,137 @@
+"""
+Embedding-Model Token Accounting
+================================
+Measures text in the embedding model's own tokens, so chunks can be sized
+to what the model actually reads instead of by characters.
+
+- get_tokenizer(): the tokenizer of settings.EMBEDDING_MODEL (lazy)
+- max_input_tokens(): the model's max_seq_length minus special tokens
+- token_counter: cached token counts (boilerplate sentences repeat across
+  pages, so most lookups are hits)
+- split_by_tokens(): cut an over-long text at token boundaries
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Fallback when the model does not publish a sentence-transformers config
+DEFAULT_MAX_SEQ_LENGTH = 256
+
+_tokenizer = None
+_max_seq_length: Optional[int] = None
+_load_error: Optional[Exception] = None  # A failed load is not retried
+_lock = threading.Lock()
+
+
+def _hub_name(model_name: str) -> str:
+    # SentenceTransformer resolves bare names under the sentence-transformers org
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _load() -> None:
+    global _tokenizer, _max_seq_length
+    from transformers import AutoTokenizer
+
+    name = _hub_name(settings.EMBEDDING_MODEL)
+    _tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=settings.EMBEDDING_CACHE_DIR)
+
+    max_len = settings.EMBEDDING_MAX_SEQ_LENGTH
+    if max_len <= 0:
+        try:
+            from huggingface_hub import hf_hub_download
+
+            config = hf_hub_download(
+                name, "sentence_bert_config.json", cache_dir=settings.EMBEDDING_CACHE_DIR
+            )
+            with open(config) as f:
+                max_len = int(json.load(f)["max_seq_length"])
+        except Exception as e:
+            logger.warning(f"⚠️ No max_seq_length for {name} ({e}); assuming {DEFAULT_MAX_SEQ_LENGTH}")
+            max_len = DEFAULT_MAX_SEQ_LENGTH
+    _max_seq_length = min(max_len, _tokenizer.model_max_length)
+    logger.info(f"🔤 Tokenizer loaded: {name} (max_seq_length {_max_seq_length})")
+
+
+def get_tokenizer():
+    """Return the embedding model's tokenizer, loading it on first call."""
+    global _load_error
+    if _tokenizer is None:
+        with _lock:
+            if _load_error is not None:
+                raise RuntimeError(f"tokenizer failed to load earlier: {_load_error}")
+            if _tokenizer is None:
+                try:
+                    _load()
+                except Exception as e:
+                    _load_error = e
+                    raise
+    return _tokenizer
+
+
+def max_input_tokens() -> int:
+    """Content tokens the model reads per input (special tokens excluded)."""
+    tokenizer = get_tokenizer()
+    return _max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+
+
+class TokenCounter:
+    """LRU-cached token counts, tokenizing cache misses in one batch."""
+
+    def __init__(self, max_entries: int = 50_000) -> None:
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, texts: List[str]) -> List[int]:
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is not None:
+                    self._cache.move_to_end(text)
+                    counts[i] = cached
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            unique = list(missing)
+            ids = get_tokenizer()(unique, add_special_tokens=False)["input_ids"]
+            with self._lock:
+                for text, token_ids in zip(unique, ids):
+                    for i in missing[text]:
+                        counts[i] = len(token_ids)
+                    self._cache[text] = len(token_ids)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def count_one(self, text: str) -> int:
+        return self.count([text])[0]
+
+
+token_counter = TokenCounter()
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split `text` into pieces of at most `max_tokens` tokens each."""
+    encoded = get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = encoded["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for start in range(0, len(offsets), max_tokens):
+        window = offsets[start:start + max_tokens]
+        pieces.append(text[window[0][0]:window[-1][1]].strip())
+    return [p for p in pieces if p]
@@ -0,0 +1,73 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.rag import generator, summarizer
+from app.rag import store as store_module
+
+
+class FakeLLM:
+    """Stands in for the OpenAI client: records prompts and returns canned replies."""
+
+    def __init__(self) -> None:
+        self.reply = "ok"  # str, or callable(messages) -> str
+        self.delay = 0.0
+        self.calls = []
+        self.timeouts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    # client.with_options(...).chat.completions.create(...)
+    def with_options(self, **kwargs):
+        with self._lock:
+            self.timeouts.append(kwargs.get("timeout"))
+        return self
+
+    @property
+    def chat(self):
+        return self
+
+    @property
+    def completions(self):
+        return self
+
+    def create(self, messages, **kwargs):
+        with self._lock:
+            self.calls.append(messages)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            content = self.reply(messages) if callable(self.reply) else self.reply
+        finally:
+            with self._lock:
+                self.active -= 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    client = FakeLLM()
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(generator, "get_client", lambda: client)
+    monkeypatch.setattr(summarizer, "get_client", lambda: client)
+    return client
+
+
+def _keyword_embedding(texts):
+    # Deterministic 3-d vectors: "alpha" and "beta" texts point different ways
+    return [[t.count("alpha") + 0.01, t.count("beta") + 0.01, 0.01] for t in texts]
+
+
+@pytest.fixture
+def flat_dir(tmp_path, monkeypatch):
+    """VectorStore on the flat engine under tmp_path, with a stub embedding model."""
+    monkeypatch.setattr(settings, "VECTOR_STORE_ENGINE", "flat")
+    monkeypatch.setattr(settings, "VECTOR_STORE_SHARDS", 1)
+    monkeypatch.setattr(settings, "FLAT_INDEX_DIR", str(tmp_path / "flat"))
+    monkeypatch.setattr(store_module, "get_embedding_function", lambda: _keyword_embedding)
+    return tmp_path / "flat"
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from app.api import index
+from app.api.index import BatchQueryRequest, _answer_batch
+from app.core.config import settings
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _patch_pipeline(monkeypatch, generation_s: float):
+    """Stub retrieval and generation; the fake LLM call honours its timeout."""
+    calls = []
+
+    def query_batch(questions, n_results, include_embeddings=False):
+        return [{} for _ in questions]
+
+    async def retrieve(question, summary_mode=False, initial_results=None):
+        return {"relevant": True, "contexts": [f"passage for {question}"], "confidence": 0.9, "sources": []}
+
+    def generate_answer(question, contexts, summary_mode=False, timeout=None):
+        calls.append((question, timeout))
+        time.sleep(min(generation_s, timeout))
+        if timeout < generation_s:
+            return {"timed_out": True}
+        return {"answer": f"answer to {question}", "refusal": False, "suggestions": ["a", "b"]}
+
+    monkeypatch.setattr(index.store, "query_batch", query_batch)
+    monkeypatch.setattr(index.retriever, "retrieve", retrieve)
+    monkeypatch.setattr(index, "generate_answer", generate_answer)
+    return calls
+
+
+def test_queued_questions_get_the_remaining_budget(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_DEADLINE_SECONDS", 1.0)
+    calls = _patch_pipeline(monkeypatch, generation_s=0.1)
+
+    result = _run(_answer_batch(BatchQueryRequest(questions=["q1", "q2", "q3"], concurrency=1)))
+
+    assert [item["timed_out"] for item in result["results"]] == [False, False, False]
+    # The deadline starts at submission: later questions waited for the slot
+    timeouts = [timeout for _, timeout in calls]
+    assert timeouts[0] <= 1.0
+    assert timeouts[1] <= timeouts[0] - 0.09
+    assert timeouts[2] <= timeouts[1] - 0.09
+
+
+def test_question_queued_past_its_deadline_skips_generation(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_DEADLINE_SECONDS", 0.3)
+    calls = _patch_pipeline(monkeypatch, generation_s=0.2)
+
+    start = time.perf_counter()
+    result = _run(_answer_batch(BatchQueryRequest(questions=["q1", "q2", "q3"], concurrency=1)))
+    elapsed = time.perf_counter() - start
+
+    items = result["results"]
+    assert [item["timed_out"] for item in items] == [False, True, True]
+    assert items[2]["answer"].endswith("passage for q3")
+    # q2 only got what was left; q3 was never sent
+    assert [question for question, _ in calls] == ["q1", "q2"]
+    assert calls[1][1] < 0.15
+    assert elapsed < 0.45
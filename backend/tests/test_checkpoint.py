@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.rag import checkpoint as checkpoint_module
+from app.rag.checkpoint import CrawlCheckpoint, checkpoint_digests, claim_resume, pending_checkpoints
+from app.rag.crawler import WebCrawler
+from app.rag.page_store import PageStore
+
+PAGES = [
+    {"url": "https://a.test/", "title": "Home", "text": "home " * 40, "links": ["https://a.test/x"],
+     "headers": {"etag": "1"}, "status": 200, "depth": 1},
+    {"url": "https://a.test/x", "title": "X", "text": "x " * 60, "links": [],
+     "headers": {}, "status": 200, "depth": 2},
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CRAWL_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(checkpoint_module, "page_store", PageStore(str(tmp_path / "pages")))
+    monkeypatch.setattr(checkpoint_module, "_resume_lock", None)
+
+
+@pytest.mark.parametrize("page_store_enabled", [True, False])
+def test_round_trip(monkeypatch, page_store_enabled):
+    monkeypatch.setattr(settings, "PAGE_STORE_ENABLED", page_store_enabled)
+    saved = CrawlCheckpoint("https://a.test/", 10, 2)
+    saved.save([("https://a.test/y", 2)], {"https://a.test/", "https://a.test/x"}, PAGES)
+
+    frontier, visited, pages = CrawlCheckpoint("https://a.test/", 10, 2).load()
+
+    assert frontier == [("https://a.test/y", 2)]
+    assert visited == {"https://a.test/", "https://a.test/x"}
+    assert pages == PAGES
+    # Inline pages never reach the page store
+    assert bool(checkpoint_digests()) == page_store_enabled
+
+
+def test_lost_page_body_is_refetched(monkeypatch):
+    monkeypatch.setattr(settings, "PAGE_STORE_ENABLED", True)
+    saved = CrawlCheckpoint("https://a.test/", 10, 2)
+    saved.save([], {"https://a.test/", "https://a.test/x"}, PAGES, complete=True)
+    for path in (checkpoint_module.page_store.root / "objects").glob("*/*"):
+        path.unlink()
+
+    loaded = CrawlCheckpoint("https://a.test/", 10, 2)
+    frontier, visited, pages = loaded.load()
+
+    assert pages == []
+    assert frontier[0] == ("https://a.test/x", 2)
+    assert not loaded.complete
+
+
+def test_complete_checkpoint_skips_the_browser(monkeypatch):
+    saved = CrawlCheckpoint("https://a.test/", 10, 2)
+    saved.save([], {"https://a.test/", "https://a.test/x"}, PAGES, complete=True)
+
+    async def no_browser(*args, **kwargs):
+        raise AssertionError("browser launched for a finished crawl")
+
+    crawler = WebCrawler()
+    monkeypatch.setattr(crawler, "_crawl_loop", no_browser)
+    pages = asyncio.run(crawler.crawl("https://a.test/", 10, 2, checkpoint=CrawlCheckpoint("https://a.test/", 10, 2)))
+
+    assert [p["url"] for p in pages] == ["https://a.test/", "https://a.test/x"]
+
+
+def test_claim_is_exclusive_between_workers():
+    # flock treats separately opened lock files like separate processes
+    first = CrawlCheckpoint("https://a.test/", 10, 2)
+    second = CrawlCheckpoint("https://a.test/", 10, 2)
+
+    assert first.claim()
+    assert not second.claim()
+    assert second.busy()
+
+    first.release()
+    assert not second.busy()
+    assert second.claim()
+    second.release()
+
+
+def test_only_one_worker_resumes(monkeypatch):
+    CrawlCheckpoint("https://a.test/", 10, 2).save([("https://a.test/", 1)], set(), [])
+    assert claim_resume()
+    assert claim_resume()  # Same process keeps the claim
+
+    # A second worker: its own (unset) lock handle, the same lock file
+    monkeypatch.setattr(checkpoint_module, "_resume_lock", None)
+    assert not claim_resume()
+    assert [c.url for c in pending_checkpoints()] == ["https://a.test/"]
+
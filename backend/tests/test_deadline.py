@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.deadline import (
+    Deadline,
+    current_deadline,
+    optional_stage_budget,
+    required_stage_budget,
+    run_stage,
+)
+
+
+def test_budget_reserves_time_for_later_stages():
+    deadline = Deadline(10.0)
+
+    assert 9.0 < deadline.budget() <= 10.0
+    assert 3.9 < deadline.budget(share=0.5, reserve=2.0) <= 4.0
+    assert deadline.budget(cap=1.5) == 1.5
+    assert deadline.budget(reserve=20.0) == 0.0
+
+
+def test_deadline_expires():
+    deadline = Deadline(0.02)
+    assert not deadline.expired
+    time.sleep(0.03)
+    assert deadline.expired
+    assert deadline.remaining() == 0.0
+
+
+def test_activate_sets_and_restores_current_deadline():
+    outer, inner = Deadline(5.0), Deadline(1.0)
+    with outer.activate():
+        with inner.activate():
+            assert current_deadline() is inner
+        assert current_deadline() is outer
+    assert current_deadline() is None
+
+
+def test_stage_budgets_without_a_deadline_use_the_llm_cap():
+    assert optional_stage_budget(0.5) == settings.LLM_TIMEOUT_SECONDS
+    assert required_stage_budget() == settings.LLM_TIMEOUT_SECONDS
+
+
+def test_optional_stage_is_skipped_when_little_time_is_left(monkeypatch):
+    monkeypatch.setattr(settings, "GENERATION_RESERVE_SECONDS", 1.0)
+    monkeypatch.setattr(settings, "OPTIONAL_STAGE_MIN_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_SECONDS", 20.0)
+
+    with Deadline(1.2).activate():
+        assert optional_stage_budget(1.0) is None
+        assert required_stage_budget() <= 1.2
+    with Deadline(5.0).activate():
+        budget = optional_stage_budget(0.5)
+        assert 1.9 < budget <= 2.0
+
+
+def test_run_stage_passes_the_timeout_through():
+    def stage(value, timeout):
+        return value, timeout
+
+    assert asyncio.run(run_stage(stage, "x", timeout=3.0)) == ("x", 3.0)
+
+
+def test_run_stage_stops_waiting_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr("app.core.deadline.STAGE_GRACE_SECONDS", 0.05)
+
+    def stuck(timeout):
+        time.sleep(0.5)  # Ignores its own timeout
+
+    async def scenario():
+        start = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await run_stage(stuck, timeout=0.05)
+        return time.perf_counter() - start
+
+    assert asyncio.run(scenario()) < 0.3
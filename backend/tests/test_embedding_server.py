@@ -0,0 +1,104 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.rag import embeddings
+from app.rag.embedding_server import EmbeddingServer, RemoteEmbeddingFunction
+
+
+class FakeModel:
+    """Embeds text as [len(text), batch size]; records each forward pass."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.delay = 0.0
+        self.error = None
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return [[float(len(t)), float(len(texts))] for t in texts]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(embeddings, "build_embedding_function", lambda backend: model)
+    # Unix socket paths are length-limited; keep it short
+    folder = tempfile.mkdtemp(prefix="emb", dir="/tmp")
+    path = os.path.join(folder, "s.sock")
+    server = EmbeddingServer(path, backend="torch", max_batch=64, max_wait_ms=50)
+
+    running = {}
+
+    async def run():
+        running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        try:
+            await server.serve()
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    yield path, model
+
+    running["loop"].call_soon_threadsafe(running["task"].cancel)
+    thread.join(timeout=5)
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def test_round_trip_returns_one_vector_per_text(service):
+    path, _ = service
+    client = RemoteEmbeddingFunction(path, connect_timeout=2)
+
+    assert client(["a", "abc"]) == [[1.0, 2.0], [3.0, 2.0]]
+    assert client(["abcd"]) == [[4.0, 1.0]]  # Same connection reused
+
+
+def test_concurrent_clients_share_forward_passes(service):
+    path, model = service
+    client = RemoteEmbeddingFunction(path, connect_timeout=2)
+    texts = [["x" * (i + 1)] for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(client, texts))
+
+    # Every caller gets its own row back, from fewer forward passes than requests
+    assert [row[0][0] for row in results] == [float(i + 1) for i in range(8)]
+    assert len(model.batches) < 8
+
+
+def test_model_errors_reach_the_client(service):
+    path, model = service
+    model.error = "out of memory"
+    client = RemoteEmbeddingFunction(path, connect_timeout=2)
+
+    with pytest.raises(RuntimeError, match="out of memory"):
+        client(["a"])
+
+
+def test_slow_service_times_out(service):
+    path, model = service
+    model.delay = 0.5
+    client = RemoteEmbeddingFunction(path, connect_timeout=2, request_timeout=0.1)
+
+    with pytest.raises(TimeoutError):
+        client(["a"])
+
+
+def test_missing_service_fails_after_connect_timeout(tmp_path):
+    client = RemoteEmbeddingFunction(str(tmp_path / "none.sock"), connect_timeout=0.2)
+
+    with pytest.raises(ConnectionError):
+        client(["a"])
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.rag import embeddings
+from app.rag.embeddings import _export_onnx, build_embedding_function
+
+
+def test_concurrent_exports_run_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_DIR", str(tmp_path))
+    exports = []
+
+    def fake_export(model_name, float_path, tokenizer_dir):
+        exports.append(model_name)
+        time.sleep(0.05)
+        float_path.write_bytes(b"onnx")
+
+    monkeypatch.setattr(embeddings, "_export_float", fake_export)
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(_export_onnx("org/model", False))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert exports == ["org/model"]
+    assert {p.name for p in paths} == {"org__model.onnx"}
+    # Only the finished file is left behind
+    assert sorted(p.name for p in (tmp_path / "onnx").glob("*.onnx")) == ["org__model.onnx"]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown EMBEDDING_BACKEND"):
+        build_embedding_function("gpu")
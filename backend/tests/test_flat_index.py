@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.rag.flat_index import FlatIndex
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def _fill(index):
+    index.add(
+        ids=["a0", "a1", "b0"],
+        embeddings=[_unit(1, 0, 0), _unit(0.9, 0.1, 0), _unit(0, 1, 0)],
+        documents=["alpha zero", "alpha one", "beta zero"],
+        metadatas=[{"source": "a"}, {"source": "a"}, {"source": "b"}],
+    )
+    index.flush()
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_query_ranks_by_cosine_distance(tmp_path, dtype):
+    index = FlatIndex(str(tmp_path / "idx"), dtype=dtype)
+    _fill(index)
+
+    results = index.query([_unit(1, 0, 0)], n_results=2)
+
+    assert results["ids"] == [["a0", "a1"]]
+    assert results["documents"] == [["alpha zero", "alpha one"]]
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=0.01)
+    assert results["distances"][0][0] <= results["distances"][0][1]
+
+
+def test_staged_rows_are_searchable_only_after_flush(tmp_path):
+    index = FlatIndex(str(tmp_path / "idx"))
+    index.add(["x"], [_unit(1, 0)], ["doc"], [{"source": "s"}])
+
+    assert index.count() == 1
+    assert index.query([_unit(1, 0)], n_results=1)["ids"] == [[]]
+
+    index.flush()
+    assert index.query([_unit(1, 0)], n_results=1)["ids"] == [["x"]]
+
+
+def test_duplicate_ids_are_skipped(tmp_path):
+    index = FlatIndex(str(tmp_path / "idx"))
+    _fill(index)
+    index.add(["a0", "c0"], [_unit(1, 0, 0), _unit(0, 0, 1)], ["dup", "gamma"], [{"source": "a"}, {"source": "c"}])
+    index.flush()
+
+    assert index.count() == 4
+    assert index.query([_unit(1, 0, 0)], n_results=1)["documents"] == [["alpha zero"]]
+
+
+def test_where_filter_limits_rows(tmp_path):
+    index = FlatIndex(str(tmp_path / "idx"))
+    _fill(index)
+
+    results = index.query([_unit(1, 0, 0)], n_results=5, where={"source": "b"})
+
+    assert results["ids"] == [["b0"]]
+    assert results["metadatas"] == [[{"source": "b"}]]
+    assert index.query([_unit(1, 0, 0)], n_results=5, where={"source": "missing"})["ids"] == [[]]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_reopen_round_trip(tmp_path, dtype):
+    path = str(tmp_path / "idx")
+    _fill(FlatIndex(path, dtype=dtype))
+
+    reopened = FlatIndex(path, dtype=dtype)
+    results = reopened.query([_unit(0, 1, 0)], n_results=3, include_embeddings=True)
+
+    assert reopened.count() == 3
+    assert results["ids"][0][0] == "b0"
+    assert results["documents"][0][0] == "beta zero"
+    # Quantized vectors come back unit-length and close to the originals
+    hit = results["embeddings"][0][0]
+    assert np.linalg.norm(hit) == pytest.approx(1.0, abs=1e-3)
+    assert np.allclose(hit, _unit(0, 1, 0), atol=0.02)
+
+
+def test_flush_appends_to_existing_rows(tmp_path):
+    index = FlatIndex(str(tmp_path / "idx"), dtype="int8")
+    _fill(index)
+    index.add(["c0"], [_unit(0, 0, 1)], ["gamma"], [{"source": "c"}])
+    index.flush()
+
+    assert index.query([_unit(0, 0, 1)], n_results=1)["ids"] == [["c0"]]
+    assert index.query([_unit(1, 0, 0)], n_results=1)["ids"] == [["a0"]]
+
+
+def test_rejects_unknown_dtype(tmp_path):
+    with pytest.raises(ValueError):
+        FlatIndex(str(tmp_path / "idx"), dtype="float64")
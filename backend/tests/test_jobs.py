@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from app.core.jobs import JobQueue, QueueFullError
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _blocker(started: asyncio.Event, release: asyncio.Event):
+    started.set()
+    await release.wait()
+
+
+def test_submit_coalesces_same_key():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=2)
+        release = asyncio.Event()
+        first = queue.submit("k", "site", release.wait)
+        second = queue.submit("k", "site", release.wait)
+        return first, second
+
+    first, second = _run(scenario())
+    assert first is second
+
+
+def test_running_job_is_kept_by_default():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=2)
+        queue.start()
+        started, release = asyncio.Event(), asyncio.Event()
+        running = queue.submit("k1", "site", lambda: _blocker(started, release))
+        await started.wait()
+
+        queued = queue.submit("k2", "site", release.wait)
+        newer = queue.submit("k3", "site", release.wait)
+        status = (running.status, queued.status, newer.status)
+        release.set()
+        for _ in range(50):
+            if newer.status == "done":
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return status, running, newer
+
+    status, running, newer = _run(scenario())
+    # Only the queued job is superseded; the crawl in progress finishes
+    assert status == ("running", "cancelled", "queued")
+    assert running.status == "done"
+    assert newer.status == "done"
+
+
+def test_new_job_supersedes_running_job_when_enabled():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=2, supersede_running=True)
+        queue.start()
+        started, release = asyncio.Event(), asyncio.Event()
+        old = queue.submit("k1", "site", lambda: _blocker(started, release))
+        await started.wait()
+
+        new = queue.submit("k2", "site", release.wait)
+        release.set()
+        for _ in range(50):
+            if new.status == "done":
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return old, new
+
+    old, new = _run(scenario())
+    assert old.status == "cancelled"
+    assert old.error == "superseded"
+    assert new.status == "done"
+
+
+def test_superseded_queued_job_is_dropped():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=2)
+        release = asyncio.Event()
+        old = queue.submit("k1", "site", release.wait)
+        new = queue.submit("k2", "site", release.wait)
+        return queue, old, new
+
+    queue, old, new = _run(scenario())
+    assert old.status == "cancelled"
+    assert queue.position(new) == 1
+    assert queue.stats()["queued"] == 1
+
+
+def test_capacity_raises_queue_full():
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=1)
+        release = asyncio.Event()
+        # One job for the idle worker plus one waiting slot
+        queue.submit("a", "a", release.wait)
+        queue.submit("b", "b", release.wait)
+        with pytest.raises(QueueFullError):
+            queue.submit("c", "c", release.wait)
+        # Superseding a waiting job frees its slot
+        return queue.submit("b2", "b", release.wait)
+
+    assert _run(scenario()).status == "queued"
+
+
+def test_stop_waits_for_job_cleanup():
+    cleaned = []
+
+    async def crawl(started: asyncio.Event):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await asyncio.sleep(0.05)  # e.g. closing the browser
+            cleaned.append(True)
+
+    async def scenario():
+        queue = JobQueue(workers=1, max_queued=1)
+        queue.start()
+        started = asyncio.Event()
+        job = queue.submit("k", "site", lambda: crawl(started))
+        await started.wait()
+        await queue.stop()
+        return job, list(cleaned)
+
+    job, cleaned_at_stop = _run(scenario())
+    assert cleaned_at_stop == [True]
+    assert job.status == "cancelled"
+    assert job.error == "shutdown"
@@ -0,0 +1,82 @@
+import pytest
+
+from app.core.config import settings
+from app.rag import generator
+from app.rag import llm_cache as llm_cache_module
+from app.rag.generator import contextualize_question, generate_hyde_doc
+from app.rag.llm_cache import LLMCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache_module.time, "time", clock)
+    return clock
+
+
+def test_key_ignores_case_whitespace_and_trailing_punctuation():
+    key = LLMCache.make_key("hyde", "model", "v1", "What is  the PRICE?")
+
+    assert key == LLMCache.make_key("hyde", "model", "v1", "what is the price")
+    assert key != LLMCache.make_key("hyde", "model", "v2", "what is the price")
+    assert key != LLMCache.make_key("hyde", "other-model", "v1", "what is the price")
+    assert key != LLMCache.make_key("contextualize", "model", "v1", "what is the price")
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=10, ttl_seconds=60)
+    cache.set("k", "hyde", "value")
+
+    clock.now += 59
+    assert cache.get("k") == "value"
+    clock.now += 2
+    assert cache.get("k") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=2, ttl_seconds=3600)
+    cache.set("a", "hyde", "A")
+    clock.now += 1
+    cache.set("b", "hyde", "B")
+    clock.now += 1
+    assert cache.get("a") == "A"  # "b" is now the least recently used
+    clock.now += 1
+    cache.set("c", "hyde", "C")
+
+    assert cache.get("a") == "A"
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_persists_across_instances(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    LLMCache(path, max_entries=10, ttl_seconds=60).set("k", "hyde", "value")
+
+    assert LLMCache(path, max_entries=10, ttl_seconds=60).get("k") == "value"
+
+
+def test_helper_calls_are_memoized(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(generator, "llm_cache", LLMCache(str(tmp_path / "cache.db"), 10, 3600))
+    fake_llm.reply = "rewritten question"
+    history = [{"role": "user", "content": "Tell me about plans"}, {"role": "assistant", "content": "There are two."}]
+
+    first = contextualize_question("How much is it?", history)
+    second = contextualize_question("how much is it", history)
+    generate_hyde_doc("How much is it?")
+    generate_hyde_doc("how much is it")
+
+    assert first == second == "rewritten question"
+    assert len(fake_llm.calls) == 2  # One rewrite, one HyDE document
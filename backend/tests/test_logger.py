@@ -0,0 +1,70 @@
+import json
+import logging
+import queue
+import sys
+
+from app.core.logger import ColoredFormatter, DroppingQueueHandler, JsonFormatter, SamplingFilter
+
+
+def _record(name="app.test", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extras_and_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "failed %d", (3,), None)
+        record.exc_info = sys.exc_info()
+    record.request_id = "r1"
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "app.test"
+    assert entry["msg"] == "failed 3"
+    assert entry["request_id"] == "r1"
+    assert "ValueError: boom" in entry["exc"]
+
+
+def test_colored_formatter_leaves_shared_record_untouched():
+    record = _record()
+
+    line = ColoredFormatter(fmt="%(levelname)s %(message)s").format(record)
+
+    assert line.endswith("hello world")
+    assert "\033[32m" in line
+    assert record.levelname == "INFO"
+
+
+def test_sampling_keeps_one_in_n_debug_records_per_logger():
+    sampler = SamplingFilter(0.25)
+
+    kept_a = [sampler.filter(_record("a", logging.DEBUG)) for _ in range(8)]
+    kept_b = [sampler.filter(_record("b", logging.DEBUG)) for _ in range(4)]
+
+    assert sum(kept_a) == 2
+    assert kept_b[0]  # Another logger's first record is not starved
+    assert sampler.filter(_record("a", logging.WARNING))
+
+
+def test_zero_sample_rate_drops_all_debug_records():
+    sampler = SamplingFilter(0.0)
+
+    assert not sampler.filter(_record(level=logging.DEBUG))
+    assert sampler.filter(_record(level=logging.INFO))
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    records = [_record() for _ in range(3)]
+
+    for record in records:
+        handler.handle(record)
+
+    queued = handler.queue.get_nowait()
+    assert queued is records[0]
+    assert queued.args == ("world",)  # Still unrendered
+    assert handler.dropped == 1
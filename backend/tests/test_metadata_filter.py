@@ -0,0 +1,41 @@
+from app.rag.flat_index import _matches, pinned_source
+from app.rag.store import VectorStore, metadata_filter
+
+
+def test_filter_clause_shapes():
+    assert metadata_filter() is None
+    assert metadata_filter(source="https://a.test/1") == {"source": "https://a.test/1"}
+    assert metadata_filter(source="https://a.test/1", max_depth=2) == {
+        "$and": [{"source": "https://a.test/1"}, {"depth": {"$lte": 2}}]
+    }
+
+
+def test_flat_matcher_evaluates_clauses():
+    meta = {"source": "https://a.test/1", "site": "https://a.test", "depth": 2}
+
+    assert _matches(meta, metadata_filter(site="https://a.test", max_depth=2))
+    assert not _matches(meta, metadata_filter(site="https://a.test", max_depth=1))
+    assert _matches(meta, {"$or": [{"source": "x"}, {"depth": {"$in": [1, 2]}}]})
+    assert not _matches({"source": "x"}, {"depth": {"$lte": 3}})  # Missing field never matches
+
+
+def test_pinned_source_is_found_inside_and():
+    assert pinned_source(metadata_filter(source="s", max_depth=1)) == "s"
+    assert pinned_source({"source": {"$eq": "s"}}) == "s"
+    assert pinned_source(metadata_filter(site="https://a.test")) is None
+
+
+def test_query_searches_only_matching_chunks(flat_dir):
+    store = VectorStore()
+    store.add([
+        {"id": "a0", "text": "alpha intro", "source": "https://a.test/1", "depth": 1},
+        {"id": "a1", "text": "alpha alpha deep", "source": "https://a.test/2", "depth": 3},
+        {"id": "b0", "text": "beta page", "source": "https://b.test/1", "depth": 1},
+    ])
+
+    by_page = store.query("alpha", n_results=5, where=metadata_filter(source="https://b.test/1"))
+    shallow = store.query("alpha", n_results=5, where=metadata_filter(max_depth=2))
+
+    # The filter applies before ranking: the only b.test chunk comes back
+    assert by_page["documents"] == [["beta page"]]
+    assert sorted(shallow["documents"][0]) == ["alpha intro", "beta page"]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from app.rag.retriever import mmr_select
+
+
+def test_pure_relevance_keeps_score_order():
+    relevance = np.array([0.2, 0.9, 0.5, 0.7])
+    embeddings = np.eye(4)
+
+    assert mmr_select(relevance, embeddings, k=4, lambda_=1.0) == [1, 3, 2, 0]
+
+
+def test_near_duplicate_is_demoted():
+    relevance = np.array([0.95, 0.94, 0.80])
+    # 1 is almost identical to 0; 2 is different
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+
+    assert mmr_select(relevance, embeddings, k=3, lambda_=0.7) == [0, 2, 1]
+
+
+def test_k_is_capped_by_candidates():
+    relevance = np.array([0.3, 0.6])
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]])
+
+    assert mmr_select(relevance, embeddings, k=10, lambda_=0.5) == [1, 0]
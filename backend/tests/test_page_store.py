@@ -0,0 +1,68 @@
+import os
+import time
+
+from app.rag.page_store import GC_GRACE_SECONDS, PageStore
+
+
+def _page(url, text, **extra):
+    return {"url": url, "title": url, "text": text, "links": [], "depth": 1,
+            "headers": {"date": str(time.time())}, "status": 200, **extra}
+
+
+def _age_objects(store: PageStore) -> None:
+    old = time.time() - GC_GRACE_SECONDS - 60
+    for path in (store.root / "objects").glob("*/*.json.z"):
+        os.utime(path, (old, old))
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = PageStore(str(tmp_path))
+
+    first = store.put(_page("https://a.test/1", "same body"))
+    second = store.put(_page("https://a.test/1", "same body", status=304))
+
+    assert first == second
+    assert len(list((tmp_path / "objects").glob("*/*.json.z"))) == 1
+    assert store.put(_page("https://a.test/1", "new body")) != first
+
+
+def test_crawl_round_trips_in_order(tmp_path):
+    store = PageStore(str(tmp_path))
+    pages = [_page(f"https://a.test/{i}", f"body {i} " * 50) for i in range(3)]
+
+    manifest = store.save_crawl("https://a.test", pages)
+    loaded = store.load_pages("https://a.test")
+
+    assert len(manifest["pages"]) == 3
+    assert [p["url"] for p in loaded] == [p["url"] for p in pages]
+    assert loaded[1]["text"] == pages[1]["text"]
+    assert loaded[1]["headers"] == pages[1]["headers"]
+    assert store.latest_site() == "https://a.test"
+    assert store.load_pages("https://unknown.test") == []
+
+
+def test_gc_removes_only_unreferenced_old_objects(tmp_path):
+    store = PageStore(str(tmp_path))
+    store.save_crawl("https://a.test", [_page("https://a.test/1", "old body")])
+    store.save_crawl("https://a.test", [_page("https://a.test/1", "new body")])  # Replaces the manifest
+    kept = store.put(_page("https://b.test/1", "checkpointed body"))
+    _age_objects(store)
+    fresh = store.put(_page("https://c.test/1", "just written"))
+
+    removed = store.collect_garbage(keep=[kept])
+
+    assert removed == 1  # Only "old body"
+    assert store.load_pages("https://a.test")[0]["text"] == "new body"
+    assert store.get(kept) is not None
+    assert store.get(fresh) is not None
+
+
+def test_gc_skips_when_a_manifest_is_unreadable(tmp_path):
+    store = PageStore(str(tmp_path))
+    store.put(_page("https://a.test/1", "orphan"))
+    _age_objects(store)
+    (tmp_path / "sites").mkdir()
+    (tmp_path / "sites" / "broken.json").write_text("{not json")
+
+    assert store.collect_garbage() == 0
+    assert len(list((tmp_path / "objects").glob("*/*.json.z"))) == 1
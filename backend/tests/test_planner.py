@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.config import settings
+from app.rag.planner import is_summary_request, plan_query, should_use_hyde
+
+HISTORY = [
+    {"role": "user", "content": "What plans does Acme offer?"},
+    {"role": "assistant", "content": "Acme offers Basic and Pro."},
+]
+
+
+@pytest.fixture(autouse=True)
+def planner_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_PLANNER_ENABLED", True)
+
+
+@pytest.mark.parametrize("question", [
+    "Summarize this page",
+    "Give me an overview",
+    "What are the key takeaways?",
+    "What is this site about?",
+])
+def test_summary_intent(question):
+    assert is_summary_request(question)
+    plan = plan_query(question, HISTORY)
+    assert plan.summary and not plan.contextualize
+
+
+@pytest.mark.parametrize("question, reason", [
+    ("How much does it cost?", "anaphora: it"),
+    ("And the enterprise tier", "elliptical follow-up"),
+    ("Why?", "too few content words"),
+])
+def test_follow_ups_are_contextualized(question, reason):
+    plan = plan_query(question, HISTORY)
+    assert plan.contextualize
+    assert plan.reason == reason
+
+
+def test_self_contained_question_skips_rewrite():
+    plan = plan_query("How much does the Acme Pro plan cost per month?", HISTORY)
+    assert not plan.summary and not plan.contextualize
+
+
+def test_no_history_never_contextualizes():
+    assert not plan_query("How much does it cost?", []).contextualize
+
+
+def test_disabled_planner_always_contextualizes(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_PLANNER_ENABLED", False)
+    assert plan_query("How much does the Acme Pro plan cost per month?", HISTORY).contextualize
+
+
+def test_hyde_decisions():
+    threshold = settings.DISTANCE_THRESHOLD
+    assert should_use_hyde("pro plan price", [], [])
+    assert should_use_hyde("pro plan price", [threshold + 0.1], ["unrelated"])
+    assert not should_use_hyde("pro plan price", [0.1, 0.4, 0.5], ["The Pro plan price is $10", "a", "b"])
@@ -0,0 +1,154 @@
+import asyncio
+
+from app.core.prefetch import Prefetcher
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _prefetcher(**kwargs):
+    options = {"max_entries": 4, "ttl": 60.0, "concurrency": 1, "max_pending": 4, "idle_wait": 5.0}
+    options.update(kwargs)
+    return Prefetcher(**options)
+
+
+def test_take_consumes_stored_result():
+    async def scenario():
+        prefetcher = _prefetcher()
+
+        async def work():
+            return "answer"
+
+        prefetcher.schedule("q", work)
+        await asyncio.sleep(0.01)
+        first = await prefetcher.take("q")
+        second = await prefetcher.take("q")
+        return first, second, prefetcher.stats()
+
+    first, second, stats = _run(scenario())
+    assert first == "answer"
+    assert second is None
+    assert stats["entries"] == 0
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_take_cancels_prefetch_that_has_not_started():
+    async def scenario():
+        prefetcher = _prefetcher()
+        ran = []
+
+        async def work():
+            ran.append(True)
+            return "answer"
+
+        with prefetcher.foreground():
+            prefetcher.schedule("q", work)
+            await asyncio.sleep(0.01)
+            value = await prefetcher.take("q")
+        await asyncio.sleep(0.01)
+        return value, ran, prefetcher.stats()
+
+    value, ran, stats = _run(scenario())
+    assert value is None
+    assert ran == []
+    assert stats["cancelled"] == 1
+    assert stats["pending"] == 0
+
+
+def test_take_awaits_running_prefetch_and_consumes_it():
+    async def scenario():
+        prefetcher = _prefetcher()
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            started.set()
+            await release.wait()
+            return "answer"
+
+        prefetcher.schedule("q", work)
+        await started.wait()
+        waiter = asyncio.create_task(prefetcher.take("q"))
+        await asyncio.sleep(0.01)
+        release.set()
+        value = await waiter
+        return value, prefetcher.stats()
+
+    value, stats = _run(scenario())
+    assert value == "answer"
+    assert stats["entries"] == 0
+    assert stats["hits"] == 1
+
+
+def test_running_prefetch_pauses_for_foreground_and_resumes():
+    async def scenario():
+        prefetcher = _prefetcher()
+        first_stage, paused = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            first_stage.set()
+            await paused.wait()
+            await prefetcher.yield_to_foreground()
+            return "answer"
+
+        prefetcher.schedule("q", work)
+        await first_stage.wait()
+        with prefetcher.foreground():
+            paused.set()
+            await asyncio.sleep(0.01)
+            during = prefetcher.stats()
+        await asyncio.sleep(0.01)
+        return during, await prefetcher.take("q")
+
+    during, value = _run(scenario())
+    assert during["paused"] == 1
+    assert during["pauses"] == 1
+    assert value == "answer"
+
+
+def test_paused_prefetch_is_dropped_when_server_stays_busy():
+    async def scenario():
+        prefetcher = _prefetcher(idle_wait=0.05)
+        first_stage = asyncio.Event()
+
+        async def work():
+            first_stage.set()
+            await asyncio.sleep(0.01)
+            await prefetcher.yield_to_foreground()
+            return "answer"
+
+        prefetcher.schedule("q", work)
+        await first_stage.wait()
+        with prefetcher.foreground():
+            await asyncio.sleep(0.2)
+        return prefetcher.stats()
+
+    stats = _run(scenario())
+    assert stats["dropped"] == 1
+    assert stats["completed"] == 0
+    assert stats["entries"] == 0
+
+
+def test_take_cancels_paused_prefetch():
+    async def scenario():
+        prefetcher = _prefetcher()
+        first_stage = asyncio.Event()
+
+        async def work():
+            first_stage.set()
+            await asyncio.sleep(0.01)
+            await prefetcher.yield_to_foreground()
+            return "answer"
+
+        prefetcher.schedule("q", work)
+        await first_stage.wait()
+        with prefetcher.foreground():
+            await asyncio.sleep(0.05)
+            value = await prefetcher.take("q")
+        await asyncio.sleep(0.01)
+        return value, prefetcher.stats()
+
+    value, stats = _run(scenario())
+    assert value is None
+    assert stats["cancelled"] == 1
+    assert stats["pending"] == 0
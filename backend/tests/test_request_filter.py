@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.rag.request_filter import RequestCounts, RequestFilter
+
+
+def _filter():
+    return RequestFilter(["image", "font"], [".doubleclick.net", "Fonts.googleapis.com"], ["*/analytics/*"])
+
+
+def test_rules_compile_to_browser_patterns():
+    patterns = _filter().patterns
+
+    assert "*.png" in patterns and "*.png?*" in patterns
+    assert "*.woff2" in patterns
+    assert "*.css" not in patterns  # Stylesheets not blocked here
+    assert "*://doubleclick.net/*" in patterns and "*://*.doubleclick.net/*" in patterns
+    assert "*://fonts.googleapis.com/*" in patterns
+    assert "*/analytics/*" in patterns
+
+
+def test_python_fallback_matches_the_same_rules():
+    rules = _filter()
+
+    assert rules.blocks("https://site.test/logo.svg", "image")
+    assert rules.blocks("https://ad.doubleclick.net/x.js", "script")
+    assert rules.blocks("https://doubleclick.net/x.js", "script")
+    assert rules.blocks("https://site.test/analytics/collect", "xhr")
+    assert not rules.blocks("https://notdoubleclick.net/x.js", "script")
+    assert not rules.blocks("https://site.test/page", "document")
+
+
+def test_image_blocking_disables_images_at_launch():
+    assert _filter().launch_args() == ["--blink-settings=imagesEnabled=false"]
+    assert RequestFilter(["font"], []).launch_args() == []
+
+
+def test_counts_only_inspector_failures_as_blocked():
+    counts = RequestCounts()
+    for _ in range(4):
+        counts.on_request({})
+    counts.on_failed({"blockedReason": "inspector"})
+    counts.on_failed({"errorText": "net::ERR_CONNECTION_RESET"})
+
+    assert counts.to_dict() == {"allowed": 3, "blocked": 1}
+
+
+def test_route_fallback_when_cdp_is_unavailable():
+    class Context:
+        async def new_cdp_session(self, page):
+            raise RuntimeError("not chromium")
+
+    class Route:
+        def __init__(self, url, resource_type):
+            self.request = SimpleNamespace(url=url, resource_type=resource_type)
+            self.outcome = None
+
+        async def abort(self):
+            self.outcome = "aborted"
+
+        async def continue_(self):
+            self.outcome = "continued"
+
+    class Page:
+        async def route(self, pattern, handler):
+            self.handler = handler
+
+    async def scenario():
+        page = Page()
+        counts = await _filter().attach(Context(), page)
+        routes = [Route("https://site.test/a.png", "image"), Route("https://site.test/", "document")]
+        for route in routes:
+            await page.handler(route)
+        return [route.outcome for route in routes], counts.to_dict()
+
+    outcomes, counts = asyncio.run(scenario())
+    assert outcomes == ["aborted", "continued"]
+    assert counts == {"allowed": 1, "blocked": 1}
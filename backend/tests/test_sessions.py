@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.sessions import SessionStore
+
+
+def _store(tmp_path, **kwargs):
+    options = {"max_sessions": 10, "ttl_seconds": 60}
+    options.update(kwargs)
+    return SessionStore(str(tmp_path / "sessions.sqlite3"), **options)
+
+
+def test_state_is_shared_between_stores(tmp_path):
+    # Two stores on one file stand in for two API workers
+    first, second = _store(tmp_path), _store(tmp_path)
+    session = first.create()
+    first.record(session.id, "What is Acme?", "Acme sells widgets. More text.", "what is acme")
+
+    loaded = second.get(session.id)
+
+    assert loaded.turns == 1
+    assert loaded.history()[0] == {"role": "user", "content": "What is Acme?"}
+    assert loaded.cached_rewrite("what is acme") == "what is acme"
+
+
+def test_old_turns_fold_into_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_RECENT_MESSAGES", 2)
+    session = _store(tmp_path).create()
+    session.record("First question?", "First answer. Details.", "q1")
+    session.record("Second question?", "Second answer.", "q2")
+
+    assert session.summary == "Q: First question?\nA: First answer."
+    assert [m["content"] for m in session.history()] == ["Second question?", "Second answer."]
+
+
+def test_expired_and_evicted_sessions(tmp_path):
+    store = _store(tmp_path, max_sessions=2)
+    oldest = store.create()
+    store.create()
+    store.create()
+
+    assert store.get(oldest.id) is None
+    assert store.stats()["active"] == 2
+
+    expiring = _store(tmp_path, ttl_seconds=-1)
+    assert expiring.get(expiring.create().id) is None
+
+
+def test_unknown_id_gets_a_new_session(tmp_path):
+    store = _store(tmp_path)
+    session = store.get_or_create("missing")
+
+    assert session.id != "missing"
+    assert store.delete(session.id)
+    assert not store.delete(session.id)
+
+
+def test_concurrent_turns_are_all_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_RECENT_MESSAGES", 40)
+    workers = [_store(tmp_path) for _ in range(3)]
+    session_id = workers[0].create().id
+
+    def turn(i):
+        # Every request starts from the same stale snapshot, as in-flight ones do
+        workers[i % 3].get(session_id)
+        return workers[i % 3].record(session_id, f"Question {i}?", f"Answer {i}.", f"q{i}")
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(turn, range(12)))
+
+    loaded = workers[0].get(session_id)
+    assert loaded.turns == 12
+    questions = {m["content"] for m in loaded.history() if m["role"] == "user"}
+    assert questions == {f"Question {i}?" for i in range(12)}
+
+
+def test_record_on_deleted_session_is_dropped(tmp_path):
+    store = _store(tmp_path)
+    session = store.create()
+    store.delete(session.id)
+
+    assert store.record(session.id, "Q?", "A.", "q") is None
+    assert store.get(session.id) is None
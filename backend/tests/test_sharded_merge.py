@@ -0,0 +1,42 @@
+from app.rag.sharded_index import _merge
+
+
+def _shard(rows_per_query):
+    return {
+        "ids": [[r[0] for r in rows] for rows in rows_per_query],
+        "documents": [[f"doc {r[0]}" for r in rows] for rows in rows_per_query],
+        "metadatas": [[{"id": r[0]} for r in rows] for rows in rows_per_query],
+        "distances": [[r[1] for r in rows] for rows in rows_per_query],
+    }
+
+
+def test_merge_keeps_global_top_k_in_distance_order():
+    shard_a = _shard([[("a1", 0.1), ("a2", 0.4), ("a3", 0.9)]])
+    shard_b = _shard([[("b1", 0.2), ("b2", 0.3)]])
+
+    merged = _merge([shard_a, shard_b], queries=1, n_results=3)
+
+    assert merged["ids"] == [["a1", "b1", "b2"]]
+    assert merged["distances"] == [[0.1, 0.2, 0.3]]
+    # Columns stay aligned with their row
+    assert merged["documents"] == [["doc a1", "doc b1", "doc b2"]]
+    assert merged["metadatas"] == [[{"id": "a1"}, {"id": "b1"}, {"id": "b2"}]]
+
+
+def test_merge_handles_each_query_and_empty_shards():
+    shard_a = _shard([[("a1", 0.5)], []])
+    shard_b = _shard([[("b1", 0.2)], [("b2", 0.7)]])
+    empty = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+    merged = _merge([shard_a, shard_b, empty], queries=2, n_results=5)
+
+    assert merged["ids"] == [["b1", "a1"], ["b2"]]
+
+
+def test_merge_carries_optional_keys():
+    shard = {**_shard([[("a1", 0.1), ("a2", 0.2)]]), "embeddings": [[[1.0, 0.0], [0.0, 1.0]]]}
+    keys = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+    merged = _merge([shard], queries=1, n_results=1, keys=keys)
+
+    assert merged["embeddings"] == [[[1.0, 0.0]]]
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+        release = asyncio.Event()
+
+        async def work():
+            runs.append(1)
+            await release.wait()
+            return "result"
+
+        callers = [asyncio.create_task(flights.do("k", work)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        inflight = len(flights)
+        release.set()
+        return await asyncio.gather(*callers), runs, inflight, "k" in flights
+
+    results, runs, inflight, still_inflight = _run(scenario())
+    assert runs == [1]
+    assert inflight == 1
+    assert not still_inflight
+    assert [result for result, _ in results] == ["result"] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flights.do("a", lambda: work(1)), flights.do("b", lambda: work(2)))
+
+    assert _run(scenario()) == [(1, False), (2, False)]
+
+
+def test_key_runs_again_after_completion():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            return len(runs)
+
+        first = await flights.do("k", work)
+        second = await flights.do("k", work)
+        return first, second
+
+    assert _run(scenario()) == ((1, False), (2, False))
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "result"
+
+        leaver = asyncio.create_task(flights.do("k", work))
+        stayer = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        leaver.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return leaver.cancelled(), await stayer
+
+    cancelled, result = _run(scenario())
+    assert cancelled
+    assert result == ("result", True)
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flights.do("k", work), flights.do("k", work), return_exceptions=True)
+        return results, len(flights)
+
+    results, inflight = _run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert inflight == 0
+
+
+def test_error_is_not_cached():
+    async def scenario():
+        flights = SingleFlight()
+        attempts = []
+
+        async def work():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ValueError("boom")
+            return "ok"
+
+        with pytest.raises(ValueError):
+            await flights.do("k", work)
+        return await flights.do("k", work)
+
+    assert _run(scenario()) == ("ok", False)
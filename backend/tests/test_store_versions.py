@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import pytest
+
+from app.rag.store import VectorStore, list_versions
+
+
+def _chunks(word, n=2):
+    return [{"id": f"{word}{i}", "text": f"{word} chunk {i}", "source": f"https://{word}.test"} for i in range(n)]
+
+
+def _documents(store):
+    return sorted(store.query("alpha beta", n_results=10)["documents"][0])
+
+
+def test_build_is_invisible_until_published(flat_dir):
+    store = VectorStore()
+    store.add(_chunks("alpha"))
+    live = store.version
+
+    build = store.begin_build()
+    build.add(_chunks("beta"))
+    before = _documents(store)
+    build.publish()
+
+    assert before == ["alpha chunk 0", "alpha chunk 1"]
+    assert _documents(store) == ["beta chunk 0", "beta chunk 1"]
+    assert store.version == build.version > live
+    assert list_versions() == [build.version]  # Unused old version dropped
+
+
+def test_leased_version_is_dropped_after_the_read_finishes(flat_dir):
+    store = VectorStore()
+    store.add(_chunks("alpha"))
+    old = store.version
+
+    with store.lease() as index:
+        build = store.begin_build()
+        build.add(_chunks("beta"))
+        build.publish()
+        # The in-flight read still sees the old version
+        assert index.count() == 2
+        assert old in list_versions()
+    assert list_versions() == [build.version]
+
+
+def test_aborted_build_is_discarded(flat_dir):
+    store = VectorStore()
+    store.add(_chunks("alpha"))
+
+    build = store.begin_build()
+    build.add(_chunks("beta"))
+    build.abort()
+
+    assert _documents(store) == ["alpha chunk 0", "alpha chunk 1"]
+    assert list_versions() == [store.version]
+
+
+def test_other_worker_follows_publish_and_keeps_its_version_until_done(flat_dir):
+    writer, reader = VectorStore(), VectorStore()
+    writer.add(_chunks("alpha"))
+    reader.open()
+    old = reader.version
+
+    build = writer.begin_build()
+    build.add(_chunks("beta"))
+    build.publish()
+
+    # The reader still holds a lease on the old version, so it survives
+    assert old in list_versions()
+    assert _documents(reader) == ["beta chunk 0", "beta chunk 1"]
+    assert reader.version == build.version
+    assert list_versions() == [build.version]
+
+
+def test_older_build_cannot_replace_newer_live_version(flat_dir):
+    store = VectorStore()
+    store.open()
+    older = store.begin_build()
+    newer = store.begin_build()
+    newer.add(_chunks("beta"))
+    newer.publish()
+
+    older.add(_chunks("alpha"))
+    with pytest.raises(RuntimeError):
+        older.publish()
+
+    assert store.version == newer.version
+    assert not Path(flat_dir, f"v{older.version}").exists()
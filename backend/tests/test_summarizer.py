@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+
+from app.core.config import settings
+from app.rag import summarizer
+from app.rag.generator import analyze_content
+from app.rag.summarizer import FALLBACK_EXCERPT_CHARS, group_contexts, map_summaries
+
+
+def test_groups_follow_page_order_and_size():
+    contexts = ["a1" * 10, "b1" * 10, "a2" * 10, "b2" * 10]
+    sources = ["a", "b", "a", "b"]
+
+    groups = group_contexts(contexts, sources, max_chars=45)
+
+    # Chunks of one page stay together; a group never exceeds the budget
+    assert groups == ["a1" * 10 + "\n\n" + "a2" * 10, "b1" * 10 + "\n\n" + "b2" * 10]
+    assert group_contexts(contexts, sources, max_chars=25) == ["a1" * 10, "a2" * 10, "b1" * 10, "b2" * 10]
+
+
+def test_map_summaries_keeps_group_order(fake_llm):
+    fake_llm.reply = lambda messages: "summary of " + messages[-1]["content"]
+
+    assert map_summaries(["one", "two", "three"]) == ["summary of one", "summary of two", "summary of three"]
+
+
+def test_map_calls_are_bounded_by_the_pool(fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_MAP_CONCURRENCY", 2)
+    monkeypatch.setattr(summarizer, "_pool", None)
+    fake_llm.delay = 0.05
+
+    map_summaries([f"group {i}" for i in range(6)])
+
+    assert len(fake_llm.calls) == 6
+    assert fake_llm.max_active <= 2
+
+
+def test_late_groups_fall_back_to_excerpts(fake_llm, monkeypatch):
+    monkeypatch.setattr(summarizer, "_pool", None)
+    fake_llm.delay = 0.5
+    long_group = "x" * (FALLBACK_EXCERPT_CHARS * 2)
+
+    assert map_summaries([long_group], timeout=0.05) == ["x" * FALLBACK_EXCERPT_CHARS]
+
+
+def test_queued_groups_only_get_the_remaining_budget(fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_MAP_CONCURRENCY", 1)
+    monkeypatch.setattr(summarizer, "_pool", None)
+    fake_llm.delay = 0.1
+
+    map_summaries(["one", "two", "three"], timeout=1.0)
+
+    # Each call starts later, with less of the one-second budget left
+    first, second, third = fake_llm.timeouts
+    assert first <= 1.0
+    assert second <= first - 0.09
+    assert third <= second - 0.09
+
+
+def test_groups_queued_past_the_deadline_are_not_sent(fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_MAP_CONCURRENCY", 1)
+    monkeypatch.setattr(summarizer, "_pool", None)
+    fake_llm.delay = 0.2
+    start = time.monotonic()
+
+    partials = map_summaries(["one", "two"], timeout=0.1)
+    summarizer._executor().submit(lambda: None).result()  # Drain the pool
+
+    assert partials == ["one", "two"]
+    assert len(fake_llm.calls) == 1
+    assert time.monotonic() - start < 0.35
+
+
+def test_executor_is_created_once(monkeypatch):
+    monkeypatch.setattr(summarizer, "_pool", None)
+    pools = []
+    barrier = threading.Barrier(8)
+
+    def grab():
+        barrier.wait()
+        pools.append(summarizer._executor())
+
+    threads = [threading.Thread(target=grab) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(pool) for pool in pools}) == 1
+
+
+def test_analysis_input_is_capped(fake_llm, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_MAX_CHARS", 1000)
+    fake_llm.reply = json.dumps({"topics": ["t"], "type": "Docs", "summary": "s"})
+
+    result = analyze_content(["y" * 800, "z" * 800])
+
+    assert result["type"] == "Docs"
+    prompt = fake_llm.calls[0][-1]["content"]
+    assert "y" * 800 in prompt and prompt.count("z") < 800
+
+
+def test_analysis_failure_is_logged(fake_llm, caplog):
+    fake_llm.reply = "not json"
+
+    result = analyze_content(["text"])
+
+    assert result["type"] == "Web Content"
+    assert "Content analysis failed" in caplog.text
@@ -0,0 +1,118 @@
+import re
+
+import pytest
+
+from app.core.config import settings
+from app.rag import chunker, tokens
+from app.rag.chunker import chunk_pages_smart, report_truncation
+from app.rag.tokens import TokenCounter, split_by_tokens
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word; two special tokens per input."""
+
+    model_max_length = 512
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def _encode(self, text, offsets):
+        spans = [m.span() for m in re.finditer(r"\S+", text)]
+        encoded = {"input_ids": list(range(len(spans)))}
+        if offsets:
+            encoded["offset_mapping"] = spans
+        return encoded
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False):
+        self.calls += 1
+        if isinstance(texts, str):
+            return self._encode(texts, return_offsets_mapping)
+        return {"input_ids": [self._encode(t, False)["input_ids"] for t in texts]}
+
+
+@pytest.fixture
+def word_tokenizer(monkeypatch):
+    tokenizer = WordTokenizer()
+    monkeypatch.setattr(tokens, "_tokenizer", tokenizer)
+    monkeypatch.setattr(tokens, "_max_seq_length", 32)  # 30 content tokens
+    monkeypatch.setattr(tokens, "token_counter", TokenCounter())
+    return tokenizer
+
+
+def _page(sentences):
+    return {"url": "https://a.test/page", "depth": 1, "text": " ".join(sentences)}
+
+
+def _sentences(n, words=8):
+    return [" ".join(f"word{i}x{j}" for j in range(words)) + "." for i in range(n)]
+
+
+def test_token_chunks_fit_the_model_input(word_tokenizer, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_UNIT", "tokens")
+    monkeypatch.setattr(settings, "CHUNK_SIZE_TOKENS", 0)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 8)
+
+    chunks = chunk_pages_smart([_page(_sentences(12))])
+
+    assert len(chunks) > 1
+    assert all(len(c["text"].split()) <= 30 for c in chunks)
+
+
+def test_over_long_sentence_is_split_at_token_boundaries(word_tokenizer, monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_UNIT", "tokens")
+    monkeypatch.setattr(settings, "CHUNK_SIZE_TOKENS", 0)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 0)
+
+    chunks = chunk_pages_smart([_page(_sentences(1, words=75))])
+
+    assert [len(c["text"].split()) for c in chunks] == [30, 30, 15]
+
+
+def test_chars_mode_does_not_load_the_tokenizer(monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_UNIT", "chars")
+    monkeypatch.setattr(settings, "CHUNK_TRUNCATION_CHECK", False)
+    monkeypatch.setattr(chunker, "report_truncation", lambda chunks: pytest.fail("tokenizer loaded"))
+
+    assert chunk_pages_smart([_page(_sentences(12))])
+
+
+def test_tokenizer_failure_falls_back_to_chars(monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_UNIT", "tokens")
+    monkeypatch.setattr(settings, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 200)
+
+    def broken():
+        raise RuntimeError("no tokenizer")
+
+    monkeypatch.setattr(tokens, "max_input_tokens", broken)
+
+    assert chunker._size_policy() == (1000, 200, None)
+
+
+def test_truncation_report_counts_dropped_tokens(word_tokenizer):
+    chunks = [
+        {"text": " ".join(["w"] * 20), "source": "a"},
+        {"text": " ".join(["w"] * 35), "source": "b"},
+        {"text": " ".join(["w"] * 40), "source": "c"},
+    ]
+
+    report = report_truncation(chunks)
+
+    assert report == {"chunks": 3, "truncated_chunks": 2, "tokens_dropped": 15, "max_tokens": 40, "limit": 30}
+
+
+def test_counter_tokenizes_only_cache_misses(word_tokenizer):
+    counter = TokenCounter()
+
+    assert counter.count(["a b", "c", "a b"]) == [2, 1, 2]
+    assert counter.count(["a b", "c d e"]) == [2, 3]
+    assert (counter.hits, counter.misses) == (1, 4)
+    assert word_tokenizer.calls == 2
+
+
+def test_split_by_tokens_keeps_short_text_whole(word_tokenizer):
+    assert split_by_tokens("one two three", 5) == ["one two three"]
+    assert split_by_tokens("one two three four five", 2) == ["one two", "three four", "five"]
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.core.tracing import Trace, current_trace, record_usage, set_flag, span
+
+
+def test_spans_nest_under_the_active_trace():
+    trace = Trace("query")
+    with trace.activate():
+        with span("retrieve", k=5):
+            with span("embed"):
+                time.sleep(0.01)
+        with span("generate"):
+            pass
+
+    root = trace.to_dict()["spans"]
+    assert root["name"] == "query"
+    assert [child["name"] for child in root["children"]] == ["retrieve", "generate"]
+    retrieve = root["children"][0]
+    assert retrieve["attrs"] == {"k": 5}
+    assert retrieve["children"][0]["name"] == "embed"
+    assert retrieve["duration_ms"] >= retrieve["children"][0]["duration_ms"] >= 10
+    assert root["children"][1]["start_ms"] >= retrieve["duration_ms"]
+
+
+def test_usage_and_flags_are_recorded_per_stage():
+    trace = Trace("query")
+    with trace.activate():
+        record_usage("rewrite", SimpleNamespace(prompt_tokens=10, completion_tokens=2, total_tokens=12))
+        record_usage("generate", SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120))
+        record_usage("generate", SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+        record_usage("generate", None)
+        set_flag("hyde_used", False)
+
+    data = trace.to_dict()
+    assert data["tokens"]["by_stage"]["generate"] == {"prompt_tokens": 101, "completion_tokens": 21, "total_tokens": 122}
+    assert data["tokens"]["total"] == {"prompt_tokens": 111, "completion_tokens": 23, "total_tokens": 134}
+    assert data["hyde_used"] is False
+
+
+def test_helpers_are_noops_outside_a_trace():
+    with span("orphan") as orphan:
+        record_usage("generate", SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+        set_flag("x", 1)
+
+    assert orphan is None
+    assert current_trace() is None
+
+
+def test_trace_follows_work_offloaded_to_threads():
+    def blocking_stage():
+        with span("llm"):
+            record_usage("generate", SimpleNamespace(prompt_tokens=3, completion_tokens=4, total_tokens=7))
+
+    async def scenario():
+        trace = Trace("query")
+        with trace.activate():
+            with span("generate"):
+                await asyncio.to_thread(blocking_stage)
+        return trace.to_dict()
+
+    data = asyncio.run(scenario())
+    assert data["spans"]["children"][0]["children"][0]["name"] == "llm"
+    assert data["tokens"]["total"]["total_tokens"] == 7
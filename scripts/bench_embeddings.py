@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Embedding Backend Benchmark
+- Compares an EMBEDDING_BACKEND against the float32 torch baseline
+- Reports throughput (texts/s) and accuracy (cosine agreement, top-k overlap)
+
+Usage (from repo root, with the backend venv active):
+    python scripts/bench_embeddings.py --backend onnx_int8
+    python scripts/bench_embeddings.py --backend torch_int8 --texts corpus.txt --threads 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.rag.embeddings import BACKENDS, build_embedding_function  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "How do I reset my password?",
+    "The API rate limit is 100 requests per minute per key.",
+    "Installation requires Python 3.10 or newer and a virtual environment.",
+    "Our refund policy allows returns within 30 days of purchase.",
+    "ChromaDB persists embeddings to a local directory on disk.",
+    "Use the --verbose flag to print detailed logs while debugging.",
+    "The crawler respects the maximum depth configured in settings.",
+    "Pricing starts at $10 per month for the basic plan.",
+    "Contact support by email for account-related questions.",
+    "Sentence transformers map text to dense vector representations.",
+    "The quarterly report shows revenue growth of twelve percent.",
+    "Headless Chromium renders JavaScript-heavy pages before extraction.",
+]
+
+
+def load_texts(path: str, repeat: int) -> list:
+    if path:
+        texts = [line.strip() for line in Path(path).read_text().splitlines() if line.strip()]
+    else:
+        texts = list(SAMPLE_TEXTS)
+    return texts * repeat
+
+
+def timed_embed(ef, texts: list) -> tuple:
+    ef(texts[:2])  # Warm-up pass (kernel init, lazy allocations)
+    start = time.perf_counter()
+    vectors = np.asarray(ef(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors, elapsed
+
+
+def topk_overlap(base: np.ndarray, cand: np.ndarray, k: int) -> float:
+    """Mean fraction of each text's k nearest neighbours that both backends agree on."""
+    k = min(k, len(base) - 1)
+    if k < 1:
+        return 1.0
+    base_sim, cand_sim = base @ base.T, cand @ cand.T
+    np.fill_diagonal(base_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    base_top = np.argsort(-base_sim, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sim, axis=1)[:, :k]
+    overlaps = [len(set(b) & set(c)) / k for b, c in zip(base_top, cand_top)]
+    return float(np.mean(overlaps))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS, default=settings.EMBEDDING_BACKEND)
+    parser.add_argument("--texts", help="File with one text per line (default: built-in sample)")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeat the corpus N times for timing")
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    settings.EMBEDDING_THREADS = args.threads
+    texts = load_texts(args.texts, args.repeat)
+    unique = load_texts(args.texts, 1)
+
+    print(f"Model: {settings.EMBEDDING_MODEL} • texts: {len(texts)} • threads: {args.threads or 'default'}")
+
+    results = {}
+    for backend in dict.fromkeys(["torch", args.backend]):
+        start = time.perf_counter()
+        ef = build_embedding_function(backend)
+        load_s = time.perf_counter() - start
+        vectors, elapsed = timed_embed(ef, texts)
+        results[backend] = (vectors[:len(unique)], elapsed)
+        print(f"  {backend:<11} load {load_s:6.2f}s • embed {elapsed:6.2f}s • {len(texts) / elapsed:8.1f} texts/s")
+
+    if args.backend == "torch":
+        return
+
+    base, base_t = results["torch"]
+    cand, cand_t = results[args.backend]
+    cosine = np.sum(base * cand, axis=1)
+    print(f"\nSpeedup vs float baseline: {base_t / cand_t:.2f}x")
+    print(f"Cosine to baseline: mean {cosine.mean():.4f} • min {cosine.min():.4f}")
+    print(f"Top-{args.k} neighbour overlap: {topk_overlap(base, cand, args.k):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Latency helpers shared by the load test and the bulk CLI.
+"""
+from typing import List, Optional
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, rounded to 0.1; None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[idx], 1)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+RAGex Load Test
+- Drives /index, /query and /analyze with a weighted mix at ramping concurrency
+- Runs fully offline: a generated static site and a stub OpenAI-compatible LLM
+  are served locally, and the backend is spawned pointing at both
+- Reports throughput, error rate and latency percentiles per concurrency step,
+  plus the knee point (where adding users stops adding throughput)
+
+Usage (from repo root, with the backend venv active):
+    python scripts/loadtest.py
+    python scripts/loadtest.py --steps 1,2,4,8,16,32 --step-seconds 20 \\
+                               --mix query=80,analyze=15,index=5 --llm-latency 400
+    python scripts/loadtest.py --api http://127.0.0.1:8000 --output curve.json
+
+With --api, the target backend must already use the stub LLM
+(LLM_BASE_URL=http://127.0.0.1:<llm-port>/v1) or it will call the real one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from latency import percentile
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+TOPICS = [
+    ("pricing", "The basic plan costs ten dollars per month and includes five projects."),
+    ("refunds", "Refunds are available within thirty days of purchase for annual plans."),
+    ("installation", "Installation requires Python 3.10 and a virtual environment."),
+    ("api limits", "The API allows one hundred requests per minute for each key."),
+    ("security", "All data is encrypted at rest with AES-256 and in transit with TLS."),
+    ("support", "Support is available by email on weekdays from nine to five."),
+    ("exports", "Projects can be exported as CSV, JSON or PDF from the settings page."),
+    ("teams", "Team plans add shared workspaces, roles and audit logs."),
+    ("integrations", "Integrations exist for Slack, GitHub and Google Drive."),
+    ("backups", "Backups run nightly and are retained for ninety days."),
+]
+QUESTION_TEMPLATES = [
+    "What does the site say about {t}?",
+    "How do {t} work?",
+    "Tell me about {t}.",
+    "Are there any details on {t}?",
+    "Summarize the {t} page.",
+]
+
+
+# ==================== STATIC SITE ====================
+
+def _site_app(pages: int) -> web.Application:
+    """A small linked site; each page covers one topic with filler paragraphs."""
+    app = web.Application()
+
+    async def page(request: web.Request) -> web.Response:
+        idx = int(request.match_info.get("n", 0)) % pages
+        topic, fact = TOPICS[idx % len(TOPICS)]
+        links = "".join(f'<li><a href="/page/{j}">Page {j}</a></li>' for j in range(pages) if j != idx)
+        filler = " ".join(
+            f"Section {k} about {topic}: {fact} This paragraph adds detail number {k} for page {idx}."
+            for k in range(12)
+        )
+        html = (
+            f"<html><head><title>{topic.title()} - Page {idx}</title></head><body>"
+            f"<h1>{topic.title()}</h1><p>{fact}</p><p>{filler}</p><ul>{links}</ul></body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    app.router.add_get("/", page)
+    app.router.add_get("/page/{n}", page)
+    return app
+
+
+# ==================== STUB LLM ====================
+
+def _llm_app(latency_ms: float, jitter_ms: float) -> web.Application:
+    """OpenAI-compatible /v1/chat/completions with simulated latency."""
+    app = web.Application()
+    app["calls"] = 0
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        app["calls"] += 1
+        await asyncio.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps({"topics": ["Testing"], "type": "Documentation", "summary": "Stub summary."})
+        else:
+            question = body["messages"][-1]["content"][-80:]
+            content = (
+                f"Stub answer for: {question}\n<<<FOLLOWUP>>>\n"
+                "1. What about pricing?\n2. How do refunds work?\n3. Is there an API?"
+            )
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        return web.json_response({
+            "id": f"stub-{app['calls']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 40,
+                      "total_tokens": prompt_tokens + 40},
+        })
+
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+
+async def _serve(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+# ==================== BACKEND ====================
+
+def _spawn_backend(port: int, llm_port: int, data_dir: str, log_path: str) -> subprocess.Popen:
+    """Start uvicorn with isolated data dirs and the stub LLM."""
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "stub",
+        "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "CHROMA_PERSIST_DIR": f"{data_dir}/chroma_db",
+        "FLAT_INDEX_DIR": f"{data_dir}/flat_index",
+        "PAGE_STORE_DIR": f"{data_dir}/pages",
+        "LLM_CACHE_PATH": f"{data_dir}/llm_cache.sqlite3",
+        "SESSION_DB_PATH": f"{data_dir}/sessions.sqlite3",
+        "CRAWL_CHECKPOINT_DIR": f"{data_dir}/crawl_checkpoints",
+        "EMBEDDING_SOCKET": f"{data_dir}/embedding.sock",
+        "TOKENIZERS_PARALLELISM": "false",
+    })
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=str(BACKEND_DIR), env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def _wait_ready(session: aiohttp.ClientSession, root: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{root}/health/ready") as r:
+                if r.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(1.0)
+    raise TimeoutError(f"Backend at {root} not ready after {timeout:.0f}s")
+
+
+async def _read_json(r: aiohttp.ClientResponse) -> Optional[dict]:
+    """The JSON object in a response, or None for an error page or other body."""
+    try:
+        body = await r.json(content_type=None)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+async def _index_and_wait(session: aiohttp.ClientSession, api: str, site: str, pages: int,
+                          timeout: float) -> Tuple[float, int]:
+    """
+    Index the site and wait for the job. A rejected submission (429 from a
+    full queue, any other error status, or a non-JSON body) is counted and
+    retried until `timeout`. Returns (seconds, rejected submissions).
+    """
+    start = time.perf_counter()
+    give_up = time.monotonic() + timeout
+    rejected = 0
+    while True:
+        async with session.post(f"{api}/index", json={"url": site, "max_pages": pages, "max_depth": 2}) as r:
+            job = await _read_json(r) if 200 <= r.status < 300 else None
+        if job is not None and "job_id" in job:
+            break
+        rejected += 1
+        if time.monotonic() > give_up:
+            raise RuntimeError(f"Initial indexing rejected {rejected} times (last status {r.status})")
+        await asyncio.sleep(1.0)
+    while True:
+        async with session.get(f"{api}/index/{job['job_id']}") as r:
+            # A failed poll is retried; only the job's own status ends the wait
+            status = ((await _read_json(r)) or {}).get("status") if r.status == 200 else "queued"
+        if status not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.5)
+    if status != "done":
+        raise RuntimeError(f"Initial indexing ended with status {status}")
+    return time.perf_counter() - start, rejected
+
+
+# ==================== LOAD ====================
+
+class Operation:
+    """One request type in the mix."""
+
+    def __init__(self, name: str, api: str, site: str, pages: int) -> None:
+        self.name = name
+        self.api = api
+        self.site = site
+        self.pages = pages
+
+    def request(self) -> tuple:
+        if self.name == "query":
+            topic = random.choice(TOPICS)[0]
+            question = random.choice(QUESTION_TEMPLATES).format(t=topic)
+            return "POST", f"{self.api}/query", {"question": question, "history": []}
+        if self.name == "analyze":
+            page = random.randrange(self.pages)
+            return "POST", f"{self.api}/analyze", {"url": f"{self.site}/page/{page}"}
+        # Re-index the same site: exercises queueing, supersession and publish
+        return "POST", f"{self.api}/index", {"url": self.site, "max_pages": self.pages, "max_depth": 2}
+
+
+def _summarize(samples: List[dict], elapsed: float) -> dict:
+    ok = [s for s in samples if s["ok"]]
+    latencies = [s["ms"] for s in ok]
+    by_op = {}
+    for name in sorted({s["op"] for s in samples}):
+        op_samples = [s for s in samples if s["op"] == name]
+        op_lat = [s["ms"] for s in op_samples if s["ok"]]
+        by_op[name] = {
+            "requests": len(op_samples),
+            "errors": sum(1 for s in op_samples if not s["ok"]),
+            "p50_ms": percentile(op_lat, 50),
+            "p99_ms": percentile(op_lat, 99),
+        }
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "rejected_429": sum(1 for s in samples if s["status"] == 429),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "by_op": by_op,
+    }
+
+
+async def run_step(session: aiohttp.ClientSession, ops: List[Operation], weights: List[float],
+                   concurrency: int, seconds: float) -> dict:
+    """Closed loop: `concurrency` virtual users send back-to-back requests."""
+    samples: List[dict] = []
+    stop_at = time.monotonic() + seconds
+
+    async def user() -> None:
+        while time.monotonic() < stop_at:
+            op = random.choices(ops, weights)[0]
+            method, url, payload = op.request()
+            start = time.perf_counter()
+            status = 0
+            try:
+                async with session.request(method, url, json=payload) as r:
+                    await r.read()
+                    status = r.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            samples.append({
+                "op": op.name,
+                "status": status,
+                # A rejected re-index is backpressure working, not a failure
+                "ok": 200 <= status < 300 or (op.name == "index" and status == 429),
+                "ms": (time.perf_counter() - start) * 1000,
+            })
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return {"concurrency": concurrency, **_summarize(samples, time.perf_counter() - start)}
+
+
+def find_knee(steps: List[dict], min_gain: float, max_error_rate: float) -> Optional[dict]:
+    """
+    Last step that still raised throughput by at least `min_gain` (relative)
+    over the previous one with an acceptable error rate. Beyond it, more
+    users mostly add queueing latency.
+    """
+    knee = None
+    for prev, step in zip([None] + steps, steps):
+        if step["error_rate"] > max_error_rate:
+            break
+        if prev is not None and prev["throughput_rps"] > 0:
+            gain = step["throughput_rps"] / prev["throughput_rps"] - 1
+            if gain < min_gain:
+                break
+        knee = step
+    return knee
+
+
+def _print_step(step: dict) -> None:
+    print(
+        f"  c={step['concurrency']:>3}  {step['throughput_rps']:>7.2f} req/s  "
+        f"err {step['error_rate'] * 100:5.1f}%  "
+        f"p50 {step['p50_ms'] or 0:>7.0f}ms  p90 {step['p90_ms'] or 0:>7.0f}ms  "
+        f"p99 {step['p99_ms'] or 0:>7.0f}ms  (n={step['requests']}, 429={step['rejected_429']})",
+        flush=True,
+    )
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("query", "analyze", "index"):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def main(args) -> None:
+    site_runner = await _serve(_site_app(args.pages), args.site_port)
+    llm_app = _llm_app(args.llm_latency, args.llm_jitter)
+    llm_runner = await _serve(llm_app, args.llm_port)
+    site = f"http://127.0.0.1:{args.site_port}"
+    print(f"🌐 Static site: {site} ({args.pages} pages)")
+    print(f"🤖 Stub LLM:    http://127.0.0.1:{args.llm_port}/v1 (~{args.llm_latency:.0f}ms)")
+
+    backend = None
+    data_dir = tempfile.mkdtemp(prefix="ragex-loadtest-")
+    api_root = args.api or f"http://127.0.0.1:{args.port}"
+    if not args.api:
+        log_path = f"{data_dir}/backend.log"
+        backend = _spawn_backend(args.port, args.llm_port, data_dir, log_path)
+        print(f"🚀 Backend:     {api_root} (data + log in {data_dir})")
+
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=4)
+    results = {"settings": vars(args), "steps": []}
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await _wait_ready(session, api_root, args.ready_timeout)
+            api = f"{api_root}/api/v1"
+            index_s, rejected = await _index_and_wait(session, api, site, args.pages, args.ready_timeout)
+            print(f"📚 Initial index: {index_s:.1f}s ({rejected} rejected submissions)\n")
+            results["initial_index_s"] = round(index_s, 2)
+            results["initial_index_rejected"] = rejected
+
+            mix = _parse_mix(args.mix)
+            ops = [Operation(name, api, site, args.pages) for name in mix]
+            weights = list(mix.values())
+
+            print(f"📈 Ramping {args.steps} users, {args.step_seconds:.0f}s per step, mix {args.mix}")
+            for concurrency in [int(c) for c in args.steps.split(",")]:
+                step = await run_step(session, ops, weights, concurrency, args.step_seconds)
+                results["steps"].append(step)
+                _print_step(step)
+                if step["error_rate"] > args.abort_error_rate:
+                    print(f"  ⛔ Error rate above {args.abort_error_rate:.0%}, stopping ramp")
+                    break
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        await site_runner.cleanup()
+        await llm_runner.cleanup()
+
+    knee = find_knee(results["steps"], args.knee_gain, args.max_error_rate)
+    results["knee"] = knee
+    results["llm_calls"] = llm_app["calls"]
+    if knee:
+        print(
+            f"\n🎯 Knee: {knee['concurrency']} concurrent users, {knee['throughput_rps']:.2f} req/s, "
+            f"p90 {knee['p90_ms']:.0f}ms"
+        )
+    else:
+        print("\n🎯 Knee: not reached (first step already saturated or failing)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"💾 Results written to {args.output}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local end-to-end load test with saturation curve")
+    parser.add_argument("--steps", default="1,2,4,8,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--step-seconds", type=float, default=15)
+    parser.add_argument("--mix", default="query=80,analyze=15,index=5", help="Weighted operation mix")
+    parser.add_argument("--pages", type=int, default=10, help="Pages in the generated site")
+    parser.add_argument("--llm-latency", type=float, default=300, help="Stub LLM mean latency (ms)")
+    parser.add_argument("--llm-jitter", type=float, default=50, help="Stub LLM latency stddev (ms)")
+    parser.add_argument("--api", help="Use a running backend instead of spawning one")
+    parser.add_argument("--port", type=int, default=8077, help="Port for the spawned backend")
+    parser.add_argument("--site-port", type=int, default=8078)
+    parser.add_argument("--llm-port", type=int, default=8079)
+    parser.add_argument("--ready-timeout", type=float, default=180)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--knee-gain", type=float, default=0.1,
+                        help="Minimum relative throughput gain per step before the knee")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate allowed at the knee")
+    parser.add_argument("--abort-error-rate", type=float, default=0.5, help="Stop ramping above this")
+    parser.add_argument("--output", help="Write all step results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -4,8 +4,22 @@ RAGex CLI - Stable Connection Edition
 - Fixes 'Server disconnected' errors by disabling keep-alive
 - Auto-starts backend
 - TrueColor ASCII Art
+- Headless bulk mode (--urls / --questions) for ingestion and regression runs
+
+Bulk mode:
+    rag_cli.py --urls sites.txt --questions questions.jsonl \
+               --concurrency 8 --index-concurrency 2 --output results.jsonl
+
+    sites.txt       one URL per line
+    questions file  one question per line, or JSONL objects
+                    {"question": ..., "url": ..., "id": ...}
+
+Every index job and question becomes one JSONL record with its latency;
+a final {"type": "summary"} record holds throughput and percentiles.
 """
+import argparse
 import asyncio
+import json
 import os
 import sys
 import time
@@ -14,6 +28,8 @@ from typing import Any, Dict, List
 
 import aiohttp
 
+from latency import percentile
+
 # --- CONFIGURATION ---
 API_BASE = os.getenv("RAG_API_BASE", "http://127.0.0.1:8000/api/v1")
 BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
@@ -51,43 +67,52 @@ def splash():
 
 # --- UTILS ---
 
-async def _server_check() -> bool:
+SERVER_ROOT = API_BASE.replace("/api/v1", "")
+
+async def _server_check(path: str = "/health/live") -> bool:
     try:
         # Use a fresh session for the check to avoid pooling issues
         async with aiohttp.ClientSession() as s:
-            r = await s.get(API_BASE.replace("/api/v1", "/"), timeout=2)
+            r = await s.get(SERVER_ROOT + path, timeout=2)
             return r.status == 200
     except:
         return False
 
+async def _wait_for(path: str, label: str, timeout_s: int) -> bool:
+    frames = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+    for i in range(timeout_s * 10):
+        if await _server_check(path):
+            return True
+        sys.stdout.write(f"\r{C['blue']}➜ {label} {frames[i % len(frames)]}{C['reset']}")
+        sys.stdout.flush()
+        await asyncio.sleep(0.1)
+    return False
+
 async def ensure_backend():
-    """Checks if backend is running; if not, starts it."""
-    if await _server_check():
-        return
+    """Checks if backend is running; if not, starts it. Then waits for warm-up."""
+    if not await _server_check():
+        print(f"{C['blue']}➜ Starting backend server...{C['reset']}", end="", flush=True)
+        
+        if not VENV_PY.exists():
+            print(f"\n{C['yellow']}Error: Virtual environment not found at {VENV_PY}{C['reset']}")
+            sys.exit(1)
 
-    print(f"{C['blue']}➜ Starting backend server...{C['reset']}", end="", flush=True)
-    
-    if not VENV_PY.exists():
-        print(f"\n{C['yellow']}Error: Virtual environment not found at {VENV_PY}{C['reset']}")
-        sys.exit(1)
+        await asyncio.create_subprocess_exec(
+            *SERVER_CMD, cwd=str(BACKEND_DIR), 
+            stdout=asyncio.subprocess.DEVNULL, 
+            stderr=asyncio.subprocess.DEVNULL
+        )
 
-    await asyncio.create_subprocess_exec(
-        *SERVER_CMD, cwd=str(BACKEND_DIR), 
-        stdout=asyncio.subprocess.DEVNULL, 
-        stderr=asyncio.subprocess.DEVNULL
-    )
+        # Server binds before loading models, so this should be quick
+        if not await _wait_for("/health/live", "Starting backend server", 30):
+            print(f"\n\n{C['yellow']}Server timed out.{C['reset']}")
+            sys.exit(1)
 
-    frames = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
-    for i in range(600): # 60s timeout
-        if await _server_check():
-            print(f"\r{C['green']}➜ Backend Ready           {C['reset']}")
-            return
-        sys.stdout.write(f"\r{C['blue']}➜ Starting backend server {frames[i % len(frames)]}{C['reset']}")
-        sys.stdout.flush()
-        await asyncio.sleep(0.1)
-    
-    print(f"\n\n{C['yellow']}Server timed out.{C['reset']}")
-    sys.exit(1)
+    # Model + DB load in the background; wait until the backend reports ready
+    if not await _wait_for("/health/ready", "Loading models          ", 120):
+        print(f"\n\n{C['yellow']}Backend did not become ready.{C['reset']}")
+        sys.exit(1)
+    print(f"\r{C['green']}➜ Backend Ready           {C['reset']}")
 
 # --- CORE ACTIONS ---
 
@@ -164,6 +189,9 @@ async def main():
         # 4. Chat Loop
         print(f"\n{C['green']}Ready. (Ctrl+C to quit){C['reset']}")
         
+        # Conversation history lives on the server; we only carry its id
+        session_id = "new"
+
         while True:
             try:
                 q = input(f"\n{C['pink']}QUERY ➜ {C['reset']}").strip()
@@ -174,9 +202,10 @@ async def main():
 
             start_t = time.time()
             try:
-                payload = {"question": q, "history": [], "include_sources": True}
+                payload = {"question": q, "session_id": session_id, "include_sources": True}
                 async with session.post(f"{API_BASE}/query", json=payload) as resp:
                     res = await resp.json()
+                session_id = res.get("session_id", session_id)
                 
                 elapsed = time.time() - start_t
                 
@@ -199,8 +228,182 @@ async def main():
             except Exception as e:
                 print(f"{C['yellow']}Error: {e}{C['reset']}")
 
+# --- BULK MODE ---
+
+def _read_lines(path: str) -> List[str]:
+    return [l.strip() for l in Path(path).read_text().splitlines() if l.strip() and not l.startswith("#")]
+
+def _read_questions(path: str) -> List[Dict[str, Any]]:
+    items = []
+    for i, line in enumerate(_read_lines(path)):
+        item = json.loads(line) if line.startswith("{") else {"question": line}
+        item.setdefault("id", i)
+        items.append(item)
+    return items
+
+def _latency_stats(records: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    ok = [r["latency_ms"] for r in records if not r.get("error")]
+    return {
+        "count": len(records),
+        "errors": sum(1 for r in records if r.get("error")),
+        "wall_s": round(wall_s, 3),
+        "throughput_per_s": round(len(records) / wall_s, 3) if wall_s else None,
+        "mean_ms": round(sum(ok) / len(ok), 1) if ok else None,
+        "p50_ms": percentile(ok, 50),
+        "p90_ms": percentile(ok, 90),
+        "p99_ms": percentile(ok, 99),
+        "max_ms": round(max(ok), 1) if ok else None,
+    }
+
+async def _post_json(session: aiohttp.ClientSession, path: str, payload: dict, retries: int = 1):
+    """POST with one retry if a pooled keep-alive connection was closed by the server."""
+    for attempt in range(retries + 1):
+        try:
+            async with session.post(f"{API_BASE}{path}", json=payload) as r:
+                return r.status, await r.json(), r.headers
+        except aiohttp.ServerDisconnectedError:
+            if attempt == retries:
+                raise
+
+async def bulk_index(session: aiohttp.ClientSession, url: str, args) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"type": "index", "url": url}
+    try:
+        payload = {"url": url, "max_pages": args.max_pages, "max_depth": args.max_depth}
+        while True:
+            status, data, headers = await _post_json(session, "/index", payload)
+            if status != 429:
+                break
+            # Backpressure from the server's job queue: wait and resubmit
+            await asyncio.sleep(float(headers.get("Retry-After", 5)))
+        if status >= 400:
+            raise RuntimeError(data.get("detail") or f"HTTP {status}")
+
+        job_id = data["job_id"]
+        record["job_id"] = job_id
+        while True:
+            async with session.get(f"{API_BASE}/index/{job_id}") as r:
+                job = await r.json()
+            if job.get("status") not in ("queued", "running"):
+                break
+            if time.perf_counter() - start > args.index_timeout:
+                raise TimeoutError(f"index job {job_id} still {job.get('status')}")
+            await asyncio.sleep(1.0)
+        record["status"] = job.get("status")
+        if job.get("status") != "done":
+            record["error"] = job.get("error") or job.get("status")
+    except Exception as e:
+        record["error"] = str(e)
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+async def bulk_query(session: aiohttp.ClientSession, item: Dict[str, Any], args) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"type": "query", "id": item["id"], "question": item["question"]}
+    try:
+        payload = {"question": item["question"], "history": [], "include_sources": True}
+        if item.get("url"):
+            payload["url"] = item["url"]
+        if args.timeout:
+            payload["timeout"] = args.timeout
+        status, data, _ = await _post_json(session, "/query", payload)
+        if status >= 400:
+            raise RuntimeError(data.get("detail") or f"HTTP {status}")
+        record.update({
+            "answer": data.get("answer"),
+            "refusal": data.get("refusal"),
+            "confidence_score": data.get("confidence_score"),
+            "sources": [s.get("url") if isinstance(s, dict) else s for s in data.get("sources", [])],
+            "server_time_s": data.get("response_time"),
+        })
+    except Exception as e:
+        record["error"] = str(e)
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+async def _bounded_gather(limit: int, coros) -> List[Any]:
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+async def bulk_main(args) -> None:
+    await ensure_backend()
+
+    urls = _read_lines(args.urls) if args.urls else []
+    questions = _read_questions(args.questions) if args.questions else []
+
+    # Pooled keep-alive connections. keepalive_timeout stays below uvicorn's
+    # 5s idle timeout so we don't reuse sockets the server already closed.
+    limit = max(args.concurrency, args.index_concurrency) * 2
+    connector = aiohttp.TCPConnector(limit=limit, keepalive_timeout=4)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=args.request_timeout)
+    summary: Dict[str, Any] = {"type": "summary"}
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        out = open(args.output, "w") if args.output != "-" else sys.stdout
+        try:
+            if urls:
+                start = time.perf_counter()
+                index_records = await _bounded_gather(
+                    args.index_concurrency, [bulk_index(session, u, args) for u in urls]
+                )
+                summary["index"] = _latency_stats(index_records, time.perf_counter() - start)
+                for rec in index_records:
+                    out.write(json.dumps(rec) + "\n")
+
+            if questions:
+                start = time.perf_counter()
+                query_records = await _bounded_gather(
+                    args.concurrency, [bulk_query(session, q, args) for q in questions]
+                )
+                summary["query"] = _latency_stats(query_records, time.perf_counter() - start)
+                for rec in query_records:
+                    out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+            summary["settings"] = {
+                "concurrency": args.concurrency,
+                "index_concurrency": args.index_concurrency,
+                "max_pages": args.max_pages,
+                "max_depth": args.max_depth,
+            }
+            out.write(json.dumps(summary) + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    for kind in ("index", "query"):
+        if kind in summary:
+            s = summary[kind]
+            print(
+                f"{C['green']}{kind}:{C['reset']} {s['count']} done, {s['errors']} errors • "
+                f"{s['throughput_per_s']}/s • p50 {s['p50_ms']}ms • p99 {s['p99_ms']}ms",
+                file=sys.stderr,
+            )
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAGex CLI (interactive by default)")
+    parser.add_argument("--urls", help="File of URLs to index (bulk mode)")
+    parser.add_argument("--questions", help="File of questions, plain text or JSONL (bulk mode)")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL output path, '-' for stdout")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /query requests")
+    parser.add_argument("--index-concurrency", type=int, default=2, help="Concurrent /index jobs")
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--timeout", type=float, help="Per-query deadline sent to the server (s)")
+    parser.add_argument("--request-timeout", type=float, default=120, help="Client socket read timeout (s)")
+    parser.add_argument("--index-timeout", type=float, default=600, help="Max wait per index job (s)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    cli_args = parse_args()
     try:
-        asyncio.run(main())
+        if cli_args.urls or cli_args.questions:
+            asyncio.run(bulk_main(cli_args))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         sys.exit(0)
\ No newline at end of file
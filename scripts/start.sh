@@ -13,5 +13,18 @@ export PYTHONWARNINGS="ignore::UserWarning"
 
 echo "🚀 Starting Backend at http://127.0.0.1:8000"
 cd backend
+
+# Several API workers share one embedding model via the embedding service
+if [ "${EMBEDDING_BACKEND:-}" = "remote" ]; then
+  echo "🧮 Starting shared embedding service"
+  python -m app.rag.embedding_server &
+  EMBEDDING_PID=$!
+  trap 'kill $EMBEDDING_PID 2>/dev/null' EXIT
+fi
+
 # Disabled reload for better stability in 'production' feel
-uvicorn app.main:app --host 127.0.0.1 --port 8000 --log-level info
\ No newline at end of file
+# WORKERS>1: index versions are allocated, published and dropped under
+# cross-process file locks and sessions live in SQLite, so workers share
+# one consistent store. Job queue limits, /query coalescing and prefetch
+# remain per worker.
+uvicorn app.main:app --host 127.0.0.1 --port 8000 --log-level info --workers "${WORKERS:-1}"
\ No newline at end of file